@@ -0,0 +1,174 @@
+"""
+비전 추론 입장 제어 (동시 실행 수 제한 + 우선순위 대기열 + 조기 거절)
+
+- 동시에 concurrency개만 실행하고 나머지는 우선순위(낮은 숫자 우선), 도착 순으로 대기
+- 대기열이 가득 차면 우선순위가 더 낮은 대기 요청을 먼저 거절
+- 처리 시간 EWMA로 예상 대기 시간을 계산해서, 마감 시간 안에 시작할 수 없거나 대기열이 가득 차면
+  이미지를 디코딩하기 전에 바로 Overloaded (호출 측에서 503 + Retry-After)
+- 대기 시간과 처리 시간을 따로 반환
+"""
+import asyncio
+import hmac
+import heapq
+import itertools
+import math
+import os
+import time
+
+PRIORITY_HIGH = 0    # 재촬영 등 사용자가 이미 기다리고 있는 요청
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+PRIORITY_LANES = {"high": PRIORITY_HIGH, "normal": PRIORITY_NORMAL, "low": PRIORITY_LOW}
+
+# high 우선순위를 허용하는 토큰 (유료 사용자/재촬영을 인증한 게이트웨이가 X-Priority-Token으로 전달)
+PRIORITY_TOKEN = os.environ.get("HOMEFIX_PRIORITY_TOKEN")
+
+
+def request_priority(headers, is_admin=None) -> int:
+    """
+    X-Priority 헤더로 우선순위 결정
+
+    클라이언트는 자기 우선순위를 낮추는 것(low)만 할 수 있고, high는 X-Priority-Token이
+    HOMEFIX_PRIORITY_TOKEN과 같거나 is_admin(X-Admin-Token)이 True일 때만 적용 (아니면 normal)
+    """
+    priority = PRIORITY_LANES.get(headers.get("x-priority", "normal").lower(), PRIORITY_NORMAL)
+    if priority != PRIORITY_HIGH:
+        return priority
+    token = headers.get("x-priority-token")
+    if PRIORITY_TOKEN and token is not None and hmac.compare_digest(token, PRIORITY_TOKEN):
+        return priority
+    if is_admin is not None and is_admin(headers.get("x-admin-token")):
+        return priority
+    return PRIORITY_NORMAL
+
+
+class Overloaded(Exception):
+    """대기열이 가득 찼거나 마감 시간 안에 처리를 시작할 수 없음"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, name: str, concurrency: int, max_queue: int, deadline_seconds: float,
+                 initial_service_seconds: float = 1.0, ewma_alpha: float = 0.2):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.deadline_seconds = deadline_seconds
+        self.ewma_alpha = ewma_alpha
+        self.service_seconds = initial_service_seconds  # 처리 시간 EWMA
+        self._active = 0
+        self._waiters = []  # (우선순위, 순번, future)
+        self._counter = itertools.count()
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def estimated_wait(self, priority: int = PRIORITY_NORMAL) -> float:
+        """새 요청이 처리를 시작할 때까지의 예상 대기 시간 (초)"""
+        ahead = sum(1 for p, _, f in self._waiters if p <= priority and not f.done())
+        backlog = self._active + ahead - self.concurrency + 1
+        if backlog <= 0:
+            return 0.0
+        return math.ceil(backlog / self.concurrency) * self.service_seconds
+
+    def _release(self):
+        self._active -= 1
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._active += 1
+                future.set_result(None)
+                return
+
+    def _shed_lower_priority(self, priority: int) -> bool:
+        """대기열이 가득 찼을 때 더 낮은 우선순위의 가장 늦게 온 요청을 거절하고 자리를 비움"""
+        candidates = [(p, seq, f) for p, seq, f in self._waiters if p > priority and not f.done()]
+        if not candidates:
+            return False
+        _, _, future = max(candidates)
+        future.set_exception(Overloaded(f"{self.name} 우선순위가 높은 요청에 자리를 양보", retry_after=self.service_seconds))
+        self.rejected += 1
+        return True
+
+    async def run(self, fn, *args, priority: int = PRIORITY_NORMAL, deadline_seconds: float | None = None,
+                  weight: int = 1):
+        """
+        입장 후 fn(*args)를 스레드풀에서 실행 (weight: 배치 요청의 이미지 수 - 처리 시간 EWMA는 이미지 1개 기준)
+
+        Returns:
+            (결과, 대기 시간(초), 처리 시간(초))
+
+        Raises:
+            Overloaded: 대기열이 가득 찼거나 마감 시간 안에 시작할 수 없음
+        """
+        from starlette.concurrency import run_in_threadpool
+
+        deadline = deadline_seconds if deadline_seconds is not None else self.deadline_seconds
+        queued_at = time.perf_counter()
+
+        if self._active >= self.concurrency:
+            pending = sum(1 for _, _, f in self._waiters if not f.done())
+            if pending >= self.max_queue and self._shed_lower_priority(priority):
+                pending -= 1
+            wait = self.estimated_wait(priority)
+            if pending >= self.max_queue or wait + self.service_seconds * (weight - 1) > deadline:
+                self.rejected += 1
+                raise Overloaded(f"{self.name} 대기열 초과 (대기 {pending}건, 예상 {wait:.1f}초)", retry_after=max(1.0, wait))
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._counter), future))
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout=deadline)
+            except asyncio.TimeoutError:
+                if future.done():
+                    # 시간 초과와 동시에 자리를 받았으면 다음 요청에 넘김
+                    self._release()
+                else:
+                    future.cancel()
+                self.expired += 1
+                raise Overloaded(f"{self.name} 대기 시간 초과", retry_after=self.estimated_wait(priority) or 1.0)
+            except asyncio.CancelledError:
+                # 클라이언트 연결 종료 등으로 취소되면 받은 자리를 돌려줌
+                if future.done() and not future.cancelled():
+                    self._release()
+                else:
+                    future.cancel()
+                raise
+        else:
+            self._active += 1
+
+        waited = time.perf_counter() - queued_at
+        self.admitted += 1
+        started = time.perf_counter()
+        try:
+            result = await run_in_threadpool(fn, *args)
+        finally:
+            service = time.perf_counter() - started
+            self.service_seconds += self.ewma_alpha * (service / max(1, weight) - self.service_seconds)
+            self._release()
+        return result, waited, service
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "active": self._active,
+            "queued": sum(1 for _, _, f in self._waiters if not f.done()),
+            "max_queue": self.max_queue,
+            "service_seconds_ewma": round(self.service_seconds, 3),
+            "estimated_wait_seconds": round(self.estimated_wait(), 3),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "expired": self.expired,
+        }
+
+
+vision_admission = AdmissionController(
+    "vision",
+    concurrency=int(os.environ.get("VISION_CONCURRENCY", "1")),
+    max_queue=int(os.environ.get("VISION_MAX_QUEUE", "16")),
+    deadline_seconds=float(os.environ.get("VISION_DEADLINE_SECONDS", "10")),
+    initial_service_seconds=float(os.environ.get("VISION_INITIAL_SERVICE_SECONDS", "1.0")),
+)
@@ -1,20 +1,46 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from efficientnet import (
     run_pipeline,
     load_model,
+    warm_up,
+    run_pipeline_batch,
+    configure_threads,
+    VISION_OPTIMIZED,
     problems,
     inv_location_map,
     valid_location_scope,
 )
-from nlp.main import return_solution, chat_with_ai, get_supplies_for_problem, _search_youtube_videos  # ← GPT 기반 해결책 생성 함수 및 채팅 함수
+from nlp.main import init_search_index, return_solution, resolve_problem, resolve_problems, return_resolved_solution, chat_with_ai, summarize, summarize_stats, get_supplies_for_problem, youtube_cache, prewarm_youtube_cache  # ← GPT 기반 해결책 생성 함수 및 채팅 함수
+from nlp.fanout import DEBUG_TIMINGS
+from nlp.cache import answer_cache
+from nlp.singleflight import flight_stats
+from nlp.conversation import conversation_store, context_token_stats
+from nlp.slots import slot_engine_stats
+from nlp.resilience import run_with_deadline, resilience_stats
+from starlette.concurrency import run_in_threadpool
 from PIL import Image
 from pydantic import BaseModel
-import io, base64, socket
+import base64, socket, json
+import asyncio
+import math
+import threading
+import time
 import os
 import re
 import warnings
-from googleapiclient.discovery import build
+from nlp.google_clients import google_clients
+from nlp.kv_cache import PersistentTTLCache
+from metrics import (
+    stage_seconds, request_seconds, threshold_rejections, register_collector, render_metrics,
+)
+from profiling import should_profile, profile_request, is_admin, list_traces, trace_path
+from preprocess import decode_image
+from admission import vision_admission, Overloaded, request_priority
+from structured_logging import setup_logging, request_id_var, request_id_from, logging_stats
+from nlp.quota import search_quota, quota_stats, QuotaExhausted, INTERACTIVE
 
 # TensorFlow 관련 경고 필터링 (sentence_transformers에서 간접 사용)
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'  # oneDNN 경고 비활성화
@@ -37,9 +63,117 @@ import logging
 logging.getLogger('tensorflow').setLevel(logging.ERROR)
 logging.getLogger('keras').setLevel(logging.ERROR)
 
-app = FastAPI()
+# JSON 한 줄 로그 + 큐 기반 출력 (요청 스레드는 stdout에 직접 쓰지 않음)
+setup_logging()
+logger = logging.getLogger("homefix.app")
+
+# 서버 준비 상태 (모델/검색 인덱스 로딩과 워밍업이 끝나면 ready=True)
+startup_state = {"ready": False, "error": None, "started_at": None, "loaded": {}}
+# 준비 전 요청에 알려줄 재시도 대기 시간 (초)
+READY_RETRY_AFTER_SECONDS = int(os.environ.get("READY_RETRY_AFTER_SECONDS", "5"))
+# 준비 전에도 처리하는 경로
+_UNGATED_PATHS = {"/healthz", "/readyz", "/server-info/", "/stats/", "/metrics"}
+# 프로파일링을 허용하는 경로
+_PROFILED_PATHS = {"/analyze/", "/chat/", "/solve/", "/diagnose/", "/analyze/batch", "/solve/batch"}
+
+# EfficientNet 모델 (lifespan에서 백그라운드 로딩)
+model = None
+
+def _load_vision_models():
+    """비전 모델 9개 로딩 + 합성 입력 워밍업 (걸린 시간 기록, serve_prefork.py가 미리 로딩했으면 워밍업만)"""
+    start = time.perf_counter()
+    if model is None and VISION_OPTIMIZED:
+        # 단일 프로세스 실행이면 물리 코어 수만큼 (serve_prefork.py는 워커별로 나눠서 설정)
+        startup_state["loaded"]["vision_threads"] = configure_threads()
+    models_dict = model if model is not None else load_model()
+    warm_up(models_dict)
+    startup_state["loaded"]["vision_seconds"] = round(time.perf_counter() - start, 2)
+    return models_dict
+
+def _load_search():
+    startup_state["loaded"]["search_index_seconds"] = round(init_search_index(), 2)
+
+async def _warm_up_server():
+    """비전 모델과 검색 인덱스를 동시에 로딩하고 워밍업"""
+    global model
+    start = time.perf_counter()
+    try:
+        models_dict, _ = await asyncio.gather(
+            run_in_threadpool(_load_vision_models),
+            run_in_threadpool(_load_search),
+        )
+    except Exception as e:
+        startup_state["error"] = str(e)
+        logger.exception("서버 워밍업 실패")
+        return
+    model = models_dict
+    startup_state["loaded"]["total_seconds"] = round(time.perf_counter() - start, 2)
+    startup_state["ready"] = True
+    logger.info("서버 준비 완료", extra={"fields": startup_state["loaded"]})
+
+    # YOUTUBE_PREWARM=1이면 지식 베이스 제목의 유튜브 검색 결과를 백그라운드에서 미리 캐시
+    if os.environ.get("YOUTUBE_PREWARM") == "1":
+        threading.Thread(target=prewarm_youtube_cache, name="youtube-prewarm", daemon=True).start()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 로딩을 기다리지 않고 바로 연결을 받음 (준비 전 요청은 503 + Retry-After)
+    startup_state["started_at"] = time.time()
+    warm_up_task = asyncio.create_task(_warm_up_server())
+    yield
+    warm_up_task.cancel()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """엔드포인트별 전체 처리 시간 기록 (경로는 라우트 템플릿 기준, 매칭 안 되면 unmatched)"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        endpoint = route.path if route is not None else "unmatched"
+        request_seconds.observe(time.perf_counter() - start, endpoint, request.method, str(status))
+
+@app.middleware("http")
+async def profile_selected_requests(request: Request, call_next):
+    """X-Profile 헤더 또는 샘플링으로 선택된 요청만 프로파일링 (트레이스 ID는 X-Profile-Trace 헤더로 반환)"""
+    if request.url.path not in _PROFILED_PATHS or not should_profile(request.headers):
+        return await call_next(request)
+    with profile_request(request.url.path) as trace_id:
+        response = await call_next(request)
+    response.headers["X-Profile-Trace"] = trace_id
+    return response
+
+@app.middleware("http")
+async def readiness_gate(request: Request, call_next):
+    """준비 전 요청은 연결을 붙잡지 않고 바로 503 반환"""
+    if not startup_state["ready"] and request.url.path not in _UNGATED_PATHS:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "서버가 아직 준비 중입니다. 잠시 후 다시 시도해주세요."},
+            headers={"Retry-After": str(READY_RETRY_AFTER_SECONDS)},
+        )
+    return await call_next(request)
+
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    """요청마다 correlation ID 설정 (준비 상태 검사 미들웨어보다 바깥에 있어서 503 응답에도 포함)"""
+    # 형식에 맞는 X-Request-ID가 있으면 그대로 사용하고 응답 헤더로 반환 (아니면 새로 생성)
+    request_id = request_id_from(request.headers.get("x-request-id"))
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
 
-# CORS 허용 설정
+# CORS 허용 설정 (준비 중 503 응답에도 CORS 헤더가 붙도록 마지막에 추가)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # 실제 서비스에선 "*" 대신 앱 주소 권장
@@ -48,9 +182,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# EfficientNet 모델 로딩 (서버 시작 시 한 번만
-model = load_model()
-
 def get_local_ip():
     """현재 컴퓨터의 로컬 IP 주소를 가져옵니다."""
     try:
@@ -64,11 +195,27 @@ def get_local_ip():
         # 실패 시 localhost 반환
         return "127.0.0.1"
 
+# 엔드포인트별 전체 응답 예산 (초) - LLM 호출은 남은 예산 안에서만 실행
+CHAT_BUDGET_SECONDS = float(os.environ.get("CHAT_BUDGET_SECONDS", "25"))
+SOLVE_BUDGET_SECONDS = float(os.environ.get("SOLVE_BUDGET_SECONDS", "25"))
+SUMMARIZE_BUDGET_SECONDS = float(os.environ.get("SUMMARIZE_BUDGET_SECONDS", "5"))
+RECOMMEND_BUDGET_SECONDS = float(os.environ.get("RECOMMEND_BUDGET_SECONDS", "8"))
+DIAGNOSE_BUDGET_SECONDS = float(os.environ.get("DIAGNOSE_BUDGET_SECONDS", "30"))
+# /recommend 키워드 동시 검색 수, 준비물 그룹도 Google 검색 사용 여부
+RECOMMEND_CONCURRENCY = int(os.environ.get("RECOMMEND_CONCURRENCY", "4"))
+RECOMMEND_SEARCH_SUPPLIES = os.environ.get("RECOMMEND_SEARCH_SUPPLIES") == "1"
+
+# 문제 분류 임계값 설정 (로짓 값 기준)
+# 로짓 값 의미: 0 근처=불확실, 1~2=약간 확신, 2~3=적당한 확신, 5+=매우 높은 확신
+PROBLEM_CONFIDENCE_THRESHOLD = 6.0
+
 class ImageBase64Request(BaseModel):
     image_base64: str
 
 class ChatRequest(BaseModel):
     message: str
+    # 대화 세션 ID (없으면 기본 세션 사용 - 구버전 클라이언트 호환)
+    session_id: str | None = None
 
 class SolveRequest(BaseModel):
     problem: str
@@ -84,28 +231,137 @@ async def get_server_info():
         "base_url": f"http://{get_local_ip()}:8000"
     }
 
-@app.post("/analyze/")
-async def analyze(data: ImageBase64Request):
-    try:
-        # 이미지 읽기
-        print("✅ 받은 base64 길이:", len(data.image_base64))
-        image_bytes = base64.b64decode(data.image_base64)
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+@app.get("/healthz")
+async def healthz():
+    """프로세스 생존 여부 (로딩 중이어도 ok, 워밍업이 실패했으면 500 → 오케스트레이터가 재시작)"""
+    if startup_state["error"]:
+        return JSONResponse(status_code=500, content={"status": "failed", "error": startup_state["error"]})
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """모델/검색 인덱스 로딩과 워밍업이 끝났는지 반환 (준비 전에는 503)"""
+    body = {
+        "ready": startup_state["ready"],
+        "error": startup_state["error"],
+        "loaded": startup_state["loaded"],
+        "uptime_seconds": round(time.time() - startup_state["started_at"], 1) if startup_state["started_at"] else None,
+    }
+    if startup_state["ready"]:
+        return body
+    return JSONResponse(status_code=503, content=body, headers={"Retry-After": str(READY_RETRY_AFTER_SECONDS)})
+
+# 이미 다른 곳에서 세고 있는 캐시 통계는 /metrics 요청 시에만 읽음
+def _cache_samples():
+    answer = answer_cache.stats()
+    samples = [(("answer", "hit"), answer["hits"]), (("answer", "miss"), answer["misses"])]
+    for name, cache in (("youtube", youtube_cache), ("products", product_cache)):
+        stats = cache.stats()
+        samples += [((name, "hit"), stats["hits"]), ((name, "stale"), stats["stale_hits"]), ((name, "miss"), stats["misses"])]
+    return samples
+
+register_collector("homefix_cache_lookups_total", "Cache lookups by result", "counter", ["cache", "result"], _cache_samples)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 텍스트 형식 메트릭"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+def _require_admin(token: str | None):
+    if not is_admin(token):
+        raise HTTPException(status_code=403, detail="관리자 토큰이 필요합니다")
+
+@app.get("/admin/profiles")
+async def get_profiles(x_admin_token: str | None = Header(default=None)):
+    """저장된 프로파일링 트레이스 목록 (최신순)"""
+    _require_admin(x_admin_token)
+    return {"traces": list_traces()}
+
+@app.get("/admin/profiles/{name}")
+async def download_profile(name: str, x_admin_token: str | None = Header(default=None)):
+    """트레이스 다운로드 (.json은 chrome://tracing 또는 Perfetto, .folded는 speedscope 또는 flamegraph.pl로 확인)"""
+    _require_admin(x_admin_token)
+    path = trace_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="트레이스를 찾을 수 없습니다")
+    return FileResponse(path, filename=name)
+
+@app.get("/stats/")
+async def get_stats():
+    """캐시 적중률, 요청 병합으로 절약된 호출 수, 세션 수를 반환합니다."""
+    return {
+        "answer_cache": answer_cache.stats(),
+        "coalescing": flight_stats(),
+        "llm": resilience_stats(),
+        "sessions": conversation_store.stats(),
+        "context_tokens": context_token_stats,
+        "slot_engine": slot_engine_stats,
+        "summarize": summarize_stats,
+        "google_apis": google_clients.stats(),
+        "youtube_cache": youtube_cache.stats(),
+        "product_cache": product_cache.stats(),
+        "quota": quota_stats(),
+        "logging": logging_stats(),
+        "vision_admission": vision_admission.stats(),
+    }
+
+class ImageDecodeError(ValueError):
+    """base64 또는 이미지 디코딩 실패"""
 
+def _decode_image(image_base64: str) -> Image.Image:
+    try:
+        with stage_seconds.time("base64_decode"):
+            image_bytes = base64.b64decode(image_base64)
+        with stage_seconds.time("pil_decode"):
+            return decode_image(image_bytes)
     except Exception as e:
+        raise ImageDecodeError(str(e)) from e
+
+def _analyze_image(image_base64: str):
+    """입장 후 실행: 이미지 디코딩 + 문제/위치 예측 (디코딩도 입장 후에 해서 몰려드는 요청의 메모리 사용을 제한)"""
+    return run_pipeline(_decode_image(image_base64), model=model)
+
+async def _admitted_analysis(image_base64: str, request: Request):
+    """
+    비전 입장 제어를 거쳐 이미지 분석 (X-Priority: low로 낮추기만 가능, high는 X-Priority-Token 또는 관리자 토큰 필요)
+
+    Returns:
+        (문제명, 위치명, 최대 로짓 값, 대기 시간(초), 처리 시간(초))
+    """
+    priority = request_priority(request.headers, is_admin)
+    try:
+        (problem, location, max_logit), waited, service = await vision_admission.run(
+            _analyze_image, image_base64, priority=priority
+        )
+    except Overloaded as e:
+        logger.warning("비전 대기열 초과로 거절", extra={"fields": {"reason": str(e), "retry_after": e.retry_after}})
+        raise HTTPException(
+            status_code=503,
+            detail="요청이 많아 잠시 후 다시 시도해주세요.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+    except ImageDecodeError as e:
         raise HTTPException(status_code=400, detail=f"이미지 처리 실패: {str(e)}")
+    stage_seconds.observe(waited, "vision_queue_wait")
+    stage_seconds.observe(service, "vision_inference")
+    return problem, location, max_logit, waited, service
 
-    # 문제 분류 임계값 설정 (로짓 값 기준)
-    # 로짓 값 의미: 0 근처=불확실, 1~2=약간 확신, 2~3=적당한 확신, 5+=매우 높은 확신
-    PROBLEM_CONFIDENCE_THRESHOLD = 6.0
+def _server_timing(waited: float, service: float) -> str:
+    return f"queue;dur={waited * 1000:.1f}, inference;dur={service * 1000:.1f}"
 
-    # 모델로 문제와 위치를 모두 예측
-    predicted_problem, predicted_location, max_logit = run_pipeline(image, model=model)
-    print(f"문제: {predicted_problem}, 위치: {predicted_location}, 최대 로짓 값: {max_logit:.3f}")
+@app.post("/analyze/")
+async def analyze(data: ImageBase64Request, request: Request, response: Response):
+    logger.debug("이미지 수신", extra={"fields": {"base64_length": len(data.image_base64)}})
+
+    # 모델로 문제와 위치를 모두 예측 (대기 시간과 추론 시간은 Server-Timing 헤더로 따로 반환)
+    predicted_problem, predicted_location, max_logit, waited, service = await _admitted_analysis(data.image_base64, request)
+    response.headers["Server-Timing"] = _server_timing(waited, service)
+    logger.info("이미지 분석", extra={"fields": {"problem": predicted_problem, "location": predicted_location, "max_logit": round(max_logit, 3)}})
 
     # 임계값 미달 시 None 반환
     if max_logit < PROBLEM_CONFIDENCE_THRESHOLD:
-        print(f"⚠️ 최대 로짓 값 {max_logit:.3f}가 임계값 {PROBLEM_CONFIDENCE_THRESHOLD} 미만")
+        threshold_rejections.inc("analyze")
+        logger.info("임계값 미달", extra={"fields": {"max_logit": round(max_logit, 3), "threshold": PROBLEM_CONFIDENCE_THRESHOLD}})
         return {
             "problem": None,
             "location": None,
@@ -121,7 +377,7 @@ async def analyze(data: ImageBase64Request):
 async def chat(data: ChatRequest):
     try:
         # AI와 채팅 (구체성 정보 포함)
-        result = chat_with_ai(data.message)
+        result = await run_in_threadpool(run_with_deadline, CHAT_BUDGET_SECONDS, chat_with_ai, data.message, data.session_id)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"채팅 처리 실패: {str(e)}")
@@ -130,8 +386,7 @@ async def chat(data: ChatRequest):
 async def summarize(data: ChatRequest):
     """질문을 세션 제목으로 요약"""
     try:
-        from nlp.generator import summarize_question
-        summary = summarize_question(data.message)
+        summary = await run_in_threadpool(run_with_deadline, SUMMARIZE_BUDGET_SECONDS, summarize, data.message)
         return {"summary": summary}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"요약 처리 실패: {str(e)}")
@@ -139,16 +394,144 @@ async def summarize(data: ChatRequest):
 @app.post("/solve/")
 async def solve(req: SolveRequest):
     try:
-        solution, selected_problem, youtube_videos = return_solution(req.problem, req.location)
-        return {
+        timings = {}
+        solution, selected_problem, youtube_videos = await run_in_threadpool(
+            run_with_deadline, SOLVE_BUDGET_SECONDS, return_solution, req.problem, req.location, timings=timings
+        )
+        result = {
             "problem": selected_problem,
             "location": req.location,
             "solution": solution,
             "youtube_videos": youtube_videos if youtube_videos else [],
         }
+        if DEBUG_TIMINGS:
+            result["timings"] = timings
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"해결책 생성 실패: {str(e)}")
+
+
+# ------------------------ 배치 처리 (관리자 대시보드, 기록 화면) ------------------------ #
+ANALYZE_BATCH_MAX_ITEMS = int(os.environ.get("ANALYZE_BATCH_MAX_ITEMS", "16"))
+SOLVE_BATCH_MAX_ITEMS = int(os.environ.get("SOLVE_BATCH_MAX_ITEMS", "20"))
+# /solve/batch에서 동시에 생성하는 해결책 수
+SOLVE_BATCH_CONCURRENCY = int(os.environ.get("SOLVE_BATCH_CONCURRENCY", "4"))
+
+class ImageBatchRequest(BaseModel):
+    images_base64: list[str]
+
+class SolveBatchRequest(BaseModel):
+    items: list[SolveRequest]
+
+def _analyze_images(images_base64: list):
+    """입장 후 실행: 이미지별 디코딩 + 배치 추론 (디코딩 실패는 해당 항목만 오류)"""
+    decoded, errors = [], {}
+    for i, image_base64 in enumerate(images_base64):
+        try:
+            decoded.append((i, _decode_image(image_base64)))
+        except ImageDecodeError as e:
+            errors[i] = f"이미지 처리 실패: {str(e)}"
+    predictions = run_pipeline_batch([image for _, image in decoded], model=model) if decoded else []
+    return {i: prediction for (i, _), prediction in zip(decoded, predictions)}, errors
+
+@app.post("/analyze/batch")
+async def analyze_batch(data: ImageBatchRequest, request: Request):
+    """여러 이미지를 묶어서 한 번에 분석 (문제/위치 모델 배치 추론, 항목별 결과와 오류 반환)"""
+    started = time.perf_counter()
+    if not data.images_base64 or len(data.images_base64) > ANALYZE_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"이미지는 1~{ANALYZE_BATCH_MAX_ITEMS}개까지 보낼 수 있습니다.")
+
+    priority = request_priority(request.headers, is_admin)
+    try:
+        (predictions, errors), waited, service = await vision_admission.run(
+            _analyze_images, data.images_base64, priority=priority, weight=len(data.images_base64)
+        )
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail="요청이 많아 잠시 후 다시 시도해주세요.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+    stage_seconds.observe(waited, "vision_queue_wait")
+    stage_seconds.observe(service, "vision_inference")
+
+    results = []
+    for i in range(len(data.images_base64)):
+        if i in errors:
+            results.append({"index": i, "error": errors[i]})
+            continue
+        predicted_problem, predicted_location, max_logit = predictions[i]
+        if max_logit < PROBLEM_CONFIDENCE_THRESHOLD:
+            threshold_rejections.inc("analyze_batch")
+            results.append({"index": i, "problem": None, "location": None, "message": "사진을 다시 찍거나 채팅으로 물어보세요"})
+        else:
+            results.append({"index": i, "problem": predicted_problem, "location": predicted_location})
+
+    return {
+        "results": results,
+        "timings": {
+            "queue_ms": round(waited * 1000, 1),
+            "inference_ms": round(service * 1000, 1),
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        },
+    }
+
+@app.post("/solve/batch")
+async def solve_batch(req: SolveBatchRequest):
+    """
+    여러 (문제, 위치)의 해결책을 한 번에 반환
+
+    중복된 (문제, 위치)는 한 번만 처리하고, 문서 검색은 한 번의 배치 인코딩/검색으로,
+    GPT 해결책 생성과 유튜브 검색은 SOLVE_BATCH_CONCURRENCY개씩 동시에 실행합니다.
+    항목마다 실행 자리를 얻은 시점부터 SOLVE_BUDGET_SECONDS 예산을 따로 씁니다
+    (하나의 마감 시간을 쓰면 뒤쪽 차례의 항목은 남은 예산이 없어 바로 실패함).
+    """
+    started = time.perf_counter()
+    if not req.items or len(req.items) > SOLVE_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"항목은 1~{SOLVE_BATCH_MAX_ITEMS}개까지 보낼 수 있습니다.")
+
+    keys = [(item.problem.strip(), item.location.strip()) for item in req.items]
+    pairs = list(dict.fromkeys(keys))
+    timings = {}
+    try:
+        resolved = await run_in_threadpool(resolve_problems, pairs, timings)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"해결책 생성 실패: {str(e)}")
 
+    semaphore = asyncio.Semaphore(SOLVE_BATCH_CONCURRENCY)
+
+    async def solve_one(pair, resolved_pair):
+        async with semaphore:
+            try:
+                return await run_in_threadpool(
+                    run_with_deadline, SOLVE_BUDGET_SECONDS,
+                    return_resolved_solution, pair[0], pair[1], resolved_pair,
+                ), None
+            except Exception as e:
+                logger.warning("배치 해결책 생성 실패", extra={"fields": {"problem": pair[0], "location": pair[1], "error": str(e)}})
+                return None, str(e)
+
+    solved = dict(zip(pairs, await asyncio.gather(*[solve_one(pair, r) for pair, r in zip(pairs, resolved)])))
+
+    results = []
+    for i, key in enumerate(keys):
+        solution, error = solved[key]
+        if error:
+            results.append({"index": i, "error": f"해결책 생성 실패: {error}"})
+            continue
+        answer, selected_problem, youtube_videos = solution
+        results.append({
+            "index": i,
+            "problem": selected_problem,
+            "location": req.items[i].location,
+            "solution": answer,
+            "youtube_videos": youtube_videos if youtube_videos else [],
+        })
+
+    timings["unique_items"] = len(pairs)
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return {"results": results, "timings": timings}
+
 
 # ------------------------ 제품 추천 (Google Custom Search API) ------------------------ #
 class RecommendRequest(BaseModel):
@@ -207,27 +590,32 @@ def _extract_rating_from_text(text: str) -> float:
                 continue
     return None
 
-def _google_search_products(keyword: str, limit: int = 10) -> list:
+def _google_search_products(keyword: str, limit: int = 10, priority: str = INTERACTIVE) -> list:
     """Google Custom Search API를 사용해서 제품을 검색합니다."""
     api_key = os.environ.get("GOOGLE_SEARCH_API_KEY")
     search_engine_id = os.environ.get("GOOGLE_SEARCH_ENGINE_ID")
     
     if not api_key or not search_engine_id:
-        print("Google Search API 키가 설정되지 않았습니다.")
+        logger.warning("Google Search API 키가 설정되지 않았습니다.")
         return []
 
     try:
-        service = build("customsearch", "v1", developerKey=api_key)
+        # 일일 할당량/호출 속도 확인 (부족하면 QuotaExhausted)
+        search_quota.acquire(1, priority)
+
+        # 공유 클라이언트 풀 사용 (서비스는 한 번만 생성, 스레드별 keep-alive 연결 재사용)
+        service = google_clients.service("customsearch", "v1", api_key)
         
         # 쇼핑몰 사이트에서 검색하도록 쿼리 최적화
         search_query = f"{keyword} 구매 가격 리뷰"
         
-        result = service.cse().list(
+        request = service.cse().list(
             q=search_query,
             cx=search_engine_id,
             num=limit,
             safe='active'
-        ).execute()
+        )
+        result = google_clients.execute("customsearch", request)
 
         products = []
         items = result.get('items', [])
@@ -273,10 +661,37 @@ def _google_search_products(keyword: str, limit: int = 10) -> list:
         
         return products
         
+    except QuotaExhausted as e:
+        logger.warning("Google Search API 호출 생략", extra={"fields": {"keyword": keyword, "reason": str(e)}})
+        return []
     except Exception as e:
-        print(f"Google Search API 오류: {e}")
+        if getattr(getattr(e, "resp", None), "status", None) in (403, 429) and "quota" in str(e).lower():
+            search_quota.mark_exhausted()
+        logger.error("Google Search API 오류", extra={"fields": {"keyword": keyword, "error": str(e)}})
         return []
 
+# 키워드별 제품 검색 결과 영구 캐시 (가격/별점 추출까지 끝난 결과 저장)
+PRODUCT_CACHE_TTL_SECONDS = float(os.environ.get("PRODUCT_CACHE_TTL_SECONDS", str(24 * 3600)))
+product_cache = PersistentTTLCache(
+    os.environ.get("PRODUCT_CACHE_PATH", "cache/products.db"),
+    table="products",
+    ttl_seconds=PRODUCT_CACHE_TTL_SECONDS,
+)
+
+def _cached_search_products(keyword: str, limit: int = 10) -> list:
+    """캐시된 제품 검색 결과 반환 (신선한 항목은 API 호출 없이, 오래된 항목은 검색 실패 시 대체로 사용)"""
+    key = f"{limit}:{keyword.strip()}"
+    cached = product_cache.get(key)
+    # 신선한 항목, 또는 할당량이 얼마 남지 않았을 때의 오래된 항목은 그대로 사용
+    if cached is not None and (cached[2] or search_quota.is_low()):
+        return cached[0]
+
+    products = _google_search_products(keyword, limit=limit)
+    if products:
+        product_cache.set(key, products)
+        return products
+    return cached[0] if cached is not None else []
+
 def _filter_and_rank_products(products: list, limit: int = 2) -> list:
     """제품을 필터링하고 순위를 매깁니다."""
     # 쇼핑몰 사이트 우선, 가격 정보 있는 것 우선, 별점 높은 것 우선
@@ -363,20 +778,54 @@ def _fallback_results(groups: list) -> list:
         })
     return results
 
-@app.post("/recommend/")
-async def recommend(req: RecommendRequest):
-    """제품 추천 API - Google Custom Search 사용"""
-    groups = _keyword_groups(req.problem, req.location, req.supplies_required, req.supplies_optional)
+async def _search_keywords(keywords: list, limit: int, deadline: float) -> dict:
+    """
+    키워드별 제품 검색을 동시에 실행 (동시 실행 수 RECOMMEND_CONCURRENCY로 제한)
+
+    예산 안에 끝나지 않은 키워드는 결과에서 빠지며, 끝나는 대로 캐시에는 저장됩니다.
+    """
+    semaphore = asyncio.Semaphore(RECOMMEND_CONCURRENCY)
+
+    async def search(kw):
+        async with semaphore:
+            return await run_in_threadpool(_cached_search_products, kw, limit)
+
+    tasks = {kw: asyncio.ensure_future(search(kw)) for kw in dict.fromkeys(keywords)}
+    if not tasks:
+        return {}
+    done, pending = await asyncio.wait(tasks.values(), timeout=max(0.0, deadline - time.monotonic()))
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning("제품 검색 예산 초과", extra={"fields": {"skipped": len(pending), "keywords": len(tasks)}})
+    return {
+        kw: task.result()
+        for kw, task in tasks.items()
+        if task in done and not task.cancelled() and task.exception() is None
+    }
+
+async def _recommend_groups(problem: str, location: str, supplies_required: list[str] | None = None,
+                            supplies_optional: list[str] | None = None) -> list:
+    """준비물 키워드 그룹별 추천 제품 목록 (/recommend, /diagnose 공용)"""
+    deadline = time.monotonic() + RECOMMEND_BUDGET_SECONDS
+    groups = _keyword_groups(problem, location, supplies_required, supplies_optional)
     has_keys = bool(os.environ.get("GOOGLE_SEARCH_API_KEY") and os.environ.get("GOOGLE_SEARCH_ENGINE_ID"))
 
     if not has_keys:
-        print("Google Search API 키가 없어서 기본 검색 링크를 제공합니다.")
-        return {"groups": _fallback_results(groups)}
+        logger.debug("Google Search API 키가 없어서 기본 검색 링크를 제공합니다.")
+        return _fallback_results(groups)
+
+    # 준비물 기반 그룹은 기본적으로 정확한 키워드 검색 링크로 제공 (네이버쇼핑)
+    def uses_search(g):
+        return RECOMMEND_SEARCH_SUPPLIES or g.get("group") not in ["준비물(필수)", "준비물(선택)"]
+
+    # 모든 그룹의 키워드를 한 번에 동시 검색 (Google API)
+    keywords = [kw for g in groups if uses_search(g) for kw in g["keywords"]]
+    results = await _search_keywords(keywords, limit=5, deadline=deadline)
 
     grouped = []
     for g in groups:
-        # 준비물 기반 그룹은 항상 정확한 키워드 검색 링크로 제공 (네이버쇼핑)
-        if g.get("group") in ["준비물(필수)", "준비물(선택)"]:
+        if not uses_search(g):
             items = _fallback_results([g])[0]["items"]
             grouped.append({
                 "group": g["group"],
@@ -386,10 +835,8 @@ async def recommend(req: RecommendRequest):
             continue
 
         all_products = []
-        # 각 키워드로 제품 검색 (Google API)
         for kw in g["keywords"]:
-            products = _google_search_products(kw, limit=5)
-            all_products.extend(products)
+            all_products.extend(results.get(kw, []))
 
         # 제품 필터링 및 순위 매기기
         if all_products:
@@ -404,4 +851,110 @@ async def recommend(req: RecommendRequest):
             "items": best_products
         })
 
-    return {"groups": grouped}
\ No newline at end of file
+    return grouped
+
+@app.post("/recommend/")
+async def recommend(req: RecommendRequest):
+    """제품 추천 API - Google Custom Search 사용"""
+    return {"groups": await _recommend_groups(req.problem, req.location, req.supplies_required, req.supplies_optional)}
+
+
+# ------------------------ 사진 한 장으로 전체 진단 ------------------------ #
+class DiagnoseRequest(BaseModel):
+    image_base64: str
+    # True면 단계가 끝나는 대로 NDJSON 한 줄씩 전송
+    stream: bool = False
+
+async def _diagnose_events(analysis: tuple, started: float):
+    """
+    /diagnose 단계별 결과를 끝나는 순서대로 생성
+
+    이미지 분석 결과로 문서 검색(문제 제목 확정) 후, 해결책 생성·유튜브 검색·준비물 추천을 동시에 실행합니다.
+    해결책과 유튜브 검색은 /solve와 같은 singleflight 키로 실행해서 같은 (문제, 위치)의 계산을 공유합니다.
+    스트리밍 응답은 헤더를 이미 보낸 뒤라서 단계가 실패해도 error 이벤트와 done으로 끝냅니다.
+    """
+    deadline = time.monotonic() + DIAGNOSE_BUDGET_SECONDS
+    predicted_problem, predicted_location, max_logit, waited, service = analysis
+    timings = {"vision_queue": round(waited * 1000, 1), "vision": round(service * 1000, 1)}
+    logger.info("이미지 분석", extra={"fields": {"problem": predicted_problem, "location": predicted_location, "max_logit": round(max_logit, 3)}})
+
+    if max_logit < PROBLEM_CONFIDENCE_THRESHOLD:
+        threshold_rejections.inc("diagnose")
+        logger.info("임계값 미달", extra={"fields": {"max_logit": round(max_logit, 3), "threshold": PROBLEM_CONFIDENCE_THRESHOLD}})
+        yield "analysis", {"problem": None, "location": None, "message": "사진을 다시 찍거나 채팅으로 물어보세요"}
+        return
+    yield "analysis", {"problem": predicted_problem, "location": predicted_location}
+
+    try:
+        resolved = await run_in_threadpool(resolve_problem, predicted_problem, predicted_location, timings)
+    except Exception as e:
+        logger.exception("진단 단계 실패", extra={"fields": {"stage": "retrieval"}})
+        yield "error", {"stage": "retrieval", "error": str(e)}
+        timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+        yield "done", ({"timings": timings} if DEBUG_TIMINGS else {})
+        return
+    selected_problem = resolved[2]
+    yield "selected_problem", {"selected_problem": selected_problem}
+
+    async def timed(name, coro):
+        stage_start = time.perf_counter()
+        try:
+            return name, await coro, None
+        except Exception as e:
+            logger.exception("진단 단계 실패", extra={"fields": {"stage": name}})
+            return name, None, str(e)
+        finally:
+            timings[name] = round((time.perf_counter() - stage_start) * 1000, 1)
+
+    stages = [
+        # 해결책 + 유튜브 검색 (return_solution과 같은 solution_flight)
+        timed("solution", run_in_threadpool(
+            run_with_deadline, max(0.0, deadline - time.monotonic()),
+            return_resolved_solution, predicted_problem, predicted_location, resolved,
+        )),
+        timed("supplies", _recommend_groups(selected_problem, predicted_location)),
+    ]
+
+    for next_stage in asyncio.as_completed(stages):
+        name, value, error = await next_stage
+        if name == "solution":
+            if error:
+                yield "solution", {"solution": None, "error": error}
+                yield "youtube_videos", {"youtube_videos": []}
+            else:
+                answer, _, youtube_videos = value
+                yield "youtube_videos", {"youtube_videos": youtube_videos or []}
+                yield "solution", {"solution": answer}
+        elif error:
+            yield name, {name: [], "error": error}
+        else:
+            yield name, {name: value}
+
+    timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    yield "done", ({"timings": timings} if DEBUG_TIMINGS else {})
+
+@app.post("/diagnose/")
+async def diagnose(data: DiagnoseRequest, request: Request):
+    """
+    사진 한 장으로 문제/위치, 해결책, 유튜브 영상, 준비물 추천을 한 번에 반환
+    (/analyze → /solve → /recommend 세 번의 왕복을 한 번으로)
+    """
+    # 이미지 분석은 스트리밍 시작 전에 끝내서 디코딩 실패(400)/대기열 초과(503)를 상태 코드로 반환
+    started = time.perf_counter()
+    analysis = await _admitted_analysis(data.image_base64, request)
+
+    if data.stream:
+        async def ndjson():
+            async for event, payload in _diagnose_events(analysis, started):
+                yield json.dumps({"event": event, **payload}, ensure_ascii=False) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    result = {}
+    errors = {}
+    async for event, payload in _diagnose_events(analysis, started):
+        if "error" in payload:
+            errors[payload.pop("stage", event)] = payload.pop("error")
+        result.update(payload)
+    if errors:
+        result["errors"] = errors
+    return result
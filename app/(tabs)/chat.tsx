@@ -92,6 +92,9 @@ export default function ChatScreen() {
   const slideAnim = useRef(new Animated.Value(-panelWidth)).current; // 왼쪽에서 시작
   const settingsSlideAnim = useRef(new Animated.Value(-panelWidth)).current;
   const scrollViewRef = useRef<ScrollView>(null);
+  // 서버 대화 상태(추가 질문 대기 등)를 구분하는 키 - 세션이 저장되기 전 첫 메시지부터 같은 키 사용
+  const newChatKey = () => `chat-${Date.now()}-${Math.random().toString(36).slice(2, 10)}`;
+  const chatKeyRef = useRef<string>(newChatKey());
 
   const scrollToBottom = () => {
     setTimeout(() => {
@@ -163,6 +166,7 @@ export default function ChatScreen() {
   // 세션 선택
   const handleSelectSession = async (sessionId: string) => {
     setCurrentSessionId(sessionId);
+    chatKeyRef.current = sessionId;
     setIsFirstMessage(false);
     
     // 세션별 메시지 불러오기
@@ -190,6 +194,7 @@ export default function ChatScreen() {
   // 새 세션 생성
   const handleCreateNewSession = async () => {
     setCurrentSessionId(null);
+    chatKeyRef.current = newChatKey();
     setIsFirstMessage(true);
     const welcomeMessage: Message = {
       id: "1",
@@ -344,6 +349,7 @@ export default function ChatScreen() {
       const apiClient = createApiClient();
       const response = await apiClient.post("/chat/", {
         message: messageText,
+        session_id: chatKeyRef.current,
       });
 
       // 구체적인 질문일 때 준비물 정보 가져오기
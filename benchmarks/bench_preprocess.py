@@ -0,0 +1,126 @@
+"""
+이미지 전처리 벤치마크: 기존 transform 경로 vs preprocess.py
+
+해상도별 합성 이미지(와 --images)로 아래 단계를 반복 측정하고, 결과 텐서가 기존 transform과 같은지 확인합니다.
+    legacy_decode     Image.open(...).convert('RGB') 후 예측 함수에서 convert('RGB') 한 번 더 (기존 경로)
+    decode            preprocess.decode_image (이미 RGB면 변환 없음)
+    decode_draft      JPEG 축소 디코딩 (PREPROCESS_DRAFT=1)
+    legacy_transform  efficientnet.transform(image).unsqueeze(0)
+    preprocess        preprocess.preprocess(image, out=버퍼) (input_buffer()로 빌린 재사용 버퍼, 예측 함수와 같은 경로)
+    legacy_batch      torch.stack([transform(image) ...])
+    preprocess_batch  preprocess.preprocess_batch(images, out=버퍼)
+--batch-size는 PREPROCESS_MAX_BATCH 이하여야 합니다.
+max_abs_diff가 0이 아니면(축소 디코딩 제외) 종료 코드 1.
+
+실행 예 (저장소 루트에서):
+    python -m benchmarks.bench_preprocess --batch-size 8 --output preprocess.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from benchmarks.bench_vision import (
+    SYNTHETIC_RESOLUTIONS,
+    _parse_list,
+    _parse_resolution,
+    peak_rss_mb,
+    recorded_jpegs,
+    summarize,
+    synthetic_jpegs,
+)
+
+
+def _measure(fn, iterations: int) -> list:
+    values = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        values.append((time.perf_counter() - start) * 1000)
+    return values
+
+
+def bench_source(images: list, batch_size: int, iterations: int) -> dict:
+    import io
+
+    import torch
+    from PIL import Image
+
+    from efficientnet import transform
+    from preprocess import decode_image, input_buffer, preprocess, preprocess_batch
+
+    data = images[0]
+    decoded = [decode_image(item, draft=False) for item in images]
+    batch_images = [decoded[i % len(decoded)] for i in range(batch_size)]
+
+    with input_buffer() as buffer:
+        stages = {
+            "legacy_decode": _measure(lambda: Image.open(io.BytesIO(data)).convert("RGB").convert("RGB"), iterations),
+            "decode": _measure(lambda: decode_image(data, draft=False), iterations),
+            "decode_draft": _measure(lambda: decode_image(data, draft=True), iterations),
+            "legacy_transform": _measure(lambda: transform(decoded[0]).unsqueeze(0), iterations),
+            "preprocess": _measure(lambda: preprocess(decoded[0], out=buffer), iterations),
+            "legacy_batch": _measure(lambda: torch.stack([transform(image) for image in batch_images]), iterations),
+            "preprocess_batch": _measure(lambda: preprocess_batch(batch_images, out=buffer), iterations),
+        }
+
+        # 값 비교 (전처리 결과는 재사용 버퍼의 뷰라서 비교 전에 복사)
+        max_abs_diff = 0.0
+        for image in decoded:
+            expected = transform(image).unsqueeze(0)
+            max_abs_diff = max(max_abs_diff, (preprocess(image, out=buffer).clone() - expected).abs().max().item())
+        expected_batch = torch.stack([transform(image) for image in batch_images])
+        max_abs_diff = max(
+            max_abs_diff, (preprocess_batch(batch_images, out=buffer).clone() - expected_batch).abs().max().item()
+        )
+        draft_abs_diff = (
+            preprocess(decode_image(data, draft=True), out=buffer).clone() - transform(decoded[0]).unsqueeze(0)
+        ).abs().max().item()
+
+    return {
+        "stages": {name: summarize(values) for name, values in stages.items()},
+        "max_abs_diff": max_abs_diff,
+        "draft_max_abs_diff": round(draft_abs_diff, 4),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HomeFix 이미지 전처리 벤치마크")
+    parser.add_argument("--images", nargs="*", default=[], help="측정에 추가할 이미지 파일 또는 디렉터리")
+    parser.add_argument("--resolutions", default=SYNTHETIC_RESOLUTIONS, help="합성 이미지 해상도 (가로x세로, 쉼표 구분)")
+    parser.add_argument("--synthetic-count", type=int, default=4, help="해상도별 합성 이미지 수")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--output", help="결과를 저장할 JSON 파일")
+    args = parser.parse_args()
+
+    sources = [
+        (f"synthetic-{resolution}", synthetic_jpegs(*_parse_resolution(resolution), args.synthetic_count))
+        for resolution in _parse_list(args.resolutions, str)
+    ]
+    if args.images:
+        sources.append(("recorded", recorded_jpegs(args.images)))
+
+    results = {}
+    for source, images in sources:
+        if not images:
+            print(f"⚠️ {source}: 이미지가 없어 건너뜁니다.")
+            continue
+        result = results[source] = bench_source(images, args.batch_size, args.iterations)
+        print(f"\n{source}  max_abs_diff {result['max_abs_diff']}  (축소 디코딩 {result['draft_max_abs_diff']})")
+        for stage, stats in result["stages"].items():
+            print(f"  - {stage:<17} p50 {stats['p50_ms']}ms  p90 {stats['p90_ms']}ms  p99 {stats['p99_ms']}ms")
+
+    report = {"batch_size": args.batch_size, "cpu_count": os.cpu_count(), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if any(result["max_abs_diff"] != 0 for result in results.values()):
+        print("\n⚠️ preprocess 결과가 기존 transform과 다릅니다.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+비전 파이프라인(efficientnet.py) 마이크로 벤치마크
+
+합성 이미지(해상도별)와 사용자 이미지(--images, 원본 크기 그대로)로
+torch 스레드 수 × 배치 크기 조합마다 아래 단계를 반복 측정합니다.
+    decode         JPEG 바이트 → RGB PIL 이미지 (preprocess.decode_image)
+    transform      PIL 이미지 → 입력 텐서 (preprocess.preprocess + 재사용 버퍼, 예측 함수와 같은 경로)
+    predict_image  디코딩된 이미지 1장의 2단계 추론 (transform 포함)
+    run_pipeline_per_image
+                   JPEG 바이트부터 문제명/위치명까지 (batch_size > 1이면 run_pipeline_batch),
+                   배치 하나의 시간을 batch_size로 나눈 이미지 1장당 값
+단계별 지연 시간 백분위수(ms), images/sec, 조합별 RSS를 JSON으로 저장하고,
+--baseline으로 이전 결과와 p50을 비교합니다 (양자화, channels_last, 배치 등 변경 전후 비교용).
+
+- GPU 없이 CPU만으로 실행 가능 (장치는 efficientnet.device를 그대로 사용)
+- --random-weights: 학습된 가중치(models/*.pt) 없이 같은 구조의 무작위 가중치로 측정
+  (예측 결과는 의미 없지만 연산량은 같음)
+- --optimized: 최적화 실행 모드(channels_last, inference_mode, torch.compile, 입력 버퍼 재사용)로 측정
+- 조합별 peak_rss_mb는 조합 시작 시 최대 RSS를 초기화하고(/proc/self/clear_refs, 리눅스) 잰 값,
+  rss_delta_mb는 조합 전후 현재 RSS 차이입니다. 초기화할 수 없는 환경에서는 peak_rss_mb가 null.
+
+실행 예 (저장소 루트에서):
+    python -m benchmarks.bench_vision --random-weights --threads 1,4 --batch-sizes 1,4 --output baseline.json
+    python -m benchmarks.bench_vision --images samples/ --baseline baseline.json --max-regression 0.1
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+
+SYNTHETIC_RESOLUTIONS = "640x480,1440x1080,4032x3024"  # 가로x세로 (폰 카메라 원본 4032x3024)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def percentile(values: list, p: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round((len(ordered) - 1) * p / 100)))
+    return round(ordered[idx], 2)
+
+
+def summarize(values: list) -> dict:
+    return {
+        "n": len(values),
+        "p50_ms": percentile(values, 50),
+        "p90_ms": percentile(values, 90),
+        "p99_ms": percentile(values, 99),
+        "mean_ms": round(sum(values) / len(values), 2) if values else None,
+    }
+
+
+def peak_rss_mb() -> float:
+    """지금까지의 최대 RSS (리눅스는 kB, macOS는 바이트 단위)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def proc_status_mb(field: str):
+    """/proc/self/status의 메모리 항목 (VmRSS: 현재 RSS, VmHWM: 최대 RSS), 리눅스가 아니면 None"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)  # kB
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss() -> bool:
+    """최대 RSS(VmHWM)를 현재 RSS로 초기화 (리눅스 4.0+, 실패하면 False)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def synthetic_jpegs(width: int, height: int, count: int, seed: int = 0) -> list:
+    """
+    사진과 비슷한 JPEG 바이트 생성 (작은 무작위 이미지를 확대해서 부드러운 색 변화)
+
+    순수 노이즈는 JPEG 크기와 디코딩 비용이 실제 사진보다 훨씬 커지므로 사용하지 않습니다.
+    """
+    from PIL import Image
+
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        small = Image.frombytes("RGB", (32, 24), rng.randbytes(32 * 24 * 3))
+        buffer = io.BytesIO()
+        small.resize((width, height), Image.BICUBIC).save(buffer, format="JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def recorded_jpegs(paths: list) -> list:
+    """--images로 받은 파일/디렉터리에서 이미지 바이트 읽기"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                f for f in glob.glob(os.path.join(path, "*")) if f.lower().endswith(IMAGE_EXTENSIONS)
+            ))
+        else:
+            files.append(path)
+    images = []
+    for file in files:
+        with open(file, "rb") as f:
+            images.append(f.read())
+    return images
+
+
+def random_weight_models():
+    """학습된 가중치 없이 load_models()와 같은 구조의 모델 생성"""
+    from efficientnet import EfficientNetV2Problem, EfficientNetV2_Location, device, location_labels, problems
+
+    problem_model = EfficientNetV2Problem(num_labels=len(problems), pretrained=False).to(device).eval()
+    location_models = {
+        name: EfficientNetV2_Location(num_classes=len(location_labels[name]), pretrained=False).to(device).eval()
+        for name in problems
+    }
+    return {"problem_model": problem_model, "location_models": location_models}
+
+
+def _decode(data: bytes):
+    from preprocess import decode_image
+    return decode_image(data)
+
+
+def _timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def bench_config(models, images: list, batch_size: int, iterations: int, warmup: int) -> dict:
+    """현재 스레드 설정으로 한 조합 측정"""
+    import efficientnet
+    from preprocess import input_buffer, preprocess
+
+    decoded = [_decode(data) for data in images]
+    stages = {"decode": [], "transform": [], "predict_image": [], "run_pipeline_per_image": []}
+    rss_before = proc_status_mb("VmRSS")
+    peak_reset = reset_peak_rss()
+
+    for _ in range(warmup):
+        efficientnet.predict_image(models, decoded[0])
+        if batch_size > 1:
+            efficientnet.run_pipeline_batch(decoded[:batch_size], model=models, batch_size=batch_size)
+
+    for i in range(iterations):
+        data = images[i % len(images)]
+        image = decoded[i % len(images)]
+        stages["decode"].append(_timed(_decode, data))
+        with input_buffer() as buffer:
+            stages["transform"].append(_timed(preprocess, image, buffer))
+        stages["predict_image"].append(_timed(efficientnet.predict_image, models, image))
+
+    # 엔드 투 엔드: 디코딩부터 이름 변환까지 (batch_size장씩)
+    pipeline_images = 0
+    pipeline_seconds = 0.0
+    for i in range(iterations):
+        batch = [images[(i * batch_size + j) % len(images)] for j in range(batch_size)]
+        if batch_size == 1:
+            elapsed = _timed(lambda data: efficientnet.run_pipeline(_decode(data), model=models), batch[0])
+        else:
+            elapsed = _timed(
+                lambda datas: efficientnet.run_pipeline_batch(
+                    [_decode(data) for data in datas], model=models, batch_size=batch_size
+                ),
+                batch,
+            )
+        stages["run_pipeline_per_image"].append(elapsed / batch_size)
+        pipeline_images += batch_size
+        pipeline_seconds += elapsed / 1000
+
+    rss_after = proc_status_mb("VmRSS")
+    return {
+        "stages": {name: summarize(values) for name, values in stages.items()},
+        "images_per_sec": round(pipeline_images / pipeline_seconds, 2) if pipeline_seconds else None,
+        "peak_rss_mb": proc_status_mb("VmHWM") if peak_reset else None,
+        "rss_delta_mb": round(rss_after - rss_before, 1) if rss_before is not None and rss_after is not None else None,
+    }
+
+
+def _parse_list(value: str, cast=int) -> list:
+    return [cast(item) for item in value.split(",") if item.strip()]
+
+
+def _parse_resolution(value: str) -> tuple:
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def run(args) -> dict:
+    import torch
+    import efficientnet
+
+    load_start = time.perf_counter()
+    if args.random_weights:
+        models = random_weight_models()
+        if args.optimized:
+            models = efficientnet.optimize_models(models)
+    else:
+        models = efficientnet.load_models(optimized=args.optimized)
+    # 최적화 모드는 여기서 torch.compile 컴파일까지 끝냄
+    efficientnet.warm_up(models)
+    load_seconds = time.perf_counter() - load_start
+    # 조합마다 최대 RSS를 초기화하므로 전체 최고치는 로딩 시점 값과 조합별 값 중 최대
+    process_peak_mb = peak_rss_mb()
+
+    sources = [
+        (f"synthetic-{resolution}", synthetic_jpegs(*_parse_resolution(resolution), args.synthetic_count))
+        for resolution in _parse_list(args.resolutions, str)
+    ]
+    if args.images:
+        sources.append(("recorded", recorded_jpegs(args.images)))
+
+    results = []
+    for source, images in sources:
+        if not images:
+            print(f"⚠️ {source}: 이미지가 없어 건너뜁니다.")
+            continue
+        for threads in _parse_list(args.threads):
+            torch.set_num_threads(threads)
+            for batch_size in _parse_list(args.batch_sizes):
+                result = bench_config(models, images, batch_size, args.iterations, args.warmup)
+                result.update({"source": source, "threads": threads, "batch_size": batch_size})
+                results.append(result)
+                print_result(result)
+                process_peak_mb = max(process_peak_mb, result["peak_rss_mb"] or 0)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "device": str(efficientnet.device),
+            "cpu_count": os.cpu_count(),
+            "platform": platform.platform(),
+            "random_weights": args.random_weights,
+            "optimized": args.optimized,
+            "physical_cores": efficientnet.physical_core_count(),
+            "iterations": args.iterations,
+        },
+        "load_seconds": round(load_seconds, 2),
+        "peak_rss_mb": max(process_peak_mb, peak_rss_mb()),
+        "results": results,
+    }
+
+
+def _result_key(result: dict) -> str:
+    return f"{result['source']}|threads={result['threads']}|batch={result['batch_size']}"
+
+
+def compare(report: dict, baseline: dict) -> list:
+    """
+    기준 결과와 p50 비교
+
+    Returns:
+        [{"config", "stage", "baseline_p50_ms", "p50_ms", "change"}, ...] (change: +0.1 = 10% 느려짐)
+    """
+    baseline_results = {_result_key(r): r for r in baseline.get("results", [])}
+    rows = []
+    for result in report["results"]:
+        previous = baseline_results.get(_result_key(result))
+        if previous is None:
+            continue
+        for stage, stats in result["stages"].items():
+            old = previous["stages"].get(stage, {}).get("p50_ms")
+            new = stats["p50_ms"]
+            if not old or new is None:
+                continue
+            rows.append({
+                "config": _result_key(result),
+                "stage": stage,
+                "baseline_p50_ms": old,
+                "p50_ms": new,
+                "change": round(new / old - 1, 3),
+            })
+    return rows
+
+
+def print_result(result: dict):
+    print(f"\n{_result_key(result)}  {result['images_per_sec']} img/s  "
+          f"최대 RSS {result['peak_rss_mb']}MB  RSS 증가 {result['rss_delta_mb']}MB")
+    for stage, stats in result["stages"].items():
+        print(f"  - {stage:<22} p50 {stats['p50_ms']}ms  p90 {stats['p90_ms']}ms  p99 {stats['p99_ms']}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HomeFix 비전 파이프라인 벤치마크")
+    parser.add_argument("--images", nargs="*", default=[], help="측정에 추가할 이미지 파일 또는 디렉터리")
+    parser.add_argument("--resolutions", default=SYNTHETIC_RESOLUTIONS, help="합성 이미지 해상도 (가로x세로, 쉼표 구분)")
+    parser.add_argument("--synthetic-count", type=int, default=4, help="해상도별 합성 이미지 수")
+    parser.add_argument("--threads", default=str(os.cpu_count() or 1), help="torch 스레드 수 (쉼표 구분)")
+    parser.add_argument("--batch-sizes", default="1,4", help="run_pipeline 배치 크기 (쉼표 구분)")
+    parser.add_argument("--iterations", type=int, default=20, help="조합별 반복 횟수")
+    parser.add_argument("--warmup", type=int, default=2, help="조합별 측정 전 워밍업 횟수")
+    parser.add_argument("--random-weights", action="store_true", help="학습된 가중치 대신 무작위 가중치 사용")
+    parser.add_argument("--optimized", action="store_true", help="최적화 실행 모드로 측정")
+    parser.add_argument("--baseline", help="비교할 이전 결과 JSON 파일")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="p50이 기준보다 이 비율 이상 느려진 단계가 있으면 종료 코드 1 (예: 0.1)")
+    parser.add_argument("--output", help="결과를 저장할 JSON 파일")
+    args = parser.parse_args()
+
+    report = run(args)
+
+    failed = False
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f))
+        print("\n기준 대비 p50 변화")
+        for row in report["comparison"]:
+            print(f"  {row['config']:<40} {row['stage']:<22} {row['baseline_p50_ms']}ms → {row['p50_ms']}ms ({row['change']:+.1%})")
+            if args.max_regression is not None and row["change"] > args.max_regression:
+                failed = True
+
+    print(f"\n모델 로딩 {report['load_seconds']}초  최대 RSS {report['peak_rss_mb']}MB")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
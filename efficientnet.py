@@ -8,12 +8,16 @@ from torchvision.transforms import InterpolationMode
 from PIL import Image
 import pandas as pd
 import os
+import time
 import warnings
 import logging
 import timm
 from efficientnet_pytorch import EfficientNet
 
 from torchvision import models
+from metrics import stage_seconds
+from preprocess import PREPROCESS_MAX_BATCH, decode_image, ensure_rgb, input_buffer, preprocess, preprocess_batch
+from profiling import torch_profile
 
 # 경고 필터링
 warnings.filterwarnings('ignore')
@@ -24,9 +28,10 @@ warnings.filterwarnings('ignore', message='.*threadpoolctl.*')
 # ------------------------- 모델 정의 ------------------------- #
 # 1. 문제 예측 모델 (EfficientNetV2-M 기반)
 class EfficientNetV2Problem(nn.Module):
-    def __init__(self, num_labels):
+    def __init__(self, num_labels, pretrained=True):
         super().__init__()
-        self.backbone = models.efficientnet_v2_m(weights='IMAGENET1K_V1')
+        # 학습된 가중치를 바로 불러올 때는 ImageNet 가중치 로딩 생략 (pretrained=False)
+        self.backbone = models.efficientnet_v2_m(weights='IMAGENET1K_V1' if pretrained else None)
         feature_dim = self.backbone.classifier[-1].in_features
         self.backbone.classifier = nn.Identity()
         
@@ -45,9 +50,9 @@ class EfficientNetV2Problem(nn.Module):
 
 # 2. 위치 예측 모델 (EfficientNetV2-M 기반)
 class EfficientNetV2_Location(nn.Module):
-    def __init__(self, num_classes=11):  # 위치 클래스 개수에 맞게 수정
+    def __init__(self, num_classes=11, pretrained=True):  # 위치 클래스 개수에 맞게 수정
         super().__init__()
-        self.backbone = models.efficientnet_v2_m(weights='IMAGENET1K_V1')
+        self.backbone = models.efficientnet_v2_m(weights='IMAGENET1K_V1' if pretrained else None)
         in_features = self.backbone.classifier[1].in_features
         self.backbone.classifier = nn.Linear(in_features, num_classes)
     
@@ -57,6 +62,16 @@ class EfficientNetV2_Location(nn.Module):
 
 # ------------------------- 설정 ------------------------- #
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+logger = logging.getLogger("homefix.vision")
+
+# 최적화 실행 모드: channels_last + inference_mode + torch.compile + 입력 버퍼 재사용 + 물리 코어 기준 스레드 수
+VISION_OPTIMIZED = os.environ.get("VISION_OPTIMIZED") == "1"
+# 최적화 모드에서 torch.compile 사용 여부 (실패하면 해당 모델만 eager로 실행)
+VISION_COMPILE = os.environ.get("VISION_COMPILE", "1") == "1"
+# torch.compile 모드 (default | reduce-overhead | max-autotune)
+VISION_COMPILE_MODE = os.environ.get("VISION_COMPILE_MODE", "default")
+# 추론 스레드 수 (비우면 물리 코어 수)
+VISION_THREADS = os.environ.get("VISION_THREADS")
 
 # 문제 유형 정의
 problems = ['기름때', '곰팡이', '녹', '물때', '깨짐', '찢어짐', '스크래치']
@@ -94,8 +109,14 @@ valid_location_scope = {}
 __all__ = [
     'load_model',
     'load_models',
+    'warm_up',
     'run_pipeline',
+    'run_pipeline_batch',
+    'predict_batch',
     'predict_image',
+    'optimize_models',
+    'configure_threads',
+    'physical_core_count',
     'problems',
     'location_labels',
     'problem_to_model_file',
@@ -105,6 +126,7 @@ __all__ = [
 ]
 
 # 추론용 transform (랜덤 증강 제거 - 일관된 결과를 위해)
+# 예측 함수는 같은 값을 중간 복사본 없이 만드는 preprocess.py를 사용 (이 transform은 기준값/하위 호환용)
 transform = transforms.Compose([
     transforms.Resize((384, 384), interpolation=InterpolationMode.BILINEAR),
     transforms.ToTensor(),
@@ -113,10 +135,29 @@ transform = transforms.Compose([
 
 
 # ------------------------- 모델 로딩 ------------------------- #
-def load_models():
+def _load_weights(model, model_path, mmap=False):
+    """
+    학습된 가중치 로딩
+    
+    mmap=True(CPU 전용)이면 파일을 메모리 매핑한 텐서를 모델 파라미터로 그대로 사용합니다 (assign=True).
+    가중치가 페이지 캐시에 한 번만 올라가므로 여러 프로세스가 같은 파일을 읽어도 메모리가 늘지 않습니다.
+    """
+    use_mmap = mmap and device.type == "cpu"
+    state_dict = torch.load(model_path, map_location=device, mmap=use_mmap)
+    model.load_state_dict(state_dict, assign=use_mmap)
+    model.to(device)
+    model.eval()
+    return model
+
+
+def load_models(mmap=False, optimized=None):
     """
     문제 예측 모델과 7개의 위치 예측 모델을 로딩합니다.
     
+    Args:
+        mmap: 가중치 파일을 메모리 매핑해서 사용 (serve_prefork.py에서 워커 간 공유용)
+        optimized: 최적화 실행 모드 적용 (None이면 VISION_OPTIMIZED 환경 변수)
+    
     Returns:
         dict: {
             'problem_model': 문제 예측 모델,
@@ -124,29 +165,25 @@ def load_models():
         }
     """
     # 1. 문제 예측 모델 로딩 (EfficientNetV2-M)
-    problem_model = EfficientNetV2Problem(num_labels=7)
-    problem_model.load_state_dict(
-        torch.load('models/best_efficientnetv2_model_3.pt', map_location=device)
+    problem_model = _load_weights(
+        EfficientNetV2Problem(num_labels=7, pretrained=False), 'models/best_efficientnetv2_model_3.pt', mmap
     )
-    problem_model.to(device)
-    problem_model.eval()
     
     # 2. 각 문제 유형별 위치 예측 모델 로딩 (EfficientNetV2-M)
     location_models = {}
     for problem_name, model_path in problem_to_model_file.items():
         num_locations = len(location_labels[problem_name])
-        loc_model = EfficientNetV2_Location(num_classes=num_locations)
-        loc_model.load_state_dict(
-            torch.load(model_path, map_location=device)
+        location_models[problem_name] = _load_weights(
+            EfficientNetV2_Location(num_classes=num_locations, pretrained=False), model_path, mmap
         )
-        loc_model.to(device)
-        loc_model.eval()
-        location_models[problem_name] = loc_model
     
-    return {
+    models_dict = {
         'problem_model': problem_model,
         'location_models': location_models
     }
+    if VISION_OPTIMIZED if optimized is None else optimized:
+        models_dict = optimize_models(models_dict)
+    return models_dict
 
 
 def load_model():
@@ -154,6 +191,147 @@ def load_model():
     return load_models()
 
 
+# ------------------------- 최적화 실행 모드 ------------------------- #
+def physical_core_count():
+    """
+    이 프로세스가 사용할 수 있는 물리 코어 수 (하이퍼스레딩 논리 코어 제외)
+
+    /proc/cpuinfo의 (physical id, core id) 조합으로 세고, 정보가 없으면 사용 가능한 논리 코어 수를 반환합니다.
+    """
+    allowed = os.sched_getaffinity(0) if hasattr(os, "sched_getaffinity") else set(range(os.cpu_count() or 1))
+    cores = set()
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            entry = {}
+            for line in f.read().splitlines() + [""]:
+                if line.strip():
+                    key, _, value = line.partition(":")
+                    entry[key.strip()] = value.strip()
+                    continue
+                if "core id" in entry and int(entry.get("processor", -1)) in allowed:
+                    cores.add((entry.get("physical id", "0"), entry["core id"]))
+                entry = {}
+    except (OSError, ValueError):
+        pass
+    return len(cores) or len(allowed)
+
+
+def configure_threads(num_threads=None):
+    """
+    추론 스레드 수 설정 (기본: VISION_THREADS 또는 물리 코어 수)
+
+    논리 코어(하이퍼스레딩)까지 쓰면 같은 코어의 연산 유닛을 나눠 써서 오히려 느려지므로 물리 코어 수만큼만 사용합니다.
+    """
+    num_threads = num_threads or int(VISION_THREADS or physical_core_count())
+    torch.set_num_threads(num_threads)
+    try:
+        # 모델 간 병렬 실행은 하지 않으므로 inter-op 스레드는 1개 (이미 병렬 작업이 시작됐으면 설정 불가)
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    return num_threads
+
+
+class _CompiledModel:
+    """torch.compile한 모델 (컴파일이나 실행이 실패하면 이후로는 eager 모델로 실행)"""
+
+    def __init__(self, name, model):
+        self.name = name
+        self.eager = model
+        self.compiled = torch.compile(model, mode=VISION_COMPILE_MODE)
+        self.failed = False
+
+    def __call__(self, x):
+        if not self.failed:
+            try:
+                return self.compiled(x)
+            except Exception as e:
+                self.failed = True
+                logger.warning("torch.compile 실행 실패, eager로 전환", extra={"fields": {"model": self.name, "error": str(e)}})
+        return self.eager(x)
+
+
+def optimize_models(models_dict, compile=None):
+    """
+    최적화 실행 모드로 변환 (출력은 eager 모드와 같은 형태)
+
+    - 가중치를 channels_last 메모리 형식으로 변환 (합성곱이 NHWC 커널을 사용)
+    - torch.compile 적용 (compile=None이면 VISION_COMPILE, 실제 컴파일은 warm_up에서)
+    - 예측 함수는 optimized 표시를 보고 inference_mode와 재사용 입력 버퍼를 사용
+
+    mmap으로 로딩한 가중치는 channels_last로 변환하면서 복사되므로, serve_prefork.py에서는
+    부모 프로세스에서 변환해서 워커가 복사본을 공유합니다.
+    """
+    use_compile = (VISION_COMPILE if compile is None else compile) and hasattr(torch, "compile")
+
+    def optimize(name, model):
+        model = model.to(memory_format=torch.channels_last).eval()
+        return _CompiledModel(name, model) if use_compile else model
+
+    return {
+        'problem_model': optimize('problem', models_dict['problem_model']),
+        'location_models': {
+            problem_name: optimize(problem_name, loc_model)
+            for problem_name, loc_model in models_dict['location_models'].items()
+        },
+        'optimized': True,
+    }
+
+
+def _input_buffer(models_dict):
+    """예측 함수가 전처리에 쓸 재사용 버퍼 (최적화 모드면 channels_last 형식이라 모델 입력으로 그대로 사용)"""
+    return input_buffer(channels_last=bool(models_dict.get('optimized')))
+
+
+def _model_input(models_dict, tensor):
+    """
+    모델 입력 준비 (preprocess 버퍼는 CUDA면 pinned 메모리라서 비동기 복사 가능)
+
+    최적화 모드의 전처리 결과는 이미 channels_last 버퍼의 뷰라서 CPU에서는 복사하지 않습니다.
+    batch[idxs]처럼 형식이 다른 입력만 channels_last로 변환합니다.
+    """
+    tensor = tensor.to(device, non_blocking=True)
+    if models_dict.get('optimized'):
+        tensor = tensor.contiguous(memory_format=torch.channels_last)
+    return tensor
+
+
+def _inference(models_dict):
+    return torch.inference_mode() if models_dict.get('optimized') else torch.no_grad()
+
+
+def warm_up(models_dict, image_size=384):
+    """
+    모든 모델에 합성 입력으로 한 번씩 추론해서 첫 요청의 지연(메모리 할당, 커널 선택 등)을 미리 처리합니다.
+    최적화 모드에서는 이때 torch.compile 컴파일이 실행됩니다. 배치 1은 고정 크기로, 배치 추론과
+    문제별로 묶은 위치 추론(1~PREPROCESS_MAX_BATCH장)은 배치 차원을 동적으로 표시한 그래프 하나로
+    컴파일해서, 요청 중에 배치 크기마다 다시 컴파일하지 않습니다.
+    
+    Args:
+        models_dict: load_models()로 로드한 모델 딕셔너리
+        image_size: 입력 이미지 크기 (transform과 동일)
+    """
+    start = time.perf_counter()
+    compiled = isinstance(models_dict['problem_model'], _CompiledModel)
+    batch_sizes = [1]
+    if compiled and PREPROCESS_MAX_BATCH > 1 and hasattr(torch, "_dynamo"):
+        batch_sizes.append(PREPROCESS_MAX_BATCH)
+    for batch_size in batch_sizes:
+        dummy = _model_input(models_dict, torch.zeros(batch_size, 3, image_size, image_size))
+        if batch_size > 1:
+            torch._dynamo.mark_dynamic(dummy, 0)
+        with _inference(models_dict):
+            models_dict['problem_model'](dummy)
+            for loc_model in models_dict['location_models'].values():
+                loc_model(dummy)
+    if models_dict.get('optimized'):
+        logger.info("최적화 모드 워밍업 완료", extra={"fields": {
+            "seconds": round(time.perf_counter() - start, 1),
+            "batch_sizes": batch_sizes,
+            "threads": torch.get_num_threads(),
+        }})
+
+
 # ------------------------- 예측 함수 ------------------------- #
 def predict_image(models_dict, image_path_or_pil):
     """
@@ -166,31 +344,84 @@ def predict_image(models_dict, image_path_or_pil):
     Returns:
         tuple: (문제 인덱스, 위치 인덱스 (해당 문제 내에서의 인덱스), 최대 로짓 값)
     """
-    # 이미지 로딩 및 전처리
-    if isinstance(image_path_or_pil, str):
-        image = Image.open(image_path_or_pil).convert('RGB')
-    else:
-        image = image_path_or_pil.convert('RGB')
-    
-    image_tensor = transform(image).unsqueeze(0).to(device)
-    
-    # 1단계: 문제 예측
-    with torch.no_grad():
-        problem_output = models_dict['problem_model'](image_tensor)
-        pred_problem_idx = torch.argmax(problem_output, dim=1).item()
-        # argmax한 로짓 값 추출 (softmax 없이)
-        max_logit = problem_output[0][pred_problem_idx].item()
+    # 프로파일링 대상 요청이면 torch.profiler로 기록 (아니면 아무 것도 하지 않음)
+    with torch_profile("predict_image"):
+        # 이미지 로딩 및 전처리
+        if isinstance(image_path_or_pil, str):
+            with stage_seconds.time("pil_decode"):
+                image = decode_image(image_path_or_pil)
+        else:
+            image = ensure_rgb(image_path_or_pil)
     
-    # 예측된 문제명
-    pred_problem_name = problems[pred_problem_idx]
+        # 입력 버퍼는 결과를 .item()으로 받을 때까지 사용 (with 블록을 나가면 다른 요청이 재사용)
+        with _input_buffer(models_dict) as buffer:
+            with stage_seconds.time("transform"):
+                image_tensor = _model_input(models_dict, preprocess(image, out=buffer))
+
+            # 1단계: 문제 예측
+            with _inference(models_dict), stage_seconds.time("problem_forward"):
+                problem_output = models_dict['problem_model'](image_tensor)
+                pred_problem_idx = torch.argmax(problem_output, dim=1).item()
+                # argmax한 로짓 값 추출 (softmax 없이)
+                max_logit = problem_output[0][pred_problem_idx].item()
+
+            # 예측된 문제명
+            pred_problem_name = problems[pred_problem_idx]
+
+            # 2단계: 해당 문제의 위치 모델로 위치 예측
+            location_model = models_dict['location_models'][pred_problem_name]
+            with _inference(models_dict), stage_seconds.time("location_forward"):
+                location_output = location_model(image_tensor)
+                pred_location_idx = torch.argmax(location_output, dim=1).item()
+
+            return pred_problem_idx, pred_location_idx, max_logit
+
+
+def predict_batch(models_dict, images, batch_size=8):
+    """
+    여러 이미지를 묶어서 2단계 예측 (predict_image의 배치 버전)
     
-    # 2단계: 해당 문제의 위치 모델로 위치 예측
-    location_model = models_dict['location_models'][pred_problem_name]
-    with torch.no_grad():
-        location_output = location_model(image_tensor)
-        pred_location_idx = torch.argmax(location_output, dim=1).item()
+    문제 모델은 batch_size개씩 한 번에, 위치 모델은 예측된 문제별로 모아서 한 번에 추론합니다.
     
-    return pred_problem_idx, pred_location_idx, max_logit
+    Args:
+        models_dict: load_models()로 로드한 모델 딕셔너리
+        images: 이미지 파일 경로 또는 PIL Image 객체 목록
+        batch_size: 한 번에 추론할 최대 이미지 수 (메모리 사용량 제한, PREPROCESS_MAX_BATCH를 넘으면 그 값)
+        
+    Returns:
+        list: 이미지별 (문제 인덱스, 위치 인덱스, 최대 로짓 값)
+    """
+    # 재사용 입력 버퍼 크기(PREPROCESS_MAX_BATCH)보다 크게 묶지 않음
+    batch_size = max(1, min(batch_size, PREPROCESS_MAX_BATCH))
+    results = []
+    for chunk_start in range(0, len(images), batch_size):
+        chunk = images[chunk_start:chunk_start + batch_size]
+        chunk = [decode_image(img) if isinstance(img, str) else img for img in chunk]
+        with _input_buffer(models_dict) as buffer:
+            with stage_seconds.time("transform"):
+                batch = _model_input(models_dict, preprocess_batch(chunk, out=buffer))
+
+            # 1단계: 문제 예측 (한 번에)
+            with _inference(models_dict), stage_seconds.time("problem_forward"):
+                problem_output = models_dict['problem_model'](batch)
+                max_logits, pred_problem_idxs = problem_output.max(dim=1)
+            pred_problem_idxs = pred_problem_idxs.tolist()
+            max_logits = max_logits.tolist()
+
+            # 2단계: 예측된 문제별로 묶어서 위치 예측
+            pred_location_idxs = [None] * len(chunk)
+            by_problem = {}
+            for i, problem_idx in enumerate(pred_problem_idxs):
+                by_problem.setdefault(problems[problem_idx], []).append(i)
+            for problem_name, idxs in by_problem.items():
+                location_model = models_dict['location_models'][problem_name]
+                with _inference(models_dict), stage_seconds.time("location_forward"):
+                    location_output = location_model(_model_input(models_dict, batch[idxs]))
+                for i, location_idx in zip(idxs, torch.argmax(location_output, dim=1).tolist()):
+                    pred_location_idxs[i] = location_idx
+
+        results.extend(zip(pred_problem_idxs, pred_location_idxs, max_logits))
+    return results
 
 
 # ------------------------- 파이프라인 함수 ------------------------- #
@@ -218,3 +449,20 @@ def run_pipeline(image_path_or_pil, model=None):
     
     return pred_problem_name, pred_location_name, max_logit
 
+
+
+def run_pipeline_batch(images, model=None, batch_size=8):
+    """
+    여러 이미지의 문제와 위치를 한 번에 예측 (run_pipeline의 배치 버전)
+    
+    Returns:
+        list: 이미지별 (문제명, 위치명, 최대 로짓 값)
+    """
+    if model is None:
+        model = load_models()
+    
+    results = []
+    for pred_problem_idx, pred_location_idx, max_logit in predict_batch(model, images, batch_size=batch_size):
+        pred_problem_name = problems[pred_problem_idx]
+        results.append((pred_problem_name, location_labels[pred_problem_name][pred_location_idx], max_logit))
+    return results
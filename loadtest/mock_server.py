@@ -0,0 +1,214 @@
+"""
+OpenAI / YouTube Data API / Google Custom Search 로컬 대체 서버 (부하 테스트용)
+
+nlp/generator.py, nlp/main.py, app.py에서 사용하는 응답 형식만 구현합니다.
+
+실행:
+    python -m loadtest.mock_server --port 9100 --llm-latency 900:0.4 --classifier-latency 250:0.3
+
+서버 쪽 환경 변수:
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1
+    OPENAI_API_KEY=mock
+    GOOGLE_API_ENDPOINT=http://127.0.0.1:9100/
+    YOUTUBE_API_KEY=mock
+    GOOGLE_SEARCH_API_KEY=mock
+    GOOGLE_SEARCH_ENGINE_ID=mock
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+class LatencyProfile:
+    """로그정규분포 지연 시간 (중앙값 ms, sigma) + 오류 비율"""
+
+    def __init__(self, median_ms: float, sigma: float = 0.0, error_rate: float = 0.0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+
+    @classmethod
+    def parse(cls, spec: str, error_rate: float = 0.0):
+        """중앙값ms:sigma 형식 파싱 (예: 900:0.4)"""
+        median, _, sigma = spec.partition(":")
+        return cls(float(median), float(sigma or 0), error_rate)
+
+    async def sleep(self):
+        if self.median_ms <= 0:
+            return
+        delay = random.lognormvariate(0, self.sigma) * self.median_ms if self.sigma else self.median_ms
+        await asyncio.sleep(delay / 1000)
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+# 기본 답변 (generate_answer / generate_contextual_answer 대체)
+DEFAULT_ANSWER = (
+    "**준비 단계**\n1. 환기를 충분히 하고 고무장갑을 착용합니다.\n"
+    "**해결 방법**\n1. 세정제를 오염 부위에 뿌리고 5~10분 정도 불립니다.\n"
+    "2. 부드러운 수세미로 결을 따라 닦아냅니다.\n3. 깨끗한 물로 헹군 뒤 마른 천으로 물기를 제거합니다.\n"
+    "**예방 팁**\n사용 후 바로 닦아내고 주기적으로 관리하면 오염이 쌓이지 않습니다."
+)
+
+# 문맥 필요 판단용 키워드 (needs_context 대체)
+_CONTEXT_HINTS = ("주의사항", "비용", "다른 방법", "더 ", "자세히", "그거", "이거", "대안", "추천", "시간은")
+# 구체성 판단용 대상/장소 키워드 (is_specific_question 대체, 대상이 없으면 "애매함" → 추가 질문 경로)
+_TARGET_HINTS = (
+    "가스레인지", "냄비", "후라이팬", "싱크대", "인덕션", "후드", "오븐", "에어프라이어", "전자레인지",
+    "세탁기", "에어컨", "가습기", "벽지", "페인트벽", "타일", "문틀", "수전", "욕실", "유리", "거울",
+    "가구", "공구", "난간", "배관", "경첩", "문손잡이", "나사", "못", "스테인리스", "변기", "샤워기",
+)
+
+
+def _question_of(prompt: str) -> str:
+    match = re.search(r'(?:현재 질문|질문):\s*\**\s*"([^"]+)"', prompt)
+    return match.group(1) if match else prompt[-60:]
+
+
+def canned_completion(system: str, prompt: str, canned: dict) -> str:
+    """시스템 프롬프트로 어떤 generator 함수의 호출인지 구분해서 고정 답변 반환"""
+    question = _question_of(prompt)
+    if question in canned:
+        return canned[question]
+    if "'관련있음' 또는 '관련없음'" in system:
+        return "관련있음"
+    if "'구체적' 또는 '애매함'" in system:
+        return "구체적" if any(h in question for h in _TARGET_HINTS) else "애매함"
+    if "'필요' 또는 '불필요'" in system:
+        return "필요" if any(h in question for h in _CONTEXT_HINTS) else "불필요"
+    if "제목으로 요약" in system:
+        return question[:20]
+    if "하나의 질문으로 합치는" in system:
+        original = re.search(r'원래 질문: "([^"]*)"', prompt)
+        extra = re.search(r'추가 정보: "([^"]*)"', prompt)
+        return f"{extra.group(1) if extra else ''} {original.group(1) if original else ''}".strip()
+    if "추가 질문을 생성" in system:
+        return "어디에서 발생한 문제인가요? (가스레인지, 싱크대, 타일 등)"
+    return DEFAULT_ANSWER
+
+
+def create_app(llm: LatencyProfile, classifier: LatencyProfile, youtube: LatencyProfile,
+               search: LatencyProfile, canned: dict | None = None) -> FastAPI:
+    app = FastAPI()
+    canned = canned or {}
+    counters = {"chat_completions": 0, "youtube_search": 0, "custom_search": 0, "errors": 0}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        counters["chat_completions"] += 1
+        messages = body.get("messages", [])
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        prompt = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+
+        # max_tokens가 작은 호출(분류/요약/추가 질문)은 가벼운 호출의 지연 분포 사용
+        profile = classifier if body.get("max_tokens", 2048) <= 200 else llm
+        await profile.sleep()
+        if profile.should_fail():
+            counters["errors"] += 1
+            return JSONResponse(status_code=503, content={"error": {"message": "mock upstream error", "type": "server_error"}})
+
+        content = canned_completion(system, prompt, canned)
+        return {
+            "id": f"chatcmpl-mock-{counters['chat_completions']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": len(prompt) // 2,
+                "completion_tokens": len(content) // 2,
+                "total_tokens": (len(prompt) + len(content)) // 2,
+            },
+        }
+
+    @app.get("/youtube/v3/search")
+    async def youtube_search(q: str = "", maxResults: int = 5):
+        counters["youtube_search"] += 1
+        await youtube.sleep()
+        if youtube.should_fail():
+            counters["errors"] += 1
+            return JSONResponse(status_code=403, content={"error": {"code": 403, "message": "quotaExceeded",
+                                                                    "errors": [{"reason": "quotaExceeded"}]}})
+        seed = hashlib.md5(q.encode("utf-8")).hexdigest()
+        items = []
+        for i in range(maxResults):
+            video_id = f"{seed[:8]}{i:03d}"
+            items.append({
+                "kind": "youtube#searchResult",
+                "id": {"kind": "youtube#video", "videoId": video_id},
+                "snippet": {
+                    "title": f"{q} 해결 영상 {i + 1}",
+                    "description": f"{q} 방법을 단계별로 소개합니다.",
+                    "thumbnails": {"high": {"url": f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"}},
+                },
+            })
+        return {"kind": "youtube#searchListResponse", "items": items}
+
+    @app.get("/customsearch/v1")
+    async def custom_search(q: str = "", num: int = 10):
+        counters["custom_search"] += 1
+        await search.sleep()
+        if search.should_fail():
+            counters["errors"] += 1
+            return JSONResponse(status_code=429, content={"error": {"code": 429, "message": "rateLimitExceeded"}})
+        keyword = q.replace("구매 가격 리뷰", "").strip()
+        items = []
+        for i in range(num):
+            items.append({
+                "title": f"{keyword} 상품 {i + 1} - {(i + 1) * 3},900원",
+                "snippet": f"평점 4.{i % 10} {keyword} 인기 상품",
+                "link": f"https://shopping.naver.com/mock/{hashlib.md5((keyword + str(i)).encode()).hexdigest()[:10]}",
+                "pagemap": {"cse_image": [{"src": f"https://example.com/img/{i}.jpg"}]},
+            })
+        return {"items": items}
+
+    @app.get("/mock/stats")
+    async def mock_stats():
+        return counters
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI/YouTube/Custom Search 로컬 목 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--llm-latency", default="900:0.4", help="답변 생성 호출 지연 (중앙값ms:sigma)")
+    parser.add_argument("--classifier-latency", default="250:0.3", help="분류/요약 호출 지연 (중앙값ms:sigma)")
+    parser.add_argument("--youtube-latency", default="300:0.3")
+    parser.add_argument("--search-latency", default="350:0.3")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="모든 업스트림의 오류 비율 (0~1)")
+    parser.add_argument("--canned", help="질문별 고정 답변 JSON 파일 ({질문: 답변})")
+    args = parser.parse_args()
+
+    canned = {}
+    if args.canned:
+        with open(args.canned, "r", encoding="utf-8") as f:
+            canned = json.load(f)
+
+    app = create_app(
+        llm=LatencyProfile.parse(args.llm_latency, args.error_rate),
+        classifier=LatencyProfile.parse(args.classifier_latency, args.error_rate),
+        youtube=LatencyProfile.parse(args.youtube_latency, args.error_rate),
+        search=LatencyProfile.parse(args.search_latency, args.error_rate),
+        canned=canned,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
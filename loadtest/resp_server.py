@@ -0,0 +1,85 @@
+"""
+Redis 프로토콜 로컬 대체 서버 (세션 백엔드 테스트용)
+
+RedisSessionBackend가 사용하는 PING / GET / SET [EX] / DEL / DBSIZE만 구현합니다.
+
+실행:
+    python -m loadtest.resp_server --port 6390
+    HOMEFIX_SESSION_BACKEND=redis SESSION_REDIS_PORT=6390 uvicorn app:app --workers 4
+"""
+import argparse
+import asyncio
+import time
+
+
+class RespStandIn:
+    def __init__(self):
+        self.data = {}  # key -> (value, 만료 시각 또는 None)
+
+    def _get(self, key):
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, args: list) -> bytes:
+        name = args[0].upper()
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name == b"GET":
+            value = self._get(args[1])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == b"SET":
+            expires_at = None
+            if len(args) >= 5 and args[3].upper() == b"EX":
+                expires_at = time.monotonic() + int(args[4])
+            self.data[args[1]] = (args[2], expires_at)
+            return b"+OK\r\n"
+        if name == b"DEL":
+            removed = sum(1 for key in args[1:] if self.data.pop(key, None) is not None)
+            return b":%d\r\n" % removed
+        if name == b"DBSIZE":
+            for key in list(self.data):
+                self._get(key)
+            return b":%d\r\n" % len(self.data)
+        return b"-ERR unknown command\r\n"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                count = int(line[1:-2])
+                args = []
+                for _ in range(count):
+                    length = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                writer.write(self.execute(args))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host: str, port: int):
+    server = await asyncio.start_server(RespStandIn().handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis 프로토콜 로컬 대체 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
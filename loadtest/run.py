@@ -0,0 +1,167 @@
+"""
+FastAPI 서버 부하 테스트 (다중 턴 대화 시나리오)
+
+가상 사용자(--users)가 scenarios.json의 시나리오를 가중치에 따라 골라 순서대로 요청합니다.
+처리량, 엔드포인트별 지연 시간 백분위수, 단계별 시간 비중을 출력합니다.
+단계별 비중은 서버를 HOMEFIX_DEBUG_TIMINGS=1로 실행했을 때 응답의 "timings"로 계산합니다.
+
+실행 예:
+    python -m loadtest.mock_server &
+    HOMEFIX_DEBUG_TIMINGS=1 OPENAI_BASE_URL=http://127.0.0.1:9100/v1 ... uvicorn app:app --port 8000
+    python -m loadtest.run --url http://127.0.0.1:8000 --users 20 --duration 60 --output report.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import defaultdict
+
+import httpx
+
+DEFAULT_SCENARIOS = os.path.join(os.path.dirname(__file__), "scenarios.json")
+
+
+def percentile(values: list, p: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round((len(ordered) - 1) * p / 100)))
+    return round(ordered[idx], 1)
+
+
+class Recorder:
+    """요청 결과 집계"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)  # 엔드포인트 -> [ms]
+        self.errors = defaultdict(int)      # 엔드포인트 -> 오류 수
+        self.stage_ms = defaultdict(lambda: defaultdict(float))  # 엔드포인트 -> 단계 -> 누적 ms
+        self.total_ms = defaultdict(float)  # 엔드포인트 -> timings가 있는 요청의 누적 ms
+
+    def record(self, endpoint: str, elapsed_ms: float, status: int, body):
+        self.latencies[endpoint].append(elapsed_ms)
+        if status >= 400:
+            self.errors[endpoint] += 1
+            return
+        timings = body.get("timings") if isinstance(body, dict) else None
+        if timings:
+            self.total_ms[endpoint] += elapsed_ms
+            for stage, ms in timings.items():
+                if stage != "total" and isinstance(ms, (int, float)):
+                    self.stage_ms[endpoint][stage] += ms
+
+    def report(self, wall_seconds: float) -> dict:
+        total_requests = sum(len(v) for v in self.latencies.values())
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            stage_share = {}
+            if self.total_ms[endpoint]:
+                stage_share = {
+                    stage: round(ms / self.total_ms[endpoint], 3)
+                    for stage, ms in sorted(self.stage_ms[endpoint].items(), key=lambda kv: -kv[1])
+                }
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "errors": self.errors[endpoint],
+                "p50_ms": percentile(values, 50),
+                "p90_ms": percentile(values, 90),
+                "p99_ms": percentile(values, 99),
+                "max_ms": round(max(values), 1),
+                "stage_share": stage_share,
+            }
+        return {
+            "wall_seconds": round(wall_seconds, 1),
+            "requests": total_requests,
+            "throughput_rps": round(total_requests / wall_seconds, 2) if wall_seconds else 0,
+            "endpoints": endpoints,
+        }
+
+
+async def virtual_user(user_id: int, client: httpx.AsyncClient, scenarios: list, recorder: Recorder,
+                       stop_at: float, think_time: float):
+    weights = [s.get("weight", 1) for s in scenarios]
+    run_count = 0
+    while time.monotonic() < stop_at:
+        scenario = random.choices(scenarios, weights=weights)[0]
+        # 시나리오 실행마다 새 대화 세션 사용
+        session_id = f"loadtest-{user_id}-{run_count}"
+        run_count += 1
+        for step in scenario["steps"]:
+            if time.monotonic() >= stop_at:
+                return
+            body = dict(step["body"])
+            if step["endpoint"] == "/chat/":
+                body.setdefault("session_id", session_id)
+            start = time.perf_counter()
+            try:
+                response = await client.post(step["endpoint"], json=body)
+                status = response.status_code
+                payload = response.json() if status < 500 else None
+            except (httpx.HTTPError, ValueError):
+                status, payload = 599, None
+            recorder.record(step["endpoint"], (time.perf_counter() - start) * 1000, status, payload)
+            if think_time:
+                await asyncio.sleep(random.uniform(0, think_time))
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float):
+    """서버가 모델 로딩을 끝낼 때까지 /readyz 확인 (워밍업 시간이 결과에 섞이지 않도록)"""
+    give_up_at = time.monotonic() + timeout
+    while time.monotonic() < give_up_at:
+        try:
+            if (await client.get("/readyz")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(1)
+    print("⚠️ 서버가 준비되지 않은 상태로 테스트를 시작합니다.")
+
+
+async def run(url: str, users: int, duration: float, scenarios: list, think_time: float, timeout: float) -> dict:
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        await wait_until_ready(client, timeout)
+        start = time.monotonic()
+        stop_at = start + duration
+        await asyncio.gather(*[
+            virtual_user(i, client, scenarios, recorder, stop_at, think_time) for i in range(users)
+        ])
+        wall = time.monotonic() - start
+    return recorder.report(wall)
+
+
+def print_report(report: dict):
+    print(f"\n총 {report['requests']}건 / {report['wall_seconds']}초 → {report['throughput_rps']} req/s")
+    for endpoint, stats in report["endpoints"].items():
+        print(f"\n{endpoint}  요청 {stats['requests']}  오류 {stats['errors']}")
+        print(f"  p50 {stats['p50_ms']}ms  p90 {stats['p90_ms']}ms  p99 {stats['p99_ms']}ms  max {stats['max_ms']}ms")
+        for stage, share in stats["stage_share"].items():
+            print(f"  - {stage:<12} {share * 100:5.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HomeFix 서버 부하 테스트")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=10, help="동시 가상 사용자 수")
+    parser.add_argument("--duration", type=float, default=30, help="테스트 시간 (초)")
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS)
+    parser.add_argument("--think-time", type=float, default=0.5, help="요청 사이 최대 대기 시간 (초)")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="결과를 저장할 JSON 파일")
+    args = parser.parse_args()
+
+    with open(args.scenarios, "r", encoding="utf-8") as f:
+        scenarios = json.load(f)
+
+    report = asyncio.run(run(args.url, args.users, args.duration, scenarios, args.think_time, args.timeout))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
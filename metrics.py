@@ -0,0 +1,131 @@
+"""
+Prometheus 텍스트 형식 메트릭 (외부 의존성 없는 최소 구현)
+
+- Histogram: 단계별 지연 시간 (버킷 카운트만 갱신하므로 요청 경로 부담이 거의 없음)
+- Counter: 임계값 미달, 외부 API 오류 등 횟수
+- 수집 함수(register_collector): 캐시 적중률처럼 이미 다른 곳에서 세고 있는 값은 /metrics 요청 시에만 읽음
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# 기본 지연 시간 버킷 (초) - 1ms ~ 30s
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+_collectors = []
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # 레이블 값 -> [버킷별 카운트..., 합계, 개수]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if idx < len(self.buckets):
+                series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', repr(bound)))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, ('le', '+Inf'))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+def register_collector(name: str, documentation: str, metric_type: str, labelnames, collect):
+    """
+    /metrics 요청 시 collect()를 호출해서 값을 읽는 메트릭 등록
+
+    Args:
+        collect: [(레이블 값 튜플, 값), ...]을 반환하는 함수
+    """
+    _collectors.append((name, documentation, metric_type, tuple(labelnames), collect))
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for name, documentation, metric_type, labelnames, collect in _collectors:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        try:
+            samples = collect()
+        except Exception:
+            continue
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(labelnames, labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ------------------------- 공용 메트릭 ------------------------- #
+# 비전: base64_decode, pil_decode, transform, problem_forward, location_forward
+# 텍스트: query_encode, faiss_search
+stage_seconds = Histogram("homefix_stage_seconds", "Per-stage processing time", ["stage"])
+llm_seconds = Histogram("homefix_llm_seconds", "LLM call time by generator function", ["function"])
+external_api_seconds = Histogram("homefix_external_api_seconds", "Google API call time", ["api"])
+request_seconds = Histogram("homefix_request_seconds", "End-to-end request time", ["endpoint", "method", "status"])
+
+threshold_rejections = Counter("homefix_threshold_rejections_total", "Images rejected below the confidence threshold", ["endpoint"])
+upstream_errors = Counter("homefix_upstream_errors_total", "Errors returned by upstream services", ["upstream"])
@@ -0,0 +1,143 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    """캐시 키용 질문 정규화 (공백/문장부호 정리)"""
+    text = question.strip().lower()
+    text = re.sub(r"[?!.~,]+", " ", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip()
+
+
+class _CacheEntry:
+    """캐시 항목 하나 (질문 임베딩 + 답변 + 적중 횟수)"""
+
+    __slots__ = ("question", "embedding", "answer", "created_at", "hits")
+
+    def __init__(self, question, embedding, answer):
+        self.question = question
+        self.embedding = embedding
+        self.answer = answer
+        self.created_at = time.monotonic()
+        self.hits = 0
+
+
+class SemanticCache:
+    """
+    의미 기반 답변 캐시
+
+    검색된 문서 집합을 1차 키로, 정규화된 질문 임베딩의 코사인 유사도를 2차 조건으로 사용합니다.
+    같은 문서를 검색한 비슷한 질문(예: "싱크대 물때 제거법" / "싱크대에 낀 물때 없애는 법")은
+    같은 답변을 재사용합니다.
+
+    - similarity_threshold: 이 값 이상이면 적중으로 판단 (임베딩은 L2 정규화되어 있어야 함)
+    - max_entries: 전체 항목 수 상한 (초과 시 LRU 순서로 제거)
+    - ttl_seconds: 항목 유효 시간
+    """
+
+    def __init__(self, similarity_threshold=0.9, max_entries=512, ttl_seconds=3600):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # 문서 키 -> [항목, ...] (OrderedDict 순서 = LRU 순서)
+        self._buckets: "OrderedDict[tuple, list[_CacheEntry]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    def lookup(self, doc_key: tuple, embedding):
+        """유사한 질문의 답변이 있으면 반환, 없으면 None"""
+        with self._lock:
+            if not doc_key:
+                self.misses += 1
+                return None
+
+            bucket = self._buckets.get(doc_key)
+            if not bucket:
+                self.misses += 1
+                return None
+
+            now = time.monotonic()
+            alive = [e for e in bucket if now - e.created_at <= self.ttl_seconds]
+            self._size -= len(bucket) - len(alive)
+            if not alive:
+                del self._buckets[doc_key]
+                self.misses += 1
+                return None
+            self._buckets[doc_key] = alive
+
+            vector = np.asarray(embedding, dtype="float32").ravel()
+            best_entry, best_score = None, -1.0
+            for entry in alive:
+                score = float(np.dot(entry.embedding, vector))
+                if score > best_score:
+                    best_entry, best_score = entry, score
+
+            if best_score < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            self._buckets.move_to_end(doc_key)
+            best_entry.hits += 1
+            self.hits += 1
+            return best_entry.answer
+
+    def store(self, doc_key: tuple, question: str, embedding, answer: str):
+        """답변을 캐시에 저장"""
+        if not doc_key or not answer:
+            return
+
+        entry = _CacheEntry(question, np.asarray(embedding, dtype="float32").ravel(), answer)
+        with self._lock:
+            self._buckets.setdefault(doc_key, []).append(entry)
+            self._buckets.move_to_end(doc_key)
+            self._size += 1
+
+            # 상한 초과 시 가장 오래 사용되지 않은 문서 키의 가장 오래된 항목부터 제거
+            while self._size > self.max_entries and self._buckets:
+                oldest_key = next(iter(self._buckets))
+                oldest_bucket = self._buckets[oldest_key]
+                oldest_bucket.pop(0)
+                self._size -= 1
+                if not oldest_bucket:
+                    del self._buckets[oldest_key]
+
+    def bypass(self):
+        """문맥 의존 질문 등 캐시를 사용하지 않은 요청 집계"""
+        with self._lock:
+            self.bypasses += 1
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        """캐시 통계 (항목별 적중 횟수 상위 10개 포함)"""
+        with self._lock:
+            entries = [e for bucket in self._buckets.values() for e in bucket]
+        top_entries = sorted(entries, key=lambda e: e.hits, reverse=True)[:10]
+        return {
+            "size": len(entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "top_entries": [{"question": e.question, "hits": e.hits} for e in top_entries],
+        }
+
+
+# 채팅 답변용 전역 캐시 (환경 변수로 조정 가능)
+answer_cache = SemanticCache(
+    similarity_threshold=float(os.environ.get("CHAT_CACHE_SIMILARITY", "0.9")),
+    max_entries=int(os.environ.get("CHAT_CACHE_MAX_ENTRIES", "512")),
+    ttl_seconds=float(os.environ.get("CHAT_CACHE_TTL_SECONDS", "3600")),
+)
@@ -1,13 +1,82 @@
+import logging
+import math
+import os
+import re
+import threading
+import time
 from typing import Tuple
 from .generator import is_specific_question, generate_clarification_question, needs_context, generate_natural_query
+from .session_store import create_session_store
+from .slots import build_clarification, merge_query, count_slot_event
+
+logger = logging.getLogger(__name__)
+
+# 문맥 토큰 예산 (프롬프트에 들어가는 이전 대화 전체 / 답변 하나 / 오래된 대화 요약)
+CONTEXT_MAX_TOKENS = int(os.environ.get("CONTEXT_MAX_TOKENS", "600"))
+CONTEXT_AI_MAX_TOKENS = int(os.environ.get("CONTEXT_AI_MAX_TOKENS", "160"))
+SUMMARY_MAX_TOKENS = int(os.environ.get("CONTEXT_SUMMARY_MAX_TOKENS", "80"))
+
+_HANGUL = re.compile(r"[\uac00-\ud7a3]")
+
+def estimate_tokens(text: str) -> int:
+    """
+    프롬프트 토큰 수 추정 (tokenizer 없이 사용할 수 있는 근사치)
+
+    gpt-4o 계열에서 한글 음절은 약 0.8토큰, 그 외 문자는 약 3.5자당 1토큰으로 계산합니다.
+    """
+    if not text:
+        return 0
+    hangul = len(_HANGUL.findall(text))
+    return math.ceil(hangul * 0.8 + (len(text) - hangul) / 3.5)
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """추정 토큰 수가 max_tokens 이하가 되도록 뒤쪽을 잘라냄"""
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    keep = max(1, int(len(text) * max_tokens / tokens) - 1)
+    return text[:keep].rstrip() + "…"
+
+# 전체 세션에서 문맥 압축으로 절약한 프롬프트 토큰 수
+# (토큰 예산 문맥이 기존 방식보다 긴 경우는 tokens_added로 따로 집계)
+context_token_stats = {"turns": 0, "tokens_saved": 0, "tokens_added": 0}
+_context_stats_lock = threading.Lock()
 
 class ConversationManager:
-    """대화 상태 관리 클래스 - 문맥 유지"""
+    """대화 상태 관리 클래스 - 문맥 유지 (세션 하나의 상태)"""
+
+    # 세션 수가 많아도 메모리를 적게 쓰도록 __slots__ 사용
+    __slots__ = (
+        "waiting_for_clarification",
+        "user_original_question",
+        "conversation_history",
+        "summary",
+        "context_cache",
+        "context_tokens",
+        "legacy_context_tokens",
+        "turn_tokens_saved",
+        "turn_tokens_added",
+        "last_access",
+        "size",
+        "lock",
+    )
+
+    # 세션 하나의 기본 메모리 사용량 추정치 (객체 + 잠금 + 저장소 항목)
+    BASE_SIZE = 512
     
     def __init__(self):
         self.waiting_for_clarification = False
         self.user_original_question = None
         self.conversation_history = []  # 대화 기록 저장
+        self.summary = ""  # 최근 3개 이전의 오래된 대화 요약
+        self.context_cache = ""  # add_to_history 때마다 갱신되는 문맥 문자열
+        self.context_tokens = 0
+        self.legacy_context_tokens = 0  # 기존 방식(최근 3개, 2000자)으로 만든 문맥의 토큰 수
+        self.turn_tokens_saved = 0
+        self.turn_tokens_added = 0
+        self.last_access = time.monotonic()
+        self.size = self.BASE_SIZE
+        self.lock = threading.Lock()
     
     def reset(self):
         """대화 상태 초기화 (history는 유지)"""
@@ -19,155 +88,250 @@ class ConversationManager:
         self.waiting_for_clarification = False
         self.user_original_question = None
         self.conversation_history = []
+        self.summary = ""
+        self._render_context()
     
     def add_to_history(self, user_message: str, ai_response: str):
-        """대화 기록에 추가 (최대 3개까지만 유지)"""
+        """대화 기록에 추가 (최대 3개까지만 유지, 오래된 대화는 요약으로 이동)"""
         self.conversation_history.append({
             "user": user_message,
             "ai": ai_response
         })
         
-        # 대화 기록이 너무 길어지면 오래된 것부터 삭제 (최대 3개 유지)
+        # 대화 기록이 너무 길어지면 오래된 것부터 요약으로 옮김 (최대 3개 유지)
         if len(self.conversation_history) > 3:
+            for exchange in self.conversation_history[:-3]:
+                self._roll_into_summary(exchange)
             self.conversation_history = self.conversation_history[-3:]
-    
-    def get_conversation_context(self) -> str:
-        """대화 문맥을 문자열로 반환 (길이 제한 적용)"""
-        if not self.conversation_history:
-            return ""
-        
+
+        self._render_context()
+
+    def _roll_into_summary(self, exchange: dict):
+        """오래된 대화를 요약에 추가 (사용자 질문만 남기고 토큰 예산을 넘으면 가장 오래된 것부터 제거)"""
+        questions = self.summary.split(" / ") if self.summary else []
+        questions.append(truncate_to_tokens(exchange["user"], 30))
+        while len(questions) > 1 and estimate_tokens(" / ".join(questions)) > SUMMARY_MAX_TOKENS:
+            questions.pop(0)
+        self.summary = " / ".join(questions)
+
+    def _render_context(self):
+        """문맥 문자열을 미리 만들어 둠 (최근 대화부터 토큰 예산 안에서 채움)"""
+        parts = []
+        budget = CONTEXT_MAX_TOKENS
+        if self.summary:
+            summary_line = f"이전 질문 요약: {self.summary}"
+            budget -= estimate_tokens(summary_line)
+
+        for exchange in reversed(self.conversation_history):
+            user_text = f"사용자: {exchange['user']}"
+            ai_text = f"AI: {truncate_to_tokens(exchange['ai'], CONTEXT_AI_MAX_TOKENS)}"
+            cost = estimate_tokens(user_text) + estimate_tokens(ai_text)
+            if cost > budget:
+                break
+            parts.append(ai_text)
+            parts.append(user_text)
+            budget -= cost
+
+        if self.summary:
+            parts.append(summary_line)
+        parts.reverse()
+
+        self.context_cache = "\n".join(parts)
+        self.context_tokens = estimate_tokens(self.context_cache)
+        self.legacy_context_tokens = estimate_tokens(self._legacy_context())
+
+    def _legacy_context(self) -> str:
+        """기존 방식의 문맥 (최근 3개 대화, 최대 2000자) - 절약한 토큰 수 계산용"""
         context_parts = []
         total_length = 0
-        max_length = 2000  # 최대 2000자
-        
-        # 최근 대화부터 역순으로 처리
         for exchange in reversed(self.conversation_history):
             user_text = f"사용자: {exchange['user']}"
             ai_text = f"AI: {exchange['ai']}"
-            
-            # 길이 체크
             text_length = len(user_text) + len(ai_text)
-            if total_length + text_length > max_length:
+            if total_length + text_length > 2000:
                 break
-            
-            # 리스트 앞에 추가 (insert는 0번 인덱스에 삽입)
-            context_parts.insert(0, ai_text)
-            context_parts.insert(0, user_text)
+            context_parts.append(ai_text)
+            context_parts.append(user_text)
             total_length += text_length
-        
+        context_parts.reverse()
         return "\n".join(context_parts)
 
-# 전역 대화 관리자
-conversation_manager = ConversationManager()
+    def begin_turn(self):
+        """요청 한 턴 시작 (턴별 절약 토큰 수 초기화)"""
+        self.turn_tokens_saved = 0
+        self.turn_tokens_added = 0
+
+    def end_turn(self) -> int:
+        """요청 한 턴 종료, 이번 턴에 절약한 프롬프트 토큰 수 반환"""
+        with _context_stats_lock:
+            context_token_stats["turns"] += 1
+            context_token_stats["tokens_saved"] += self.turn_tokens_saved
+            context_token_stats["tokens_added"] += self.turn_tokens_added
+        return self.turn_tokens_saved
+
+    def to_dict(self) -> dict:
+        """공유 세션 백엔드에 저장할 상태"""
+        return {
+            "waiting_for_clarification": self.waiting_for_clarification,
+            "user_original_question": self.user_original_question,
+            "conversation_history": [dict(exchange) for exchange in self.conversation_history],
+            "summary": self.summary,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ConversationManager":
+        """공유 세션 백엔드에서 읽은 상태로 복원"""
+        manager = cls()
+        manager.waiting_for_clarification = data.get("waiting_for_clarification", False)
+        manager.user_original_question = data.get("user_original_question")
+        manager.conversation_history = list(data.get("conversation_history", []))
+        manager.summary = data.get("summary", "")
+        manager._render_context()
+        return manager
+
+    def recompute_size(self) -> int:
+        """세션 메모리 사용량 추정 (문자열은 UTF-8 바이트 수 기준)"""
+        size = self.BASE_SIZE + len((self.user_original_question or "").encode("utf-8"))
+        size += len(self.summary.encode("utf-8")) + len(self.context_cache.encode("utf-8"))
+        for exchange in self.conversation_history:
+            size += 64 + len(exchange["user"].encode("utf-8")) + len(exchange["ai"].encode("utf-8"))
+        self.size = size
+        return size
+    
+    def get_conversation_context(self) -> str:
+        """대화 문맥을 문자열로 반환 (add_to_history 때 미리 만든 문자열, 토큰 예산 적용)"""
+        # 프롬프트에 문맥이 들어갈 때마다 기존 방식 대비 절약한 토큰 수 누적
+        delta = self.legacy_context_tokens - self.context_tokens
+        if delta >= 0:
+            self.turn_tokens_saved += delta
+        else:
+            self.turn_tokens_added -= delta
+        return self.context_cache
 
-def is_specific_content(user_message: str) -> Tuple[bool, str]:
+# 세션별 대화 관리자 저장소 (세션 ID -> ConversationManager)
+conversation_store = create_session_store(ConversationManager)
+
+def is_specific_content(user_message: str, manager: ConversationManager) -> Tuple[bool, str]:
     """
     메시지가 구체적인지 판단 (GPT 기반)
     """
     try:
-        conversation_context = conversation_manager.get_conversation_context()
+        conversation_context = manager.get_conversation_context()
         is_specific = is_specific_question(user_message, conversation_context)
         
         return (True, "specific") if is_specific else (False, "general")
     except Exception as e:
-        print(f"GPT 구체성 판단 중 에러 발생: {e}")
+        logger.warning("GPT 구체성 판단 중 에러 발생", extra={"fields": {"error": str(e)}})
         # 에러 발생 시 기본적으로 구체적이라고 판단 (fallback)
         return True, "specific"
 
-def generate_clarification_question_gpt(user_message: str) -> str:
-    """GPT를 사용한 추가 질문 생성"""
+def generate_clarification_question_gpt(user_message: str, manager: ConversationManager) -> str:
+    """추가 질문 생성 (빠진 대상/문제를 템플릿으로 묻고, 해석할 수 없는 질문만 GPT 사용)"""
     # 원본 질문 저장
-    conversation_manager.user_original_question = user_message
-    conversation_manager.waiting_for_clarification = True
+    manager.user_original_question = user_message
+    manager.waiting_for_clarification = True
+
+    local_question = build_clarification(user_message)
+    if local_question:
+        count_slot_event("clarification_local")
+        return local_question
     
     try:
+        count_slot_event("clarification_gpt")
         return generate_clarification_question(user_message)
     except Exception as e:
         # 에러 발생 시 기본 추가 질문 반환
         return "더 구체적인 정보가 필요합니다. 어떤 문제가 발생했고, 어디에서 발생했는지 알려주세요."
 
-def create_specific_query(user_message: str) -> str:
+def merge_follow_up(original_question: str, user_message: str) -> str:
+    """원래 질문과 추가 답변을 하나의 질문으로 합침 (슬롯 채우기 우선, 실패 시 GPT)"""
+    merged = merge_query(original_question, user_message)
+    if merged:
+        count_slot_event("merge_local")
+        return merged
+
+    count_slot_event("merge_gpt")
+    try:
+        return generate_natural_query(original_question, user_message)
+    except Exception as e:
+        # 에러 발생 시 기본 방식으로 결합
+        return f"{original_question} {user_message}"
+
+def create_specific_query(user_message: str, manager: ConversationManager) -> str:
     """GPT를 사용해서 구체적인 검색 쿼리 생성"""
     
-    if conversation_manager.waiting_for_clarification:
+    if manager.waiting_for_clarification:
         # 추가 정보를 받은 경우
-        original_question = conversation_manager.user_original_question or ""
+        original_question = manager.user_original_question or ""
         
-        # GPT를 사용해서 자연스러운 문장 생성
-        try:
-            specific_query = generate_natural_query(original_question, user_message)
-        except Exception as e:
-            # 에러 발생 시 기본 방식
-            specific_query = f"{user_message} {original_question}"
+        # 슬롯 채우기(실패 시 GPT)로 자연스러운 문장 생성
+        specific_query = merge_follow_up(original_question, user_message)
         
         # 대화 상태 초기화
-        conversation_manager.reset()
+        manager.reset()
         
         return specific_query
     else:
         # 이미 구체적인 질문인 경우
         return user_message
 
-def process_user_message(user_message: str, is_new_topic: bool = False) -> Tuple[str, bool, bool]:
+def process_user_message(user_message: str, manager: ConversationManager, is_new_topic: bool = False) -> Tuple[str, bool, bool]:
     """
     사용자 메시지를 처리하고 응답 생성 (문맥 유지)
+
+    manager: 요청한 세션의 대화 상태 (conversation_store.session()으로 얻음)
     
     Returns:
         Tuple[응답_메시지, 최종_답변_여부, 문맥_필요_여부]
     """
     
     # 추가 질문을 기다리는 중인지 확인
-    if conversation_manager.waiting_for_clarification:
+    if manager.waiting_for_clarification:
         # 이전 질문과 현재 답변을 결합한 통합 메시지 생성
-        original_question = conversation_manager.user_original_question or ""
+        original_question = manager.user_original_question or ""
         
-        # GPT를 사용해서 자연스러운 문장 생성
-        try:
-            from .generator import generate_natural_query
-            combined_message = generate_natural_query(original_question, user_message)
-        except Exception as e:
-            # 에러 발생 시 기본 방식으로 결합
-            combined_message = f"{original_question} {user_message}"
+        # 슬롯 채우기(실패 시 GPT)로 자연스러운 문장 생성
+        combined_message = merge_follow_up(original_question, user_message)
         
         # 결합된 메시지의 구체성 판단
-        is_specific, _ = is_specific_content(combined_message)
+        is_specific, _ = is_specific_content(combined_message, manager)
         
         if is_specific:
             # 구체적인 답변을 받았으므로 최종 답변 생성
             # 대화 기록에 추가
-            conversation_manager.add_to_history(user_message, combined_message)
-            conversation_manager.reset()  # 대화 상태만 초기화 (history 유지)
+            manager.add_to_history(user_message, combined_message)
+            manager.reset()  # 대화 상태만 초기화 (history 유지)
             return combined_message, True, False
         else:
             # 여전히 구체적이지 않은 답변
             follow_up = "더 구체적인 정보를 알려주세요. 예를 들어, 어디에서 어떤 문제가 발생했는지 알려주시면 더 정확한 답변을 드릴 수 있습니다."
-            conversation_manager.add_to_history(user_message, follow_up)
+            manager.add_to_history(user_message, follow_up)
             return follow_up, False, False
     
     # 새로운 질문인 경우
     if is_new_topic:
-        conversation_manager.reset_all()  # 새로운 주제면 완전 초기화
+        manager.reset_all()  # 새로운 주제면 완전 초기화
     
     # 문맥이 필요한지 먼저 확인
-    conversation_context = conversation_manager.get_conversation_context()
+    conversation_context = manager.get_conversation_context()
     requires_context = needs_context(user_message, conversation_context)
     
-    print(f"  → 문맥 필요: {'Yes ✅' if requires_context else 'No ❌'}")
+    logger.debug("문맥 필요 여부", extra={"fields": {"requires_context": requires_context}})
     
     if requires_context:
         # 문맥이 필요한 질문이므로 바로 문맥 기반 답변 생성
-        conversation_manager.add_to_history(user_message, "문맥 기반 답변")
+        manager.add_to_history(user_message, "문맥 기반 답변")
         return user_message, True, True  # 문맥 필요 플래그 True
     
     # 문맥이 필요하지 않은 경우 기존 로직
-    is_specific, _ = is_specific_content(user_message)
+    is_specific, _ = is_specific_content(user_message, manager)
     
     if is_specific:
         # 구체적인 질문이므로 바로 처리
-        conversation_manager.add_to_history(user_message, user_message)
+        manager.add_to_history(user_message, user_message)
         return user_message, True, False
     else:
         # 구체적이지 않은 질문이므로 추가 질문 생성
-        clarification_question = generate_clarification_question_gpt(user_message)
-        conversation_manager.add_to_history(user_message, clarification_question)
+        clarification_question = generate_clarification_question_gpt(user_message, manager)
+        manager.add_to_history(user_message, clarification_question)
         return clarification_question, False, False
@@ -0,0 +1,65 @@
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 디버그 모드: 응답에 단계별 소요 시간(timings)을 포함
+DEBUG_TIMINGS = os.environ.get("HOMEFIX_DEBUG_TIMINGS", "0") == "1"
+
+# 요청 내부 단계(LLM 답변, 유튜브 검색, 준비물 정리 등)를 동시에 실행하기 위한 공용 스레드 풀
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("HOMEFIX_FANOUT_WORKERS", "16")),
+    thread_name_prefix="fanout",
+)
+
+
+def _timed(fn, timings: dict, name: str):
+    start = time.perf_counter()
+    try:
+        return fn()
+    finally:
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def run_stages(stages: dict, timings: dict | None = None) -> dict:
+    """
+    서로 독립적인 단계들을 동시에 실행하고 결과를 모아서 반환합니다.
+
+    Args:
+        stages: {단계 이름: 인자 없는 함수}
+        timings: 단계별 소요 시간(ms)을 기록할 딕셔너리 (선택)
+
+    Returns:
+        dict: {단계 이름: 결과}. 단계에서 발생한 예외는 그대로 다시 발생합니다.
+    """
+    if timings is None:
+        timings = {}
+
+    # 단계가 하나뿐이면 스레드 전환 없이 바로 실행
+    if len(stages) == 1:
+        name, fn = next(iter(stages.items()))
+        return {name: _timed(fn, timings, name)}
+
+    # contextvars(요청 마감 시간 등)를 작업 스레드로 전달
+    futures = {
+        name: _executor.submit(contextvars.copy_context().run, _timed, fn, timings, name)
+        for name, fn in stages.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
+
+
+class StageTimer:
+    """순차 단계의 소요 시간을 timings 딕셔너리에 기록하는 컨텍스트 매니저"""
+
+    def __init__(self, timings: dict | None, name: str):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.timings is not None:
+            self.timings[self.name] = round((time.perf_counter() - self.start) * 1000, 1)
+        return False
@@ -1,10 +1,31 @@
 from openai import OpenAI
 import os
 from dotenv import load_dotenv
+from .resilience import call_llm, LLMUnavailable, LLM_DEFAULT_TIMEOUT, LLM_CLASSIFIER_TIMEOUT
+from metrics import llm_seconds, upstream_errors
 
 # .env 파일에서 OPENAI_API_KEY 불러오기
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# 재시도는 resilience 계층에서 남은 예산을 보고 직접 처리 (OPENAI_BASE_URL로 로컬 목 서버 지정 가능)
+client = OpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    base_url=os.getenv("OPENAI_BASE_URL") or None,
+    max_retries=0,
+)
+
+def _chat_completion(name, hedge=False, default_timeout=LLM_DEFAULT_TIMEOUT, **kwargs):
+    """chat.completions.create 호출 (마감 시간, 재시도, 헤지, 회로 차단 적용)"""
+    with llm_seconds.time(name):
+        try:
+            return call_llm(
+                name,
+                lambda timeout: client.chat.completions.create(timeout=timeout, **kwargs),
+                hedge=hedge,
+                default_timeout=default_timeout,
+            )
+        except LLMUnavailable:
+            upstream_errors.inc("llm")
+            raise
 
 def generate_answer(question, context):
     """GPT를 사용해서 최종 답변 생성"""
@@ -26,15 +47,20 @@ def generate_answer(question, context):
         {question}
         """.strip()
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            { "role": "system", "content": "친절한 한국어 홈케어 전문가입니다."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.7,
-        max_tokens=2048
-    )
+    try:
+        response = _chat_completion(
+            "generate_answer",
+            model="gpt-4o-mini",
+            messages=[
+                { "role": "system", "content": "친절한 한국어 홈케어 전문가입니다."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.7,
+            max_tokens=2048
+        )
+    except LLMUnavailable:
+        # 업스트림 장애 시 검색된 해결책 원문을 그대로 반환
+        return context or "지금은 답변을 생성할 수 없습니다. 잠시 후 다시 시도해주세요."
     return response.choices[0].message.content.strip()
 
 def is_relevant_question(question):
@@ -83,15 +109,20 @@ def is_relevant_question(question):
 위 기준으로 판단하여 **"관련있음"** 또는 **"관련없음"** 중 하나로만 답변해주세요.
 """.strip()
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "집안 오염 및 문제 해결 관련 질문인지 판단하는 전문가입니다. '관련있음' 또는 '관련없음' 중 하나로만 답변합니다."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.1,
-        max_tokens=50
-    )
+    try:
+        response = _chat_completion(
+            "is_relevant_question", hedge=True, default_timeout=LLM_CLASSIFIER_TIMEOUT,
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "집안 오염 및 문제 해결 관련 질문인지 판단하는 전문가입니다. '관련있음' 또는 '관련없음' 중 하나로만 답변합니다."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.1,
+            max_tokens=50
+        )
+    except LLMUnavailable:
+        # 판단할 수 없으면 질문을 거절하지 않음
+        return True
     
     result = response.choices[0].message.content.strip().lower()
     
@@ -151,15 +182,20 @@ def is_specific_question(question, conversation_context=""):
 위 기준으로 판단하여 **"구체적"** 또는 **"애매함"** 중 하나로만 답변해주세요.
 """.strip()
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "홈케어 질문의 구체성을 판단하는 전문가입니다. 이전 대화 내용을 고려하여 판단하고, '구체적' 또는 '애매함' 중 하나로만 답변합니다."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.1,
-        max_tokens=50
-    )
+    try:
+        response = _chat_completion(
+            "is_specific_question", hedge=True, default_timeout=LLM_CLASSIFIER_TIMEOUT,
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "홈케어 질문의 구체성을 판단하는 전문가입니다. 이전 대화 내용을 고려하여 판단하고, '구체적' 또는 '애매함' 중 하나로만 답변합니다."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.1,
+            max_tokens=50
+        )
+    except LLMUnavailable:
+        # 판단할 수 없으면 구체적인 질문으로 처리 (기존 에러 처리와 동일)
+        return True
     
     result = response.choices[0].message.content.strip().lower()
     
@@ -198,15 +234,19 @@ def generate_clarification_question(question):
 친근하고 도움이 되는 톤으로 추가 질문을 생성해주세요.
 """.strip()
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "홈케어 전문가로서 사용자에게 구체적인 정보를 요청하는 친근한 추가 질문을 생성합니다."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.7,
-        max_tokens=200
-    )
+    try:
+        response = _chat_completion(
+            "generate_clarification_question", default_timeout=LLM_CLASSIFIER_TIMEOUT,
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "홈케어 전문가로서 사용자에게 구체적인 정보를 요청하는 친근한 추가 질문을 생성합니다."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.7,
+            max_tokens=200
+        )
+    except LLMUnavailable:
+        return "더 구체적인 정보가 필요합니다. 어떤 문제가 발생했고, 어디에서 발생했는지 알려주세요."
     
     result = response.choices[0].message.content.strip()
     
@@ -250,15 +290,19 @@ def generate_natural_query(original_question, additional_info):
 - 위치는 문제 앞에 배치 (예: "욕실 기름때 제거법")
 """.strip()
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "사용자의 원래 질문과 추가 정보를 자연스럽고 명확한 하나의 질문으로 합치는 전문가입니다."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.3,
-        max_tokens=100
-    )
+    try:
+        response = _chat_completion(
+            "generate_natural_query", default_timeout=LLM_CLASSIFIER_TIMEOUT,
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "사용자의 원래 질문과 추가 정보를 자연스럽고 명확한 하나의 질문으로 합치는 전문가입니다."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=100
+        )
+    except LLMUnavailable:
+        return f"{additional_info} {original_question}".strip()
     
     result = response.choices[0].message.content.strip()
     
@@ -280,15 +324,21 @@ def summarize_question(question: str) -> str:
 요약:
 """.strip()
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "질문을 간결하고 명확한 제목으로 요약하는 전문가입니다."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.3,
-        max_tokens=50
-    )
+    try:
+        response = _chat_completion(
+            "summarize_question", default_timeout=LLM_CLASSIFIER_TIMEOUT,
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "질문을 간결하고 명확한 제목으로 요약하는 전문가입니다."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=50
+        )
+    except LLMUnavailable:
+        # 원본 질문을 잘라서 제목으로 사용
+        question = question.strip()
+        return question[:30] + "..." if len(question) > 30 else question
     
     result = response.choices[0].message.content.strip()
     # 30자 제한
@@ -345,15 +395,20 @@ def needs_context(question, conversation_context=""):
 위 기준으로 판단하여 **"필요"** 또는 **"불필요"** 중 하나로만 답변해주세요.
 """.strip()
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "대화 문맥 분석 전문가입니다. 질문이 이전 대화 내용을 참고해야 하는지 판단하고, '필요' 또는 '불필요' 중 하나로만 답변합니다."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.1,
-        max_tokens=50
-    )
+    try:
+        response = _chat_completion(
+            "needs_context", hedge=True, default_timeout=LLM_CLASSIFIER_TIMEOUT,
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "대화 문맥 분석 전문가입니다. 질문이 이전 대화 내용을 참고해야 하는지 판단하고, '필요' 또는 '불필요' 중 하나로만 답변합니다."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.1,
+            max_tokens=50
+        )
+    except LLMUnavailable:
+        # 판단할 수 없으면 독립적인 새 질문으로 처리
+        return False
     
     result = response.choices[0].message.content.strip().lower()
     
@@ -403,15 +458,20 @@ def generate_contextual_answer(question, conversation_context, search_context=""
 ⚠️ 형식: 답변 작성 시 #, ##, ### 같은 마크다운 헤딩을 사용하지 말고 **굵은 글씨**로 강조만 해주세요.
 """.strip()
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "이전 대화 맥락을 정확히 이해하고 연결하여 답변하는 홈케어 전문가입니다."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.7,
-        max_tokens=2048
-    )
+    try:
+        response = _chat_completion(
+            "generate_contextual_answer",
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "이전 대화 맥락을 정확히 이해하고 연결하여 답변하는 홈케어 전문가입니다."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.7,
+            max_tokens=2048
+        )
+    except LLMUnavailable:
+        fallback = "지금은 이전 대화를 참고한 답변을 생성할 수 없습니다. 잠시 후 다시 시도해주세요."
+        return f"{fallback}\n\n{search_context}" if search_context else fallback
     
     result = response.choices[0].message.content.strip()
     
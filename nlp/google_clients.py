@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+
+import httplib2
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
+
+from metrics import external_api_seconds, upstream_errors
+
+# 검색 요청 타임아웃 (초)
+GOOGLE_API_TIMEOUT = float(os.environ.get("GOOGLE_API_TIMEOUT_SECONDS", "5"))
+
+
+class GoogleClientPool:
+    """
+    프로세스 전체에서 공유하는 Google API 클라이언트 풀
+
+    - 서비스(customsearch, youtube)는 googleapiclient에 포함된 정적 discovery 문서로 한 번만 생성
+      (요청마다 build()로 discovery 문서를 읽고 파싱하지 않음)
+    - httplib2.Http는 스레드 안전하지 않으므로 스레드마다 하나씩 만들어 keep-alive 연결을 재사용
+    - 클라이언트 생성 비용과 실제 검색 지연 시간을 따로 기록
+    """
+
+    def __init__(self):
+        self._services = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()  # 호출/오류 통계 (스레드풀에서 동시에 갱신)
+        self._local = threading.local()
+        self.setup_seconds = {}  # 서비스 이름 -> 생성에 걸린 시간
+        self.calls = {}          # 서비스 이름 -> 호출 수
+        self.call_seconds = {}   # 서비스 이름 -> 누적 검색 시간
+        self.errors = {}         # 서비스 이름 -> 오류 수
+
+    def _http(self) -> httplib2.Http:
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = httplib2.Http(timeout=GOOGLE_API_TIMEOUT)
+            self._local.http = http
+        return http
+
+    def service(self, name: str, version: str, api_key: str):
+        """서비스 객체 반환 (처음 한 번만 생성)"""
+        key = (name, version, api_key)
+        service = self._services.get(key)
+        if service is not None:
+            return service
+
+        with self._lock:
+            service = self._services.get(key)
+            if service is None:
+                start = time.perf_counter()
+                # GOOGLE_API_ENDPOINT로 로컬 목 서버 지정 가능 (부하 테스트용)
+                api_endpoint = os.environ.get("GOOGLE_API_ENDPOINT")
+                client_options = {"api_endpoint": api_endpoint} if api_endpoint else None
+                document = discovery_cache.get_static_doc(name, version)
+                if document is not None:
+                    service = build_from_document(
+                        document, developerKey=api_key, client_options=client_options,
+                        http=httplib2.Http(timeout=GOOGLE_API_TIMEOUT),
+                    )
+                else:
+                    # 정적 문서가 없는 버전이면 한 번만 discovery 문서를 받아서 생성
+                    service = build(name, version, developerKey=api_key, client_options=client_options,
+                                    static_discovery=False)
+                self._services[key] = service
+                self.setup_seconds[name] = round(time.perf_counter() - start, 4)
+        return service
+
+    def execute(self, name: str, request):
+        """요청 실행 (스레드별 Http 연결 사용, 검색 지연 시간 기록)"""
+        start = time.perf_counter()
+        try:
+            return request.execute(http=self._http())
+        except Exception:
+            with self._stats_lock:
+                self.errors[name] = self.errors.get(name, 0) + 1
+            upstream_errors.inc(name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self.calls[name] = self.calls.get(name, 0) + 1
+                self.call_seconds[name] = self.call_seconds.get(name, 0.0) + elapsed
+            external_api_seconds.observe(elapsed, name)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return self._stats()
+
+    def _stats(self) -> dict:
+        return {
+            name: {
+                "setup_seconds": self.setup_seconds.get(name),
+                "calls": self.calls.get(name, 0),
+                "errors": self.errors.get(name, 0),
+                "avg_call_seconds": round(self.call_seconds[name] / self.calls[name], 4) if self.calls.get(name) else None,
+            }
+            for name in set(self.setup_seconds) | set(self.calls)
+        }
+
+
+google_clients = GoogleClientPool()
@@ -0,0 +1,95 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class PersistentTTLCache:
+    """
+    SQLite(WAL 모드) 기반 영구 키-값 캐시
+
+    값은 JSON으로 저장하며, 만료 여부는 호출 측에서 반환된 나이(age)로 판단합니다.
+    (stale-while-revalidate, 할당량 소진 시 오래된 값 제공 등을 위해 만료된 값도 바로 지우지 않음)
+    """
+
+    def __init__(self, path: str, table: str, ttl_seconds: float, max_stale_seconds: float = 7 * 24 * 3600):
+        self.path = path
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self._local = threading.local()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 스레드마다 연결 하나 (sqlite3 연결은 스레드 간 공유 불가)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _after_fork(self):
+        # fork로 물려받은 연결은 쓰지 않고 워커에서 새로 연결 (serve_prefork.py)
+        self._local = threading.local()
+
+    def get(self, key: str, include_expired: bool = False):
+        """
+        Args:
+            include_expired: True면 max_stale_seconds보다 오래된 값도 반환 (API 할당량 소진 시 등)
+
+        Returns:
+            (값, 나이(초), 신선 여부) 또는 None (없거나 max_stale_seconds보다 오래됨)
+        """
+        row = self._conn().execute(
+            f"SELECT value, updated_at FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        age = time.time() - row[1]
+        if not include_expired and age > self.ttl_seconds + self.max_stale_seconds:
+            self.misses += 1
+            return None
+        fresh = age <= self.ttl_seconds
+        if fresh:
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+        return json.loads(row[0]), age, fresh
+
+    def set(self, key: str, value):
+        self._conn().execute(
+            f"INSERT INTO {self.table} (key, value, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+            (key, json.dumps(value, ensure_ascii=False), time.time()),
+        )
+
+    def is_fresh(self, key: str) -> bool:
+        row = self._conn().execute(
+            f"SELECT updated_at FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        return row is not None and time.time() - row[0] <= self.ttl_seconds
+
+    def stats(self) -> dict:
+        count = self._conn().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {
+            "entries": count,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+        }
@@ -1,40 +1,120 @@
-from .search import load_search_index, search_documents
+from .search import load_search_index, search_documents, search_documents_batch, search_with_scores, encode_query, extract_problem_only
 from .generator import generate_answer, generate_contextual_answer
 from .conversation import process_user_message
+from .cache import answer_cache, normalize_question
+from .slots import detect_slots
+from .singleflight import solution_flight, summary_flight, chat_answer_flight
+from .fanout import run_stages, StageTimer, DEBUG_TIMINGS
 import re
+import time
 import urllib.parse
 import os
-from googleapiclient.discovery import build
+from .google_clients import google_clients
+from .kv_cache import PersistentTTLCache
+from profiling import python_profile
+from .quota import youtube_quota, YOUTUBE_SEARCH_COST, QuotaExhausted, INTERACTIVE, BACKGROUND
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import logging
 
-# 서버 시작 시 1회만 로딩
-retriever, index, docs, problem_texts = load_search_index()
+logger = logging.getLogger(__name__)
+
+def _log_retrieved_docs(purpose: str, filtered_docs: list):
+    """검색된 문서 제목을 DEBUG 레벨로 기록 (DEBUG가 꺼져 있으면 제목 추출도 생략)"""
+    if not filtered_docs or not logger.isEnabledFor(logging.DEBUG):
+        return
+    titles = [m.group(1).strip() for m in (re.search(r"## 문제[:：](.+)", doc) for doc in filtered_docs) if m]
+    logger.debug("검색된 문서", extra={"fields": {"purpose": purpose, "titles": titles}})
+
+# 검색 인덱스는 init_search_index()로 1회만 로딩 (서버는 시작 후 백그라운드에서 로딩)
+retriever, index, docs, problem_texts = None, None, [], []
+_search_warmed = False
+_index_lock = threading.Lock()
+
+def init_search_index(md_path: str = "homefix.md", warm_up: bool = True) -> float:
+    """
+    문장 인코더와 FAISS 인덱스를 로딩하고 질문 인코딩을 한 번 실행해서 워밍업 (이미 끝났으면 생략)
+
+    Args:
+        warm_up: False면 로딩만 하고 워밍업은 다음 호출로 미룸 (사전 포크 부모처럼 추론을 하지 않아야 할 때)
+
+    Returns:
+        로딩에 걸린 시간 (초)
+    """
+    global retriever, index, docs, problem_texts, _search_warmed
+    with _index_lock:
+        if retriever is not None and (_search_warmed or not warm_up):
+            return 0.0
+        start = time.perf_counter()
+        loaded = (retriever, index, docs, problem_texts) if retriever is not None else load_search_index(md_path)
+        if warm_up:
+            # 첫 요청이 토크나이저/커널 초기화 비용을 내지 않도록 미리 인코딩 + 검색
+            search_with_scores("워밍업", loaded[0], loaded[1], k=1)
+            _search_warmed = True
+        retriever, index, docs, problem_texts = loaded
+        return time.perf_counter() - start
+
+def search_index_ready() -> bool:
+    return retriever is not None
+
+def _ensure_search_index():
+    # 서버 밖(스크립트 등)에서 바로 호출된 경우 처음 사용할 때 로딩
+    if retriever is None:
+        init_search_index()
 
 # 이미지 분석 결과로 솔루션 반환
-def return_solution(label: str, loc: str):
-    """이미지 분석 결과로 솔루션과 선택된 문제 제목(전체)을 반환"""
+def return_solution(label: str, loc: str, timings: dict | None = None):
+    """
+    이미지 분석 결과로 솔루션과 선택된 문제 제목(전체)을 반환
+
+    문서 검색 후 GPT 답변 생성과 유튜브 검색을 동시에 실행합니다.
+    같은 (문제, 위치) 요청이 동시에 들어오면 계산 하나를 공유합니다.
+    timings를 넘기면 단계별 소요 시간(ms)이 기록됩니다.
+    """
+    _ensure_search_index()
+    key = (normalize_question(label), normalize_question(loc))
+    with python_profile("return_solution"):
+        answer, selected_problem, youtube_videos, stage_timings = solution_flight.do(
+            key, lambda: _compute_solution(label, loc)
+        )
+    if timings is not None:
+        timings.update(stage_timings)
+    return answer, selected_problem, youtube_videos
+
+
+def resolve_problem(label: str, loc: str, timings: dict | None = None):
+    """
+    이미지 분석 결과(문제, 위치)로 문서를 검색해서 해결책 원문과 선택된 문제 제목(전체)을 반환
+
+    Returns:
+        (검색된 문서 목록, 해결책 섹션 텍스트, 선택된 문제 제목)
+    """
+    _ensure_search_index()
     # 정확한 매칭을 위해 "위치 문제" 형식으로 검색
     question = f"{loc} {label}"
 
     # 문서 검색 (정확한 위치+문제 조합으로 검색)
-    filtered_docs = search_documents(question, retriever, index, docs)
+    with StageTimer(timings if timings is not None else {}, "retrieval"):
+        filtered_docs = search_documents(question, retriever, index, docs)
 
-    # 검색된 문서들의 제목 출력 (디버그용)
-    if filtered_docs:
-        print("\n" + "="*60)
-        print("📚 해결책 생성에 사용된 문서:")
-        for i, doc in enumerate(filtered_docs, 1):
-            title_match = re.search(r"## 문제[:：](.+)", doc)
-            if title_match:
-                print(f"  {i}. {title_match.group(1).strip()}")
-        print("="*60 + "\n")
+    return _resolved(label, loc, filtered_docs)
+
+
+def resolve_problems(pairs: list, timings: dict | None = None) -> list:
+    """여러 (문제, 위치)를 한 번의 인코딩/검색으로 처리 (resolve_problem의 배치 버전)"""
+    _ensure_search_index()
+    with StageTimer(timings if timings is not None else {}, "retrieval"):
+        docs_per_pair = search_documents_batch([f"{loc} {label}" for label, loc in pairs], retriever, index, docs)
+    return [_resolved(label, loc, filtered_docs) for (label, loc), filtered_docs in zip(pairs, docs_per_pair)]
+
+
+def _resolved(label: str, loc: str, filtered_docs: list):
+    # 검색된 문서들의 제목 기록 (디버그용)
+    _log_retrieved_docs("solution", filtered_docs)
 
     # 모든 문서에서 해결책 섹션 추출
     solution_text = extract_all_solutions(filtered_docs) if filtered_docs else ""
 
-    # GPT로 해결책 생성 (더 자연스러운 질문 형식으로)
-    natural_question = f"{loc}에서 {label} 제거하는 법 알려줘."
-    answer = generate_answer(natural_question, solution_text)
-
     # 최상위 매칭 문서의 문제 제목 추출
     selected_problem = f"{loc} {label}"
     if filtered_docs:
@@ -42,16 +122,123 @@ def return_solution(label: str, loc: str):
         if title_match:
             selected_problem = title_match.group(1).strip()
 
-    # 유튜브 영상 검색
-    youtube_videos = []
+    return filtered_docs, solution_text, selected_problem
+
+
+def generate_solution(label: str, loc: str, solution_text: str) -> str:
+    """검색된 해결책 원문으로 GPT 답변 생성 (더 자연스러운 질문 형식으로)"""
+    natural_question = f"{loc}에서 {label} 제거하는 법 알려줘."
+    return generate_answer(natural_question, solution_text)
+
+
+def _compute_solution(label: str, loc: str):
+    """return_solution의 실제 계산 (답변, 문제 제목, 유튜브 영상, 단계별 시간)"""
+    timings = {}
+    total_start = time.perf_counter()
+    resolved = resolve_problem(label, loc, timings)
+    return _finish_solution(label, loc, resolved, timings, total_start)
+
+
+def _finish_solution(label: str, loc: str, resolved: tuple, timings: dict | None = None, total_start: float | None = None):
+    """검색이 끝난 결과로 GPT 해결책 생성 + 문제 키워드로 유튜브 검색 (동시 실행)"""
+    timings = {} if timings is None else timings
+    total_start = time.perf_counter() if total_start is None else total_start
+    filtered_docs, solution_text, selected_problem = resolved
+
+    stages = {"answer": lambda: generate_solution(label, loc, solution_text)}
     if filtered_docs:
-        # 문제 키워드로 유튜브 검색
-        problem_keyword = selected_problem
-        youtube_videos = _search_youtube_videos(problem_keyword, limit=3)
+        stages["youtube"] = lambda: _search_youtube_videos(selected_problem, limit=3)
+    results = run_stages(stages, timings)
+
+    timings["total"] = round((time.perf_counter() - total_start) * 1000, 1)
+
+    return results["answer"], selected_problem, results.get("youtube", []), timings
+
+
+def return_resolved_solution(label: str, loc: str, resolved: tuple):
+    """
+    resolve_problems()로 미리 검색한 결과로 솔루션 반환 (/solve/batch용)
 
+    같은 (문제, 위치)의 /solve 요청과 계산을 공유합니다.
+    """
+    key = (normalize_question(label), normalize_question(loc))
+    answer, selected_problem, youtube_videos, _ = solution_flight.do(
+        key, lambda: _finish_solution(label, loc, resolved)
+    )
     return answer, selected_problem, youtube_videos
 
 
+# 세션 제목 생성 방식: local(검색/키워드 우선, 실패 시 GPT) | llm(항상 GPT)
+SUMMARIZE_MODE = os.environ.get("SUMMARIZE_MODE", "local")
+# 검색 결과를 제목으로 쓸 최대 거리 (정규화 벡터 제곱 L2, 0.3 ≈ 코사인 유사도 0.85)
+SUMMARIZE_MAX_DISTANCE = float(os.environ.get("SUMMARIZE_MAX_DISTANCE", "0.3"))
+# 제목 생성 경로별 처리 횟수
+summarize_stats = {"lexical": 0, "retrieval": 0, "keyword": 0, "llm": 0}
+_summarize_stats_lock = threading.Lock()
+
+def _count_summarize(path: str):
+    with _summarize_stats_lock:
+        summarize_stats[path] += 1
+
+# 질문 끝의 요청 표현 (키워드 제목 생성 시 제거)
+_REQUEST_ENDINGS = re.compile(r"\s*(어떻게\s*해(야\s*)?(하나요|돼|되나요)?|알려\s*줘(요)?|알려\s*주세요|방법(은|이)?\s*(뭐야|있나요|있어)?|하는\s*법|할까요|좀)\s*[?!.~]*$")
+
+def _lexical_title_match(question: str):
+    """제목 전체(괄호 설명 제외)가 질문에 그대로 들어 있으면 가장 긴 제목 반환"""
+    compact = question.replace(" ", "")
+    best = None
+    for title in problem_texts:
+        key = re.sub(r"\(.*?\)", "", title).replace(" ", "")
+        if len(key) >= 2 and key in compact and (best is None or len(key) > len(best[0])):
+            best = (key, title)
+    return best[1] if best else None
+
+def _keyword_title(question: str):
+    """대상/문제 슬롯 또는 요청 표현을 뺀 질문으로 짧은 제목 생성"""
+    slots = detect_slots(question)
+    if slots["object"] and slots["problem"]:
+        return f"{slots['object']} {slots['problem']} {slots['action'] or '해결'}"
+    stripped = _REQUEST_ENDINGS.sub("", question.strip()).strip()
+    if 2 <= len(stripped) <= 30:
+        return stripped
+    return None
+
+def _summarize_local(question: str) -> str:
+    """검색 결과/키워드로 세션 제목 생성, 확신이 없으면 GPT 사용"""
+    from .generator import summarize_question
+
+    title = _lexical_title_match(question)
+    if title:
+        path = "lexical"
+    else:
+        labels, distances = search_with_scores(question, retriever, index, k=1)
+        if labels and labels[0] >= 0 and distances[0] <= SUMMARIZE_MAX_DISTANCE:
+            title, path = problem_texts[labels[0]], "retrieval"
+        else:
+            title = _keyword_title(question)
+            path = "keyword"
+            if not title:
+                title, path = summarize_question(question), "llm"
+
+    _count_summarize(path)
+    logger.debug("세션 제목 생성", extra={"fields": {"path": path, "title": title}})
+    return title[:30] + "..." if len(title) > 30 else title
+
+def summarize(question: str) -> str:
+    """질문을 세션 제목으로 요약 (동일한 질문의 동시 요청은 병합)"""
+    from .generator import summarize_question
+
+    _ensure_search_index()
+
+    def _run():
+        if SUMMARIZE_MODE == "llm":
+            _count_summarize("llm")
+            return summarize_question(question)
+        return _summarize_local(question)
+
+    return summary_flight.do(normalize_question(question), _run)
+
+
 def extract_solution_section(doc_text: str) -> str:
     """문서에서 ## 문제부터 **준비물(필수)** 이전까지 추출"""
     # ## 문제부터 추출 (해결책, 팁 포함)
@@ -80,6 +267,7 @@ def extract_all_solutions(filtered_docs: list, max_length: int = 4000) -> str:
 
 def get_supplies_for_problem(problem_title: str):
     """problem_title로 섹션 찾아서 준비물 파싱"""
+    _ensure_search_index()
     try:
         idx = problem_texts.index(problem_title)
         return parse_supplies_from_document(docs[idx])
@@ -115,75 +303,228 @@ def parse_supplies_from_document(doc_text: str) -> tuple[list[str], list[str]]:
     
     return required_items, optional_items
 
-def _search_youtube_videos(keyword: str, limit: int = 3) -> list:
-    """YouTube Data API v3를 사용해서 유튜브 영상을 검색합니다."""
-    api_key = os.environ.get("YOUTUBE_API_KEY")
+def build_supply_links(filtered_docs: list) -> list:
+    """검색된 문서들의 준비물로 쇼핑 검색 링크 생성 (중복 제거)"""
+    # 모든 문서에서 준비물 정보 추출
+    all_required_items = []
+    all_optional_items = []
+    for doc in filtered_docs:
+        required_items, optional_items = parse_supplies_from_document(doc)
+        all_required_items.extend(required_items)
+        all_optional_items.extend(optional_items)
     
-    if not api_key:
-        print("⚠️ YOUTUBE_API_KEY가 설정되지 않았습니다.")
-        return []
+    # 준비물 검색 링크 생성 (중복 제거)
+    supply_links = []
+    seen_items = set()
     
+    for item in all_required_items:
+        if item not in seen_items:
+            supply_links.append({
+                "keyword": item,
+                "type": "필수",
+                "link": f"https://search.shopping.naver.com/search/all?query={urllib.parse.quote(item)}"
+            })
+            seen_items.add(item)
+    
+    for item in all_optional_items:
+        if item not in seen_items:
+            supply_links.append({
+                "keyword": item,
+                "type": "선택",
+                "link": f"https://search.shopping.naver.com/search/all?query={urllib.parse.quote(item)}"
+            })
+            seen_items.add(item)
+    
+    return supply_links
+
+def _fetch_youtube_videos(keyword: str, limit: int, api_key: str, priority: str = INTERACTIVE) -> list:
+    """YouTube Data API v3를 사용해서 유튜브 영상을 검색합니다. (오류는 호출 측에서 처리)"""
+    # 일일 할당량/호출 속도 확인 (부족하면 QuotaExhausted)
+    youtube_quota.acquire(YOUTUBE_SEARCH_COST, priority)
+    logger.debug("유튜브 검색", extra={"fields": {"keyword": keyword}})
+    # 공유 클라이언트 풀 사용 (서비스는 한 번만 생성, 스레드별 keep-alive 연결 재사용)
+    service = google_clients.service("youtube", "v3", api_key)
+    
+    request = service.search().list(
+        part="snippet",
+        q=keyword,
+        type="video",
+        maxResults=limit,
+        order="relevance"
+    )
     try:
-        print(f"🔍 유튜브 검색 키워드: {keyword}")
-        service = build("youtube", "v3", developerKey=api_key)
-        
-        result = service.search().list(
-            part="snippet",
-            q=keyword,
-            type="video",
-            maxResults=limit,
-            order="relevance"
-        ).execute()
+        result = google_clients.execute("youtube", request)
+    except Exception as e:
+        if _is_quota_error(e):
+            youtube_quota.mark_exhausted()
+        raise
+    
+    videos = []
+    items = result.get('items', [])
+    
+    for item in items:
+        snippet = item.get('snippet', {})
+        id_info = item.get('id', {})
         
-        videos = []
-        items = result.get('items', [])
-        print(f"📋 검색 결과 아이템 수: {len(items)}")
+        title = snippet.get('title', '')
+        description = snippet.get('description', '')
+        video_id = id_info.get('videoId', '')
+        thumbnails = snippet.get('thumbnails', {})
         
-        for item in items:
-            snippet = item.get('snippet', {})
-            id_info = item.get('id', {})
-            
-            title = snippet.get('title', '')
-            description = snippet.get('description', '')
-            video_id = id_info.get('videoId', '')
-            thumbnails = snippet.get('thumbnails', {})
-            
-            # 썸네일 URL 추출 (최고 해상도 우선)
-            thumbnail_url = None
-            if thumbnails:
-                if 'maxres' in thumbnails:
-                    thumbnail_url = thumbnails['maxres']['url']
-                elif 'high' in thumbnails:
-                    thumbnail_url = thumbnails['high']['url']
-                elif 'medium' in thumbnails:
-                    thumbnail_url = thumbnails['medium']['url']
-                elif 'default' in thumbnails:
-                    thumbnail_url = thumbnails['default']['url']
-            
-            link = f"https://www.youtube.com/watch?v={video_id}"
-            
-            if video_id:
-                videos.append({
-                    "title": title,
-                    "description": description,
-                    "link": link,
-                    "thumbnailUrl": thumbnail_url,
-                    "videoId": video_id
-                })
-                print(f"  ✅ 유튜브 영상 추가: {title[:50]}")
+        # 썸네일 URL 추출 (최고 해상도 우선)
+        thumbnail_url = None
+        if thumbnails:
+            if 'maxres' in thumbnails:
+                thumbnail_url = thumbnails['maxres']['url']
+            elif 'high' in thumbnails:
+                thumbnail_url = thumbnails['high']['url']
+            elif 'medium' in thumbnails:
+                thumbnail_url = thumbnails['medium']['url']
+            elif 'default' in thumbnails:
+                thumbnail_url = thumbnails['default']['url']
         
-        # 최대 limit 개수만 반환 (안전장치)
-        return videos[:limit]
+        link = f"https://www.youtube.com/watch?v={video_id}"
         
+        if video_id:
+            videos.append({
+                "title": title,
+                "description": description,
+                "link": link,
+                "thumbnailUrl": thumbnail_url,
+                "videoId": video_id
+            })
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("유튜브 검색 결과", extra={"fields": {"keyword": keyword, "items": len(items), "videos": [v["title"][:50] for v in videos]}})
+    # 최대 limit 개수만 반환 (안전장치)
+    return videos[:limit]
+
+# 유튜브 검색 결과 영구 캐시 (키워드 기준, 기본 7일 TTL)
+YOUTUBE_CACHE_TTL_SECONDS = float(os.environ.get("YOUTUBE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+youtube_cache = PersistentTTLCache(
+    os.environ.get("YOUTUBE_CACHE_PATH", "cache/youtube.db"),
+    table="youtube_videos",
+    ttl_seconds=YOUTUBE_CACHE_TTL_SECONDS,
+)
+# 오래된 항목의 백그라운드 갱신용 (같은 키는 동시에 한 번만 갱신)
+_youtube_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="youtube-refresh")
+_youtube_refreshing = set()
+_youtube_refresh_lock = threading.Lock()
+
+def _is_quota_error(error: Exception) -> bool:
+    """YouTube API 할당량 소진/속도 제한 오류인지 확인"""
+    if isinstance(error, QuotaExhausted):
+        return True
+    status = getattr(getattr(error, "resp", None), "status", None)
+    message = str(error)
+    return status in (403, 429) and ("quota" in message.lower() or "rateLimit" in message or status == 429)
+
+def _youtube_cache_key(keyword: str, limit: int) -> str:
+    return f"{limit}:{normalize_question(keyword)}"
+
+def _refresh_youtube_entry(keyword: str, limit: int, api_key: str):
+    """캐시 항목을 새로 검색해서 갱신 (실패하면 기존 항목 유지)"""
+    key = _youtube_cache_key(keyword, limit)
+    try:
+        videos = _fetch_youtube_videos(keyword, limit, api_key, priority=BACKGROUND)
+        if videos:
+            youtube_cache.set(key, videos)
     except Exception as e:
-        print(f"❌ YouTube Data API 오류:")
-        print(f"   {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.warning("유튜브 캐시 갱신 실패", extra={"fields": {"keyword": keyword, "error": str(e)}})
+    finally:
+        with _youtube_refresh_lock:
+            _youtube_refreshing.discard(key)
+
+def _schedule_youtube_refresh(keyword: str, limit: int, api_key: str):
+    key = _youtube_cache_key(keyword, limit)
+    with _youtube_refresh_lock:
+        if key in _youtube_refreshing:
+            return
+        _youtube_refreshing.add(key)
+    _youtube_refresh_executor.submit(_refresh_youtube_entry, keyword, limit, api_key)
+
+def _search_youtube_videos(keyword: str, limit: int = 3) -> list:
+    """
+    유튜브 영상 검색 (영구 캐시 + stale-while-revalidate)
+
+    - 신선한 캐시 항목이 있으면 API를 호출하지 않음
+    - 오래된 항목은 바로 반환하고 백그라운드에서 갱신
+    - 할당량 소진 오류 시 오래된 항목이라도 반환, 할당량이 부족하면 오래된 항목을 갱신하지 않음
+    """
+    key = _youtube_cache_key(keyword, limit)
+    cached = youtube_cache.get(key)
+    api_key = os.environ.get("YOUTUBE_API_KEY")
+
+    if cached is not None:
+        videos, age, fresh = cached
+        # 할당량이 얼마 남지 않았으면 갱신하지 않고 오래된 항목을 계속 사용
+        if not fresh and api_key and not youtube_quota.is_low():
+            _schedule_youtube_refresh(keyword, limit, api_key)
+        return videos
+
+    if not api_key:
+        logger.warning("YOUTUBE_API_KEY가 설정되지 않았습니다.")
         return []
 
+    try:
+        videos = _fetch_youtube_videos(keyword, limit, api_key)
+    except Exception as e:
+        if _is_quota_error(e):
+            # 할당량 소진 시 아주 오래된 항목이라도 있으면 빈 결과 대신 제공
+            expired = youtube_cache.get(key, include_expired=True)
+            logger.warning("YouTube API 할당량 소진", extra={"fields": {"keyword": keyword, "served_expired": expired is not None}})
+            return expired[0] if expired else []
+        else:
+            logger.error("YouTube Data API 오류", extra={"fields": {"keyword": keyword, "error": str(e)}})
+        return []
+
+    if videos:
+        youtube_cache.set(key, videos)
+    return videos
+
+def prewarm_youtube_cache(titles: list | None = None, limit: int = 3) -> int:
+    """
+    지식 베이스 문제 제목들의 유튜브 검색 결과를 미리 캐시 (신선한 항목은 건너뜀)
+
+    Returns:
+        새로 검색한 제목 수
+    """
+    api_key = os.environ.get("YOUTUBE_API_KEY")
+    if not api_key:
+        return 0
+    _ensure_search_index()
+
+    fetched = 0
+    for title in dict.fromkeys(titles if titles is not None else problem_texts):
+        if not title or youtube_cache.is_fresh(_youtube_cache_key(title, limit)):
+            continue
+        try:
+            videos = _fetch_youtube_videos(title, limit, api_key, priority=BACKGROUND)
+        except Exception as e:
+            if _is_quota_error(e):
+                logger.warning("YouTube API 할당량 소진으로 캐시 미리 채우기를 중단합니다.")
+                break
+            continue
+        if videos:
+            youtube_cache.set(_youtube_cache_key(title, limit), videos)
+            fetched += 1
+    logger.info("유튜브 캐시 미리 채우기 완료", extra={"fields": {"fetched": fetched}})
+    return fetched
+
 # 사용자 텍스트에 대한 솔루션 반환
-def chat_with_ai(user_message: str):
+def chat_with_ai(user_message: str, session_id: str | None = None):
+    """세션별 대화 상태를 잠그고 채팅 응답 생성 (session_id가 없으면 기본 세션 사용)"""
+    from .conversation import conversation_store
+    _ensure_search_index()
+    with conversation_store.session(session_id) as manager, python_profile("chat_with_ai"):
+        manager.begin_turn()
+        result = _chat_with_ai(user_message, manager)
+        tokens_saved = manager.end_turn()
+        if DEBUG_TIMINGS:
+            result["context_tokens_saved"] = tokens_saved
+        return result
+
+def _chat_with_ai(user_message: str, manager):
     """
     사용자 메시지에 대한 스마트한 채팅 응답을 생성합니다.
     구체적이지 않은 질문의 경우 추가 질문을 통해 더 정확한 답변을 제공합니다.
@@ -191,13 +532,15 @@ def chat_with_ai(user_message: str):
     
     Returns:
         dict: {"response": 답변, "is_specific": 구체성 여부, "supplies": 준비물 정보}
+        (HOMEFIX_DEBUG_TIMINGS=1이면 단계별 소요 시간 "timings" 포함)
     """
+    total_start = time.perf_counter()
+    timings = {}
     
     # 먼저 문맥 필요 여부 확인
-    from .conversation import conversation_manager
     from .generator import needs_context
     
-    conversation_context = conversation_manager.get_conversation_context()
+    conversation_context = manager.get_conversation_context()
     requires_context = needs_context(user_message, conversation_context)
     
     # 문맥이 필요하지 않을 때만 관련 질문 여부 확인
@@ -210,7 +553,7 @@ def chat_with_ai(user_message: str):
             }
     
     # 대화 처리
-    response_message, is_final_answer, requires_context = process_user_message(user_message)
+    response_message, is_final_answer, requires_context = process_user_message(user_message, manager)
     
     if not is_final_answer:
         # 추가 질문이 필요한 경우 (애매한 질문)
@@ -218,113 +561,101 @@ def chat_with_ai(user_message: str):
     
     if requires_context:
         # 문맥이 필요한 질문인 경우
-        from .conversation import conversation_manager
-        
         # 이전 대화 내용 가져오기
-        conversation_context = conversation_manager.get_conversation_context()
+        conversation_context = manager.get_conversation_context()
         
         # 이전 대화에서 문제 키워드 추출 (첫 번째 사용자 질문 사용)
         search_query = response_message  # 기본값은 현재 질문
-        if conversation_manager.conversation_history:
+        if manager.conversation_history:
             # 첫 번째 사용자 질문이 가장 구체적인 문제일 가능성이 높음
-            first_user_question = conversation_manager.conversation_history[0]["user"]
+            first_user_question = manager.conversation_history[0]["user"]
             # 이전 문제와 현재 질문을 결합해서 검색
             search_query = f"{first_user_question} {response_message}"
         
         # 문서 검색 (이전 문제 + 현재 질문으로 검색)
         filtered_docs = search_documents(search_query, retriever, index, docs)
         
-        # 검색된 문서들의 제목 출력 (디버그용)
-        if filtered_docs:
-            print("\n" + "="*60)
-            print("💬 [채팅] 사용된 문서:")
-            for i, doc in enumerate(filtered_docs, 1):
-                title_match = re.search(r"## 문제[:：](.+)", doc)
-                if title_match:
-                    print(f"  {i}. {title_match.group(1).strip()}")
-            print("="*60 + "\n")
+        # 검색된 문서들의 제목 기록 (디버그용)
+        _log_retrieved_docs("chat_contextual", filtered_docs)
         
         search_context = "\n\n---\n\n".join(filtered_docs) if filtered_docs else ""
         
-        # 문맥 기반 답변 생성
+        # 문맥 기반 답변 생성 (개인화된 후속 답변이므로 캐시를 사용하지 않음)
+        answer_cache.bypass()
         answer = generate_contextual_answer(response_message, conversation_context, search_context)
         
         # 대화 기록에 최종 답변 추가 (추가하면 오류 발생)
-        # conversation_manager.add_to_history(response_message, answer)
+        # manager.add_to_history(response_message, answer)
         
         return {"response": answer, "is_specific": True}
     
     # 일반적인 최종 답변을 생성하는 경우
-    filtered_docs = search_documents(response_message, retriever, index, docs)
+    # 문서 검색은 원문 질문 임베딩으로 (정규화는 답변 캐시 키/임베딩에만 사용)
+    with StageTimer(timings, "retrieval"):
+        query_embedding = encode_query(response_message, retriever)
+        filtered_docs = search_documents(response_message, retriever, index, docs, query_embedding=query_embedding)
+    normalized_message = normalize_question(response_message)
     
-    # 검색된 문서들의 제목 출력 (디버그용)
-    if filtered_docs:
-        print("\n" + "="*60)
-        print("💬 [채팅] 사용된 문서:")
-        for i, doc in enumerate(filtered_docs, 1):
-            title_match = re.search(r"## 문제[:：](.+)", doc)
-            if title_match:
-                print(f"  {i}. {title_match.group(1).strip()}")
-        print("="*60 + "\n")
+    # 검색된 문서들의 제목 기록 (디버그용)
+    _log_retrieved_docs("chat", filtered_docs)
     
     # 모든 문서에서 해결책 섹션 추출
     solution_text = extract_all_solutions(filtered_docs) if filtered_docs else ""
     
-    # 모든 문서에서 준비물 정보 추출
-    all_required_items = []
-    all_optional_items = []
+    # 문제 키워드로 유튜브 검색 (구체적인 질문일 때만)
+    # 첫 번째 문서의 문제 제목을 키워드로 사용
+    problem_keyword = response_message
     if filtered_docs:
-        for doc in filtered_docs:
-            required_items, optional_items = parse_supplies_from_document(doc)
-            all_required_items.extend(required_items)
-            all_optional_items.extend(optional_items)
-    
-    # 준비물 검색 링크 생성 (중복 제거)
-    supply_links = []
-    seen_items = set()
-    
-    for item in all_required_items:
-        if item not in seen_items:
-            supply_links.append({
-                "keyword": item,
-                "type": "필수",
-                "link": f"https://search.shopping.naver.com/search/all?query={urllib.parse.quote(item)}"
-            })
-            seen_items.add(item)
-    
-    for item in all_optional_items:
-        if item not in seen_items:
-            supply_links.append({
-                "keyword": item,
-                "type": "선택",
-                "link": f"https://search.shopping.naver.com/search/all?query={urllib.parse.quote(item)}"
-            })
-            seen_items.add(item)
+        title_match = re.search(r"## 문제[:：](.+)", filtered_docs[0])
+        if title_match:
+            problem_keyword = title_match.group(1).strip()
 
-    answer = generate_answer(response_message, solution_text)
-    
-    # 유튜브 영상 검색 (구체적인 질문일 때만)
-    youtube_videos = []
+    def _answer():
+        # 같은 문서 집합 + 비슷한 질문이면 캐시된 답변 재사용
+        doc_key = tuple(sorted(extract_problem_only(filtered_docs))) if filtered_docs else ()
+        # 정규화해도 같은 질문이면 검색 임베딩을 그대로 사용
+        cache_embedding = (
+            query_embedding if normalized_message == response_message
+            else encode_query(normalized_message, retriever)
+        )
+        cached = answer_cache.lookup(doc_key, cache_embedding[0])
+        if cached is not None:
+            return cached
+
+        def _generate():
+            generated = generate_answer(response_message, solution_text)
+            # LLM 장애로 해결책 원문이 대체 응답으로 돌아온 경우는 캐시하지 않음
+            if generated != solution_text:
+                answer_cache.store(doc_key, response_message, cache_embedding[0], generated)
+            return generated
+
+        # 같은 문서 + 같은 질문으로 동시에 들어온 답변 생성은 하나로 병합
+        return chat_answer_flight.do((doc_key, normalized_message), _generate)
+
+    # GPT 답변, 유튜브 검색, 준비물 링크 정리를 동시에 실행
+    stages = {
+        "answer": _answer,
+        "supplies": lambda: build_supply_links(filtered_docs),
+    }
     if filtered_docs and solution_text:
-        # 문제 키워드로 유튜브 검색
-        # 첫 번째 문서의 문제 제목을 키워드로 사용
-        problem_keyword = response_message
-        if filtered_docs:
-            title_match = re.search(r"## 문제[:：](.+)", filtered_docs[0])
-            if title_match:
-                problem_keyword = title_match.group(1).strip()
-        
-        # 유튜브 검색 실행
-        youtube_videos = _search_youtube_videos(problem_keyword, limit=3)
+        stages["youtube"] = lambda: _search_youtube_videos(problem_keyword, limit=3)
+    results = run_stages(stages, timings)
+    answer = results["answer"]
+    supply_links = results["supplies"]
+    youtube_videos = results.get("youtube", [])
     
     # 대화 기록에 추가 (추가하면 오류 발생)
-    from .conversation import conversation_manager
-    conversation_manager.add_to_history(response_message, answer)
+    manager.add_to_history(response_message, answer)
     
-    return {
+    timings["total"] = round((time.perf_counter() - total_start) * 1000, 1)
+
+    result = {
         "response": answer,
         "is_specific": True,
         "supplies": supply_links,
         "solution": solution_text,
         "youtube_videos": youtube_videos
     }
+    if DEBUG_TIMINGS:
+        result["timings"] = timings
+    return result
@@ -0,0 +1,269 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+try:
+    from zoneinfo import ZoneInfo
+    _QUOTA_TZ = ZoneInfo("America/Los_Angeles")
+except Exception:
+    # tzdata가 없는 환경이면 태평양 표준시 고정 오프셋 사용
+    _QUOTA_TZ = timezone(timedelta(hours=-8))
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+
+class QuotaExhausted(Exception):
+    """일일 할당량이 부족하거나 속도 제한 대기 시간을 넘겨 호출을 보내지 않음"""
+
+
+def _next_reset(now: datetime) -> datetime:
+    """Google API 일일 할당량 초기화 시각 (태평양 시간 자정)"""
+    local = now.astimezone(_QUOTA_TZ)
+    midnight = local.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return midnight
+
+
+class MemoryQuotaLedger:
+    """프로세스 메모리 사용량 기록 (단일 프로세스 실행, 테스트용)"""
+
+    def __init__(self):
+        self._used = {}  # (이름, 기간) -> 사용량
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def usage(self, name: str, period: str):
+        """(사용량, 기간 시작 시각)"""
+        with self._lock:
+            key = (name, period)
+            self._started.setdefault(key, time.time())
+            return self._used.get(key, 0), self._started[key]
+
+    def try_consume(self, name: str, period: str, cost: int, limit: float) -> bool:
+        """사용량 + cost가 limit 이하일 때만 사용량에 반영"""
+        with self._lock:
+            key = (name, period)
+            self._started.setdefault(key, time.time())
+            if self._used.get(key, 0) + cost > limit:
+                return False
+            self._used[key] = self._used.get(key, 0) + cost
+            return True
+
+    def mark_exhausted(self, name: str, period: str, daily_units: int):
+        with self._lock:
+            key = (name, period)
+            self._started.setdefault(key, time.time())
+            self._used[key] = max(self._used.get(key, 0), daily_units)
+
+
+class SqliteQuotaLedger:
+    """
+    SQLite(WAL 모드) 사용량 기록 - 같은 호스트의 모든 워커(serve_prefork.py, uvicorn --workers)가
+    하나의 일일 할당량을 나눠 쓰고, 재시작해도 사용량이 유지됨
+
+    확인과 반영을 조건부 UPDATE 한 문장으로 처리하므로 여러 프로세스가 동시에 호출해도 한도를 넘지 않습니다.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS quota_usage ("
+            " name TEXT NOT NULL, period TEXT NOT NULL, used INTEGER NOT NULL, started_at REAL NOT NULL,"
+            " PRIMARY KEY (name, period))"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 스레드마다 연결 하나 (sqlite3 연결은 스레드 간 공유 불가)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _after_fork(self):
+        # fork로 물려받은 연결은 쓰지 않고 워커에서 새로 연결 (serve_prefork.py)
+        self._local = threading.local()
+
+    def _ensure(self, conn, name: str, period: str):
+        conn.execute(
+            "INSERT OR IGNORE INTO quota_usage (name, period, used, started_at) VALUES (?, ?, 0, ?)",
+            (name, period, time.time()),
+        )
+
+    def usage(self, name: str, period: str):
+        conn = self._conn()
+        self._ensure(conn, name, period)
+        return conn.execute(
+            "SELECT used, started_at FROM quota_usage WHERE name = ? AND period = ?", (name, period)
+        ).fetchone()
+
+    def try_consume(self, name: str, period: str, cost: int, limit: float) -> bool:
+        conn = self._conn()
+        self._ensure(conn, name, period)
+        cursor = conn.execute(
+            "UPDATE quota_usage SET used = used + ? WHERE name = ? AND period = ? AND used + ? <= ?",
+            (cost, name, period, cost, limit),
+        )
+        return cursor.rowcount == 1
+
+    def mark_exhausted(self, name: str, period: str, daily_units: int):
+        conn = self._conn()
+        self._ensure(conn, name, period)
+        conn.execute(
+            "UPDATE quota_usage SET used = MAX(used, ?) WHERE name = ? AND period = ?",
+            (daily_units, name, period),
+        )
+
+
+class QuotaScheduler:
+    """
+    외부 검색 API 호출용 토큰 버킷 + 일일 할당량 스케줄러
+
+    - 토큰 버킷으로 초당 호출 수를 제한 (대기 시간 안에 토큰이 없으면 QuotaExhausted)
+    - 일일 할당량 중 background_reserve 비율은 사용자 요청 전용으로 남겨둠
+      (캐시 미리 채우기, 백그라운드 갱신은 이 비율 아래로 내려가면 거절)
+    - 남은 할당량이 low_watermark 비율 아래면 is_low()가 True → 호출 측은 캐시를 우선 사용
+    - 일일 사용량은 ledger(기본 SQLite)에 기록해서 모든 워커가 공유하고 재시작 후에도 유지
+      (토큰 버킷은 프로세스별이므로 rate_per_second는 워커 하나의 속도)
+    """
+
+    def __init__(self, name: str, daily_units: int, rate_per_second: float, burst: int,
+                 background_reserve: float = 0.3, low_watermark: float = 0.2, ledger=None):
+        self.name = name
+        self.daily_units = daily_units
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.background_reserve = background_reserve
+        self.low_watermark = low_watermark
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._ledger = ledger or MemoryQuotaLedger()
+        self._reset_at = _next_reset(datetime.now(timezone.utc))
+        self.denied = {INTERACTIVE: 0, BACKGROUND: 0}
+        self.granted = {INTERACTIVE: 0, BACKGROUND: 0}
+
+    def _period(self) -> str:
+        """현재 할당량 기간 키 (다음 초기화 시각, 기간이 바뀌면 새 행에서 0부터 셈)"""
+        if datetime.now(timezone.utc) >= self._reset_at:
+            self._reset_at = _next_reset(datetime.now(timezone.utc))
+        return self._reset_at.isoformat(timespec="seconds")
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate_per_second)
+        self._refilled_at = now
+
+    def remaining(self) -> int:
+        with self._lock:
+            used, _ = self._ledger.usage(self.name, self._period())
+        return max(0, self.daily_units - used)
+
+    def is_low(self) -> bool:
+        return self.remaining() < self.daily_units * self.low_watermark
+
+    def acquire(self, cost: int = 1, priority: str = INTERACTIVE, max_wait: float = 2.0):
+        """
+        호출 전에 할당량과 토큰 확보 (확보하면 사용량에 바로 반영)
+
+        Raises:
+            QuotaExhausted: 일일 할당량 부족, 또는 max_wait 안에 토큰을 얻지 못함
+        """
+        # 백그라운드 작업은 대기하지 않음 (사용자 요청이 토큰을 먼저 쓰도록)
+        deadline = time.monotonic() + (max_wait if priority == INTERACTIVE else 0.0)
+        while True:
+            with self._lock:
+                period = self._period()
+                floor = self.daily_units * self.background_reserve if priority == BACKGROUND else 0
+                self._refill()
+                if self._tokens >= 1:
+                    # 할당량 확인과 반영을 ledger에서 한 번에 (다른 워커와 동시에 호출해도 한도 유지)
+                    granted = self._ledger.try_consume(self.name, period, cost, self.daily_units - floor)
+                else:
+                    used, _ = self._ledger.usage(self.name, period)
+                    granted = None if self.daily_units - used - cost >= floor else False
+                if granted is False:
+                    self.denied[priority] += 1
+                    raise QuotaExhausted(f"{self.name} 일일 할당량 부족 (한도 {self.daily_units})")
+                if granted:
+                    self._tokens -= 1
+                    self.granted[priority] += 1
+                    return
+                wait = (1 - self._tokens) / self.rate_per_second
+            if time.monotonic() + wait > deadline:
+                with self._lock:
+                    self.denied[priority] += 1
+                raise QuotaExhausted(f"{self.name} 호출 속도 제한")
+            time.sleep(wait)
+
+    def mark_exhausted(self):
+        """API가 할당량 초과 오류를 반환하면 다음 초기화 시각까지 소진된 것으로 처리"""
+        with self._lock:
+            self._ledger.mark_exhausted(self.name, self._period(), self.daily_units)
+
+    def stats(self) -> dict:
+        with self._lock:
+            used, period_start = self._ledger.usage(self.name, self._period())
+            reset_at = self._reset_at
+        remaining = max(0, self.daily_units - used)
+        elapsed = time.time() - period_start
+        # 초기화 이후 평균 사용 속도로 소진 예상 시각 계산 (초기화 전에 소진되지 않으면 None)
+        projected = None
+        if used and elapsed > 0:
+            exhaust_at = datetime.now(timezone.utc) + timedelta(seconds=remaining / (used / elapsed))
+            if exhaust_at < reset_at:
+                projected = exhaust_at.astimezone(_QUOTA_TZ).isoformat(timespec="seconds")
+        return {
+            "daily_units": self.daily_units,
+            "used_units": used,
+            "remaining_units": remaining,
+            "low": remaining < self.daily_units * self.low_watermark,
+            "resets_at": reset_at.isoformat(timespec="seconds"),
+            "projected_exhaustion": projected,
+            "granted": dict(self.granted),
+            "denied": dict(self.denied),
+        }
+
+
+def _create_ledger():
+    """QUOTA_STORE: sqlite(기본, 워커 간 공유 + 재시작 후 유지) | memory"""
+    if os.environ.get("QUOTA_STORE", "sqlite") == "memory":
+        return MemoryQuotaLedger()
+    return SqliteQuotaLedger(os.environ.get("QUOTA_DB_PATH", "cache/quota.db"))
+
+
+_ledger = _create_ledger()
+
+# YouTube Data API: search.list 1회 100 단위 (기본 일일 10,000 단위)
+YOUTUBE_SEARCH_COST = 100
+youtube_quota = QuotaScheduler(
+    "youtube",
+    daily_units=int(os.environ.get("YOUTUBE_DAILY_QUOTA", "10000")),
+    rate_per_second=float(os.environ.get("YOUTUBE_RATE_PER_SECOND", "5")),
+    burst=int(os.environ.get("YOUTUBE_BURST", "10")),
+    ledger=_ledger,
+)
+
+# Custom Search JSON API: 쿼리 1회 1 단위 (무료 일일 100회)
+search_quota = QuotaScheduler(
+    "customsearch",
+    daily_units=int(os.environ.get("GOOGLE_SEARCH_DAILY_QUOTA", "100")),
+    rate_per_second=float(os.environ.get("GOOGLE_SEARCH_RATE_PER_SECOND", "5")),
+    burst=int(os.environ.get("GOOGLE_SEARCH_BURST", "10")),
+    ledger=_ledger,
+)
+
+
+def quota_stats() -> dict:
+    return {"youtube": youtube_quota.stats(), "customsearch": search_quota.stats()}
@@ -0,0 +1,255 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+
+
+class LLMUnavailable(Exception):
+    """LLM 호출 불가 (회로 차단, 마감 시간 초과, 재시도 실패) - 호출 측에서 로컬 대체 응답 사용"""
+
+
+class DeadlineExceeded(LLMUnavailable):
+    """요청 전체 예산(마감 시간)을 모두 사용함"""
+
+
+# ------------------------- 요청 마감 시간 ------------------------- #
+# 엔드포인트 전체 예산에서 계산된 절대 마감 시각 (time.monotonic 기준)
+_deadline = contextvars.ContextVar("llm_deadline", default=None)
+
+
+@contextmanager
+def request_deadline(seconds: float):
+    """이 블록 안의 LLM 호출은 남은 예산 안에서만 실행"""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def run_with_deadline(seconds: float, fn, *args, **kwargs):
+    """마감 시간을 설정하고 fn 실행 (run_in_threadpool에 넘기기 위한 헬퍼)"""
+    with request_deadline(seconds):
+        return fn(*args, **kwargs)
+
+
+def remaining_time():
+    """남은 예산(초). 마감 시간이 없으면 None"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+# ------------------------- 지연 시간 추적 ------------------------- #
+class LatencyTracker:
+    """최근 호출 지연 시간으로 백분위수 계산 (헤지 요청 시점 결정용)"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float, min_samples: int = 20):
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, int(len(ordered) * p / 100))
+        return ordered[idx]
+
+
+# ------------------------- 회로 차단기 ------------------------- #
+class CircuitBreaker:
+    """
+    연속 실패가 failure_threshold회를 넘으면 회로를 열고(open) reset_timeout 동안 호출을 차단합니다.
+    이후 한 번의 시험 호출(half-open)이 성공하면 다시 닫습니다(closed).
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = "half_open"
+                return True
+            if self.state == "half_open":
+                # 시험 호출은 하나만 허용
+                self.rejected += 1
+                return False
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = "closed"
+
+    def release(self):
+        """실패로 세지 않는 오류로 끝난 호출 처리 (시험 호출이었으면 다음 호출이 다시 시험할 수 있게 함)"""
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self._opened_at = time.monotonic() - self.reset_timeout
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self._failures, "rejected": self.rejected}
+
+
+# ------------------------- LLM 호출 래퍼 ------------------------- #
+LLM_DEFAULT_TIMEOUT = float(os.environ.get("LLM_TIMEOUT_SECONDS", "20"))
+LLM_CLASSIFIER_TIMEOUT = float(os.environ.get("LLM_CLASSIFIER_TIMEOUT_SECONDS", "5"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "1"))
+LLM_HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", "95"))
+# 남은 예산이 이보다 적으면 호출하지 않음 (응답 조립 시간 확보)
+_MIN_CALL_BUDGET = 0.2
+
+llm_breaker = CircuitBreaker(
+    failure_threshold=int(os.environ.get("LLM_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.environ.get("LLM_BREAKER_RESET_SECONDS", "30")),
+)
+_latency = {}
+_latency_lock = threading.Lock()
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+hedged_calls = 0
+
+
+def _tracker(name: str) -> LatencyTracker:
+    with _latency_lock:
+        if name not in _latency:
+            _latency[name] = LatencyTracker()
+        return _latency[name]
+
+
+def _call_timeout(default_timeout: float) -> float:
+    remaining = remaining_time()
+    if remaining is None:
+        return default_timeout
+    if remaining < _MIN_CALL_BUDGET:
+        raise DeadlineExceeded("요청 예산을 모두 사용했습니다.")
+    return min(default_timeout, remaining - _MIN_CALL_BUDGET / 2)
+
+
+def _hedged(fn, timeout: float, hedge_after: float):
+    """hedge_after초 안에 응답이 없으면 같은 요청을 한 번 더 보내고 먼저 도착한 응답 사용"""
+    global hedged_calls
+    deadline = time.monotonic() + timeout
+    ctx = contextvars.copy_context()
+    primary = _hedge_executor.submit(ctx.run, fn, timeout)
+    done, _ = wait([primary], timeout=hedge_after)
+    if done:
+        return primary.result()
+
+    with _latency_lock:
+        hedged_calls += 1
+    secondary = _hedge_executor.submit(
+        contextvars.copy_context().run, fn, max(deadline - time.monotonic(), _MIN_CALL_BUDGET)
+    )
+    pending = {primary, secondary}
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    # 두 요청 모두 timeout 안에 응답하지 않은 것은 LLM 지연이므로 타임아웃(회로 차단기 실패)으로 처리
+    raise error or TimeoutError("헤지 요청 모두 시간 초과")
+
+
+def call_llm(name: str, fn, hedge: bool = False, default_timeout: float = LLM_DEFAULT_TIMEOUT):
+    """
+    모든 LLM 호출의 공통 진입점
+
+    - 요청 마감 시간에서 남은 예산으로 호출별 timeout 계산
+    - 일시적 오류는 예산이 남아 있으면 LLM_MAX_RETRIES회 재시도
+    - hedge=True(가벼운 분류 호출)이면 지연 시간 백분위수를 넘을 때 중복 요청
+    - 연속 실패 시 회로를 열어 LLMUnavailable을 즉시 발생 (호출 측에서 로컬 대체 응답 사용)
+
+    Args:
+        name: 호출 이름 (지연 시간 통계 키)
+        fn: timeout(초)을 받아 응답을 반환하는 함수
+    """
+    if not llm_breaker.allow():
+        raise LLMUnavailable(f"{name}: LLM 회로 차단 중")
+
+    tracker = _tracker(name)
+    last_error = None
+    for _ in range(LLM_MAX_RETRIES + 1):
+        timeout = _call_timeout(default_timeout)
+        start = time.monotonic()
+        try:
+            hedge_after = tracker.percentile(LLM_HEDGE_PERCENTILE) if hedge else None
+            if hedge_after is not None and hedge_after < timeout:
+                response = _hedged(fn, timeout, hedge_after)
+            else:
+                response = fn(timeout)
+        except DeadlineExceeded:
+            # 로컬 예산 소진은 LLM 장애가 아니므로 회로 차단기에 세지 않음
+            llm_breaker.release()
+            raise
+        except Exception as e:
+            last_error = e
+            if not _is_retryable(e):
+                # 4xx, 프로그래밍 오류 등은 재시도하지 않고 회로 차단기에도 세지 않음
+                llm_breaker.release()
+                break
+            llm_breaker.record_failure()
+            if not llm_breaker.allow():
+                break
+            continue
+        tracker.record(time.monotonic() - start)
+        llm_breaker.record_success()
+        return response
+
+    raise LLMUnavailable(f"{name}: {last_error}") from last_error
+
+
+try:
+    from openai import APIConnectionError, APITimeoutError
+    _TRANSIENT_ERRORS = (APIConnectionError, APITimeoutError, TimeoutError, ConnectionError)
+except ImportError:
+    _TRANSIENT_ERRORS = (TimeoutError, ConnectionError)
+
+
+def _is_retryable(error: Exception) -> bool:
+    """타임아웃, 연결 오류, 429, 5xx만 재시도 (회로 차단기도 이 오류만 실패로 셈)"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, _TRANSIENT_ERRORS)
+
+
+def resilience_stats() -> dict:
+    with _latency_lock:
+        trackers = dict(_latency)
+        hedged = hedged_calls
+    return {
+        "breaker": llm_breaker.stats(),
+        "hedged_calls": hedged,
+        "p95_seconds": {name: t.percentile(95, min_samples=1) for name, t in trackers.items()},
+    }
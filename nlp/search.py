@@ -3,6 +3,7 @@ import faiss
 import numpy as np
 from sklearn.preprocessing import normalize
 from sentence_transformers import SentenceTransformer
+from metrics import stage_seconds
 
 def extract_problem_only(docs):
     """문서에서 "## 문제:" 항목만 추출"""
@@ -33,18 +34,48 @@ def load_search_index(md_path="homefix.md"):
 
     return retriever, index, docs, problem_texts
 
-def search_documents(query: str, retriever, index, docs, k=2):
-    """문서 검색 수행"""
-    # 질문 임베딩
-    query_embedding = retriever.encode([query], convert_to_tensor=False)
+def encode_query(query: str, retriever):
+    """질문 임베딩 (L2 정규화된 1 x dim 배열)"""
+    with stage_seconds.time("query_encode"):
+        query_embedding = retriever.encode([query], convert_to_tensor=False)
     query_embedding = np.array(query_embedding).astype("float32")
-    query_embedding = normalize(query_embedding, norm='l2')
+    return normalize(query_embedding, norm='l2')
+
+def search_documents(query: str, retriever, index, docs, k=2, query_embedding=None):
+    """문서 검색 수행 (query_embedding을 넘기면 인코딩을 생략)"""
+    # 질문 임베딩
+    if query_embedding is None:
+        query_embedding = encode_query(query, retriever)
 
     # FAISS 검색
-    distances, labels = index.search(query_embedding, k=k)
+    with stage_seconds.time("faiss_search"):
+        distances, labels = index.search(query_embedding, k=k)
     best_dist = distances[0][0]
     filtered_docs = [
         docs[i] for i, dist in zip(labels[0], distances[0]) if dist <= best_dist + 0.2
     ]
 
     return filtered_docs
+
+def search_documents_batch(queries: list, retriever, index, docs, k=2) -> list:
+    """여러 질문을 한 번에 인코딩/검색해서 질문별 문서 목록 반환 (search_documents와 같은 필터)"""
+    if not queries:
+        return []
+    with stage_seconds.time("query_encode"):
+        query_embeddings = retriever.encode(list(queries), convert_to_tensor=False)
+    query_embeddings = normalize(np.array(query_embeddings).astype("float32"), norm='l2')
+
+    with stage_seconds.time("faiss_search"):
+        distances, labels = index.search(query_embeddings, k=k)
+    return [
+        [docs[i] for i, dist in zip(row_labels, row_distances) if dist <= row_distances[0] + 0.2]
+        for row_labels, row_distances in zip(labels, distances)
+    ]
+
+def search_with_scores(query: str, retriever, index, k=1, query_embedding=None):
+    """상위 k개 문서의 (인덱스 목록, 거리 목록) 반환 (거리는 정규화 벡터의 제곱 L2 거리)"""
+    if query_embedding is None:
+        query_embedding = encode_query(query, retriever)
+    with stage_seconds.time("faiss_search"):
+        distances, labels = index.search(query_embedding, k=k)
+    return list(labels[0]), list(distances[0])
@@ -0,0 +1,396 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 세션 ID가 없는 요청(구버전 클라이언트)이 공유하는 세션
+DEFAULT_SESSION_ID = "default"
+
+
+# ------------------------- 프로세스 메모리 저장소 ------------------------- #
+class SessionStore:
+    """
+    세션별 대화 상태 저장소 (프로세스 메모리)
+
+    - LRU 순서로 관리하며 idle_ttl_seconds 동안 사용되지 않은 세션은 제거
+    - 세션 수(max_sessions)와 추정 메모리 사용량(max_bytes) 상한을 넘으면 가장 오래된 세션부터 제거
+    - 같은 세션의 요청은 세션 잠금으로 순서대로 처리
+    """
+
+    backend_name = "memory"
+
+    def __init__(self, factory, max_sessions=50000, idle_ttl_seconds=1800, max_bytes=256 * 1024 * 1024):
+        self._factory = factory
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, object]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+
+    def _get_or_create(self, session_id: str):
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = self._factory()
+                self._sessions[session_id] = state
+                self._total_bytes += state.size
+                self.created += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            return state
+
+    @contextmanager
+    def session(self, session_id: str | None):
+        """세션 상태를 잠그고 반환, 블록이 끝나면 사용 시각과 메모리 사용량 갱신"""
+        session_id = session_id or DEFAULT_SESSION_ID
+        while True:
+            state = self._get_or_create(session_id)
+            state.lock.acquire()
+            with self._lock:
+                current = self._sessions.get(session_id)
+            if current is state:
+                break
+            # 잠금을 기다리는 동안 제거된 세션이면 새 상태로 다시 시도 (두 요청이 다른 상태를 쓰지 않도록)
+            state.lock.release()
+        old_size = state.size
+        try:
+            yield state
+        finally:
+            state.last_access = time.monotonic()
+            new_size = state.recompute_size()
+            with self._lock:
+                # 처리 중에 제거된 세션이면 다시 넣지 않음
+                if self._sessions.get(session_id) is state:
+                    self._total_bytes += new_size - old_size
+                    self._evict_capacity()
+            state.lock.release()
+
+    def _evict_idle(self, now: float):
+        while self._sessions:
+            session_id, state = next(iter(self._sessions.items()))
+            if now - state.last_access <= self.idle_ttl_seconds:
+                break
+            self._remove(session_id)
+            self.evicted_idle += 1
+
+    def _evict_capacity(self):
+        while self._sessions and (
+            len(self._sessions) > self.max_sessions or self._total_bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._sessions)))
+            self.evicted_capacity += 1
+
+    def _remove(self, session_id: str):
+        state = self._sessions.pop(session_id)
+        self._total_bytes -= state.size
+
+    def delete(self, session_id: str):
+        with self._lock:
+            if session_id in self._sessions:
+                self._remove(session_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            return {
+                "backend": self.backend_name,
+                "active_sessions": len(self._sessions),
+                "approx_bytes": self._total_bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "created": self.created,
+                "evicted_idle": self.evicted_idle,
+                "evicted_capacity": self.evicted_capacity,
+            }
+
+
+# ------------------------- 공유 저장소 (여러 워커/노드) ------------------------- #
+class SharedSessionStore:
+    """
+    외부 백엔드(SQLite, Redis)에 세션 상태를 저장하는 저장소
+
+    요청 한 턴마다 상태를 한 번 읽고(load), 처리 중에는 메모리에서만 수정한 뒤
+    바뀐 경우에만 한 번 씁니다(save). 상태가 바뀌지 않은 턴은 왕복 한 번, 바뀐 턴은 load/save 두 번이고,
+    save 응답은 턴이 끝나기 전에 확인하므로 저장에 실패한 턴은 성공으로 응답하지 않습니다
+    (실패 수는 stats()의 save_failures). 따라서 sticky session 없이 여러 워커/노드가
+    같은 세션을 처리할 수 있습니다. 같은 프로세스 안의 동시 요청은 잠금으로 순서를 보장하지만,
+    서로 다른 프로세스가 같은 세션을 동시에 처리하면 마지막 쓰기가 남습니다.
+    """
+
+    def __init__(self, factory, backend, lock_stripes=64):
+        self._factory = factory
+        self.backend = backend
+        self.backend_name = backend.name
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+        self.loads = 0
+        self.saves = 0
+        self.skipped_saves = 0
+        self.save_failures = 0
+        self._stats_lock = threading.Lock()
+
+    @contextmanager
+    def session(self, session_id: str | None):
+        session_id = session_id or DEFAULT_SESSION_ID
+        with self._locks[zlib.crc32(session_id.encode("utf-8")) % len(self._locks)]:
+            data = self.backend.load(session_id)
+            self._count("loads")
+            state = self._factory.from_dict(data) if data else self._factory()
+            before = state.to_dict()
+            try:
+                yield state
+            finally:
+                after = state.to_dict()
+                if after != before:
+                    try:
+                        self.backend.save(session_id, after)
+                    except Exception as e:
+                        # 저장하지 못한 턴은 실패로 응답 (상태가 사라졌는데 200을 주지 않음)
+                        self._count("save_failures")
+                        logger.warning("세션 저장 실패", extra={"fields": {"backend": self.backend_name, "error": str(e)}})
+                        raise
+                    self._count("saves")
+                else:
+                    self._count("skipped_saves")
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def delete(self, session_id: str):
+        self.backend.delete(session_id)
+
+    def stats(self) -> dict:
+        stats = {
+            "backend": self.backend_name,
+            "loads": self.loads,
+            "saves": self.saves,
+            "skipped_saves": self.skipped_saves,
+            "save_failures": self.save_failures,
+        }
+        stats.update(self.backend.stats())
+        return stats
+
+
+class SqliteSessionBackend:
+    """SQLite(WAL 모드) 세션 백엔드 - 같은 호스트의 여러 워커가 공유"""
+
+    name = "sqlite"
+
+    def __init__(self, path="sessions.db", idle_ttl_seconds=1800, max_sessions=50000):
+        self.path = path
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_sessions = max_sessions
+        self._local = threading.local()
+        self._writes = 0
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 스레드마다 연결 하나 (sqlite3 연결은 스레드 간 공유 불가)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _after_fork(self):
+        # fork로 물려받은 연결은 쓰지 않고 워커에서 새로 연결 (serve_prefork.py)
+        self._local = threading.local()
+
+    def load(self, session_id: str):
+        row = self._conn().execute(
+            "SELECT state, updated_at FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.idle_ttl_seconds:
+            return None
+        return json.loads(row[0])
+
+    def save(self, session_id: str, state: dict):
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO sessions (id, state, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+            (session_id, json.dumps(state, ensure_ascii=False), time.time()),
+        )
+        self._writes += 1
+        # 쓰기 1000번마다 만료/초과 세션 정리
+        if self._writes % 1000 == 0:
+            self._cleanup(conn)
+
+    def _cleanup(self, conn):
+        conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.idle_ttl_seconds,))
+        conn.execute(
+            "DELETE FROM sessions WHERE id IN ("
+            " SELECT id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        )
+
+    def delete(self, session_id: str):
+        self._conn().execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def stats(self) -> dict:
+        count = self._conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE updated_at >= ?", (time.time() - self.idle_ttl_seconds,)
+        ).fetchone()[0]
+        return {"active_sessions": count, "path": self.path}
+
+
+class RespError(Exception):
+    """Redis 프로토콜 오류 응답"""
+
+
+class _RespConnection:
+    """최소한의 RESP(Redis 직렬화 프로토콜) 클라이언트 연결"""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def command(self, *args):
+        self.sock.sendall(self._encode(args))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Redis 연결이 끊어졌습니다.")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode("utf-8")
+        if kind == b"-":
+            raise RespError(payload.decode("utf-8"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(payload)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise RespError(f"알 수 없는 응답: {line!r}")
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisSessionBackend:
+    """
+    Redis 프로토콜 세션 백엔드 - 여러 노드가 공유
+
+    GET / SET EX / DEL / DBSIZE만 사용하므로 Redis 호환 서버나
+    테스트용 로컬 대체 서버(loadtest/resp_server.py)로 바꿔 쓸 수 있습니다.
+    """
+
+    name = "redis"
+
+    def __init__(self, host="127.0.0.1", port=6379, idle_ttl_seconds=1800, prefix="homefix:session:", timeout=2.0):
+        self.host = host
+        self.port = port
+        self.idle_ttl_seconds = int(idle_ttl_seconds)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _command(self, *args):
+        conn = getattr(self._local, "conn", None)
+        for attempt in range(2):
+            if conn is None:
+                conn = _RespConnection(self.host, self.port, self.timeout)
+                self._local.conn = conn
+            try:
+                return conn.command(*args)
+            except (ConnectionError, OSError):
+                # 끊어진 연결은 한 번만 다시 연결해서 재시도
+                conn.close()
+                conn = self._local.conn = None
+                if attempt == 1:
+                    raise
+
+    def load(self, session_id: str):
+        data = self._command("GET", self.prefix + session_id)
+        return json.loads(data) if data else None
+
+    def save(self, session_id: str, state: dict):
+        # 유휴 TTL은 Redis 만료 시간으로 처리, 오류 응답(OOM, READONLY 등)은 RespError로 호출 측에 전달
+        self._command(
+            "SET", self.prefix + session_id,
+            json.dumps(state, ensure_ascii=False).encode("utf-8"),
+            "EX", self.idle_ttl_seconds,
+        )
+
+    def delete(self, session_id: str):
+        self._command("DEL", self.prefix + session_id)
+
+    def stats(self) -> dict:
+        try:
+            keys = self._command("DBSIZE")
+        except (ConnectionError, OSError, RespError):
+            keys = None
+        return {"active_sessions": keys, "address": f"{self.host}:{self.port}"}
+
+
+def create_session_store(factory):
+    """
+    환경 변수 설정으로 세션 저장소 생성
+
+    HOMEFIX_SESSION_BACKEND: memory(기본) | sqlite | redis
+    """
+    backend = os.environ.get("HOMEFIX_SESSION_BACKEND", "memory")
+    idle_ttl = float(os.environ.get("SESSION_IDLE_TTL_SECONDS", "1800"))
+    max_sessions = int(os.environ.get("SESSION_MAX_COUNT", "50000"))
+
+    if backend == "sqlite":
+        return SharedSessionStore(factory, SqliteSessionBackend(
+            path=os.environ.get("SESSION_SQLITE_PATH", "sessions.db"),
+            idle_ttl_seconds=idle_ttl,
+            max_sessions=max_sessions,
+        ))
+    if backend == "redis":
+        return SharedSessionStore(factory, RedisSessionBackend(
+            host=os.environ.get("SESSION_REDIS_HOST", "127.0.0.1"),
+            port=int(os.environ.get("SESSION_REDIS_PORT", "6379")),
+            idle_ttl_seconds=idle_ttl,
+        ))
+    return SessionStore(
+        factory,
+        max_sessions=max_sessions,
+        idle_ttl_seconds=idle_ttl,
+        max_bytes=int(os.environ.get("SESSION_MAX_BYTES", str(256 * 1024 * 1024))),
+    )
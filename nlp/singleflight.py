@@ -0,0 +1,81 @@
+import threading
+
+
+class _Call:
+    """진행 중인 계산 하나 (결과를 기다리는 요청들이 공유)"""
+
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    동일한 요청 병합 (singleflight)
+
+    같은 키로 동시에 들어온 요청은 먼저 도착한 요청의 계산 하나만 실행하고,
+    나머지 요청은 그 결과(또는 예외)를 함께 받습니다. 계산이 끝나면 키는 바로 해제되므로
+    결과를 캐시하지는 않습니다.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict = {}
+        self._lock = threading.Lock()
+        self.executed = 0  # 실제로 실행된 계산 수
+        self.shared = 0    # 다른 요청의 결과를 받아서 절약된 호출 수
+
+    def do(self, key, fn):
+        """key에 대해 fn()을 한 번만 실행하고 결과를 공유"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            "executed": self.executed,
+            "saved_calls": self.shared,
+            "in_flight": in_flight,
+        }
+
+
+# 엔드포인트별 요청 병합기
+solution_flight = SingleFlight("solve")
+summary_flight = SingleFlight("summarize")
+chat_answer_flight = SingleFlight("chat_answer")
+
+
+def flight_stats() -> dict:
+    """모든 요청 병합기의 통계"""
+    return {f.name: f.stats() for f in (solution_flight, summary_flight, chat_answer_flight)}
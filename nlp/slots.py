@@ -0,0 +1,187 @@
+import re
+import threading
+from functools import lru_cache
+
+# 대상(위치) 동의어 -> 지식 베이스 표기
+OBJECT_SYNONYMS = {
+    "프라이팬": "후라이팬",
+    "후라이펜": "후라이팬",
+    "수도꼭지": "수전",
+    "렌지후드": "후드",
+    "가스렌지": "가스레인지",
+    "벽지": "종이벽지",
+    "욕조": "욕실용품",
+}
+
+# 오염 계열 문제 (추가 질문을 "어디의 ~를 제거하고 싶으신가요?" 형식으로 생성)
+REMOVAL_PROBLEMS = {"기름때", "물때", "곰팡이", "녹", "얼룩", "악취", "냄새", "변색", "먼지", "그을음", "탄내"}
+
+# 질문 끝에 붙는 동작 표현 (병합 시 유지)
+ACTION_SUFFIXES = ["제거하는 법", "없애는 법", "해결하는 법", "제거 방법", "해결 방법", "청소 방법",
+                   "제거법", "해결법", "청소법", "수리법", "제거", "해결", "청소", "수리"]
+
+_PAREN = re.compile(r"\(.*?\)")
+
+# 로컬 템플릿 / GPT 대체 사용 횟수
+slot_engine_stats = {"clarification_local": 0, "clarification_gpt": 0, "merge_local": 0, "merge_gpt": 0}
+_stats_lock = threading.Lock()
+
+
+def count_slot_event(name: str):
+    """slot_engine_stats 증가 (스레드풀의 여러 요청이 동시에 갱신)"""
+    with _stats_lock:
+        slot_engine_stats[name] += 1
+
+
+@lru_cache(maxsize=1)
+def _vocabulary(md_path: str = "homefix.md"):
+    """
+    지식 베이스 제목(## 문제:)과 efficientnet.location_labels로 대상/문제 어휘 구성
+
+    Returns:
+        (대상 목록, 문제 목록, {문제: [대상, ...]}, {대상: [문제, ...]})
+    """
+    problem_to_objects: dict[str, list[str]] = {}
+    object_to_problems: dict[str, list[str]] = {}
+
+    def add(obj: str, problem: str):
+        obj, problem = obj.strip(), problem.strip()
+        if not obj or not problem:
+            return
+        problem_to_objects.setdefault(problem, [])
+        if obj not in problem_to_objects[problem]:
+            problem_to_objects[problem].append(obj)
+        object_to_problems.setdefault(obj, [])
+        if problem not in object_to_problems[obj]:
+            object_to_problems[obj].append(problem)
+
+    # 1) 이미지 모델의 문제별 위치 레이블 (가장 정확한 후보)
+    try:
+        from efficientnet import location_labels
+    except Exception:
+        location_labels = {}
+    for problem, locations in location_labels.items():
+        for location in locations:
+            for obj in location.split("/"):
+                add(obj, problem)
+
+    # 2) homefix.md 제목: "대상 문제(부가 설명)" 형식
+    try:
+        with open(md_path, "r", encoding="utf-8") as f:
+            titles = re.findall(r"## 문제[:：](.+)", f.read())
+    except OSError:
+        titles = []
+    for title in titles:
+        words = _PAREN.sub("", title).split()
+        if len(words) < 2:
+            continue
+        # "싱크대 물때 제거"처럼 동작 표현이 붙은 제목은 문제 부분만 사용
+        problem = " ".join(words[1:])
+        for suffix in ACTION_SUFFIXES:
+            if problem.endswith(" " + suffix):
+                problem = problem[: -len(suffix)].strip()
+                break
+        for obj in words[0].split("/"):
+            add(obj, problem)
+
+    # 긴 표현부터 매칭되도록 길이순 정렬
+    objects = sorted(object_to_problems, key=len, reverse=True)
+    problems = sorted(problem_to_objects, key=len, reverse=True)
+    return objects, problems, problem_to_objects, object_to_problems
+
+
+def _find(text: str, vocabulary: list[str], whole_word_single_char: bool = False):
+    compact = text.replace(" ", "")
+    tokens = text.split()
+    for word in vocabulary:
+        # 한 글자 대상(문, 옷 등)은 "문제", "옷장" 같은 단어 안에서 잘못 매칭되지 않도록 단어 단위로만 비교
+        if whole_word_single_char and len(word) == 1:
+            if any(token == word or token.startswith(word) and len(token) == 2 and token[1] in "에이가을를의" for token in tokens):
+                return word
+            continue
+        if word in text or word.replace(" ", "") in compact:
+            return word
+    return None
+
+
+def detect_slots(text: str) -> dict:
+    """문장에서 대상(object), 문제(problem), 동작 표현(action) 추출 (없으면 None)"""
+    objects, problems, _, _ = _vocabulary()
+    normalized = text.strip()
+    for alias, canonical in OBJECT_SYNONYMS.items():
+        if alias in normalized and canonical not in normalized:
+            normalized = normalized.replace(alias, canonical)
+
+    action = next((suffix for suffix in ACTION_SUFFIXES if suffix in normalized), None)
+    return {
+        "object": _find(normalized, objects, whole_word_single_char=True),
+        "problem": _find(normalized, problems),
+        "action": action,
+    }
+
+
+def _has_final_consonant(word: str) -> bool:
+    """마지막 글자에 받침이 있는지 (한글이 아니면 False)"""
+    last = word[-1] if word else ""
+    if "가" <= last <= "힣":
+        return (ord(last) - ord("가")) % 28 != 0
+    return False
+
+
+def _josa(word: str, with_final: str, without_final: str) -> str:
+    return word + (with_final if _has_final_consonant(word) else without_final)
+
+
+def _candidates(items: list[str], limit: int = 3) -> str:
+    return ", ".join(items[:limit])
+
+
+def build_clarification(question: str):
+    """
+    빠진 정보(대상 또는 문제)를 묻는 추가 질문을 템플릿으로 생성
+
+    Returns:
+        추가 질문 문자열. 대상과 문제를 모두 찾지 못했거나 이미 구체적이면 None (GPT로 대체)
+    """
+    _, _, problem_to_objects, object_to_problems = _vocabulary()
+    slots = detect_slots(question)
+    obj, problem = slots["object"], slots["problem"]
+
+    # 후보가 2개 미만이면 "고장"처럼 너무 일반적인 표현일 가능성이 높으므로 GPT로 대체
+    if problem and not obj:
+        candidates = problem_to_objects.get(problem, [])
+        if len(candidates) < 2:
+            return None
+        hint = f" ({_candidates(candidates)} 등)"
+        if problem in REMOVAL_PROBLEMS:
+            return f"어디의 {_josa(problem, '을', '를')} 제거하고 싶으신가요?{hint}"
+        return f"어디에서 {_josa(problem, '이', '가')} 발생했나요?{hint}"
+
+    if obj and not problem:
+        candidates = object_to_problems.get(obj, [])
+        if len(candidates) < 2:
+            return None
+        hint = f" ({_candidates(candidates)} 등)"
+        return f"{obj}에 어떤 문제가 있나요?{hint}"
+
+    return None
+
+
+def merge_query(original_question: str, additional_info: str):
+    """
+    원래 질문과 추가 답변을 슬롯 채우기로 합쳐 완전한 질문 생성
+
+    Returns:
+        "대상 문제 동작" 형식의 질문. 합친 뒤에도 대상/문제가 빠져 있으면 None (GPT로 대체)
+    """
+    original = detect_slots(original_question or "")
+    extra = detect_slots(additional_info or "")
+    obj = extra["object"] or original["object"]
+    problem = extra["problem"] or original["problem"]
+    if not obj or not problem:
+        return None
+
+    action = extra["action"] or original["action"]
+    if not action:
+        action = "제거법" if problem in REMOVAL_PROBLEMS else "해결법"
+    return f"{obj} {problem} {action}"
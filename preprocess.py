@@ -0,0 +1,169 @@
+"""
+비전 모델 입력 전처리 (efficientnet.transform과 같은 값을 중간 복사본 없이 생성)
+
+기존 transform(Resize → ToTensor → Normalize)은 이미지마다 float 텐서를 여러 번 새로 만듭니다.
+여기서는
+    1. 디코딩: 이미 RGB면 convert('RGB')로 다시 복사하지 않음 (PREPROCESS_DRAFT=1이면 JPEG를 축소 디코딩)
+    2. 크기 조정: uint8 상태로 PIL BILINEAR 한 번 (transforms.Resize와 같은 호출)
+    3. 정규화: input_buffer()로 빌린 float 버퍼(CUDA면 pinned)에 바로 써서 제자리 연산
+    4. 배치: 버퍼의 i번째 칸에 바로 써서 torch.stack 복사 없음
+순서로 처리합니다. 연산 순서가 ToTensor/Normalize와 같아서 결과가 비트 단위로 같습니다
+(축소 디코딩은 JPEG DCT 단계에서 줄이므로 값이 조금 달라져서 기본 비활성).
+
+재사용 버퍼는 (PREPROCESS_MAX_BATCH, 3, 384, 384) float32 하나의 크기(기본 8장, 약 14MB)로 고정하고
+배치 크기 n은 buf[:n] 뷰로 씁니다. 버퍼는 메모리 형식별로 최대 PREPROCESS_POOL_SIZE개만 만들고
+(기본 VISION_CONCURRENCY - 비전 추론은 입장 제어로 그만큼만 동시에 실행됨), 모두 사용 중이면
+반납될 때까지 기다리므로 스레드풀 크기와 관계없이 메모리가 size × 14MB를 넘지 않습니다.
+out 없이 호출하면 매번 새 텐서를 만듭니다.
+"""
+import contextlib
+import io
+import os
+import queue
+import threading
+
+import numpy as np
+import torch
+from PIL import Image
+
+IMAGE_SIZE = 384
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+
+# JPEG 축소 디코딩 (큰 사진의 디코딩 시간/메모리 감소, 결과가 기존 transform과 조금 달라짐)
+PREPROCESS_DRAFT = os.environ.get("PREPROCESS_DRAFT") == "1"
+# 축소 디코딩 시 최소 크기 (모델 입력의 2배 이상을 남겨서 BILINEAR 축소 품질 유지)
+DRAFT_MIN_SIZE = IMAGE_SIZE * 2
+
+# transforms.Normalize와 같은 float32 텐서 (채널, 1, 1)
+_mean = torch.tensor(MEAN, dtype=torch.float32).view(3, 1, 1)
+_std = torch.tensor(STD, dtype=torch.float32).view(3, 1, 1)
+_pin_memory = torch.cuda.is_available()
+
+# 재사용 버퍼 하나에 담는 최대 이미지 수 (efficientnet.predict_batch는 이 크기 이하로 나눠서 추론)
+PREPROCESS_MAX_BATCH = int(os.environ.get("PREPROCESS_MAX_BATCH", "8"))
+# 메모리 형식별 재사용 버퍼 최대 개수
+PREPROCESS_POOL_SIZE = int(os.environ.get("PREPROCESS_POOL_SIZE", os.environ.get("VISION_CONCURRENCY", "1")))
+
+
+def ensure_rgb(image: Image.Image) -> Image.Image:
+    """RGB가 아닐 때만 변환 (이미 RGB인 이미지에 convert('RGB')를 하면 전체가 복사됨)"""
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+def decode_image(source, draft: bool = None) -> Image.Image:
+    """
+    이미지 바이트 또는 파일 경로를 RGB PIL 이미지로 디코딩
+
+    Args:
+        source: 이미지 바이트 또는 파일 경로
+        draft: JPEG 축소 디코딩 (None이면 PREPROCESS_DRAFT)
+    """
+    image = Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+    if PREPROCESS_DRAFT if draft is None else draft:
+        # JPEG만 적용됨 (다른 형식은 아무 것도 하지 않음)
+        image.draft("RGB", (DRAFT_MIN_SIZE, DRAFT_MIN_SIZE))
+    image.load()
+    return ensure_rgb(image)
+
+
+def _new_buffer(batch_size: int, channels_last: bool = False) -> torch.Tensor:
+    buffer = torch.empty((batch_size, 3, IMAGE_SIZE, IMAGE_SIZE), dtype=torch.float32, pin_memory=_pin_memory)
+    return buffer.contiguous(memory_format=torch.channels_last) if channels_last else buffer
+
+
+class _BufferPool:
+    """최대 배치 크기 버퍼를 size개까지만 만들어 돌려쓰는 풀"""
+
+    def __init__(self, size: int, channels_last: bool):
+        self.size = max(1, size)
+        self.channels_last = channels_last
+        self._free = queue.LifoQueue()  # 최근에 쓴 버퍼(캐시에 남아 있을 가능성이 큰 것)부터
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> torch.Tensor:
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            return _new_buffer(PREPROCESS_MAX_BATCH, self.channels_last)
+        return self._free.get()
+
+    def release(self, buffer: torch.Tensor):
+        self._free.put(buffer)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def input_buffer(channels_last: bool = False):
+    """
+    (PREPROCESS_MAX_BATCH, 3, 384, 384) 재사용 버퍼를 빌려서 with 블록 동안 사용
+
+    버퍼(와 그 뷰로 만든 입력 텐서)는 블록 안에서만 유효합니다. CUDA로 비동기 복사했다면
+    블록을 나가기 전에 결과를 .item()/.tolist() 등으로 받아서 복사가 끝나게 해야 합니다.
+
+    Args:
+        channels_last: channels_last 메모리 형식 버퍼 (최적화 모드 모델 입력을 복사 없이 그대로 사용)
+    """
+    with _pools_lock:
+        pool = _pools.get(channels_last)
+        if pool is None:
+            pool = _pools[channels_last] = _BufferPool(PREPROCESS_POOL_SIZE, channels_last)
+    buffer = pool.acquire()
+    try:
+        yield buffer
+    finally:
+        pool.release(buffer)
+
+
+def _batch_buffer(batch_size: int, out) -> torch.Tensor:
+    if out is None:
+        return _new_buffer(batch_size)
+    if batch_size > out.shape[0]:
+        raise ValueError(f"이미지 {batch_size}장이 버퍼 크기 {out.shape[0]}보다 많습니다.")
+    return out[:batch_size]
+
+
+def _write(image: Image.Image, out: torch.Tensor):
+    """크기 조정한 uint8 픽셀을 out (3, H, W)에 float로 복사 (HWC → CHW 변환도 이 복사에서)"""
+    image = ensure_rgb(image)
+    if image.size != (IMAGE_SIZE, IMAGE_SIZE):
+        image = image.resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR)
+    np.copyto(out.numpy(), np.asarray(image).transpose(2, 0, 1))
+
+
+def _normalize_(batch: torch.Tensor) -> torch.Tensor:
+    # ToTensor(div(255)) → Normalize(sub_(mean).div_(std))와 같은 순서로 제자리 연산
+    return batch.div_(255).sub_(_mean).div_(_std)
+
+
+def preprocess(image: Image.Image, out: torch.Tensor = None) -> torch.Tensor:
+    """
+    이미지 1장 → (1, 3, 384, 384) 입력 텐서 (transform(image).unsqueeze(0)과 같은 값)
+
+    out: input_buffer()로 빌린 버퍼 (주면 out[:1] 뷰에 쓰고 반환)
+    """
+    batch = _batch_buffer(1, out)
+    _write(image, batch[0])
+    return _normalize_(batch)
+
+
+def preprocess_batch(images: list, out: torch.Tensor = None) -> torch.Tensor:
+    """
+    이미지 N장 → (N, 3, 384, 384) 입력 텐서 (torch.stack([transform(img) ...])과 같은 값)
+
+    out: input_buffer()로 빌린 버퍼 (주면 out[:N] 뷰에 쓰고 반환, N은 PREPROCESS_MAX_BATCH 이하)
+    """
+    batch = _batch_buffer(len(images), out)
+    for i, image in enumerate(images):
+        _write(image, batch[i])
+    return _normalize_(batch)
@@ -0,0 +1,169 @@
+"""
+요청 단위 프로파일링 (기본 비활성)
+
+- X-Profile: 1 + 올바른 X-Admin-Token 헤더(HOMEFIX_ADMIN_TOKEN이 없으면 헤더 요청은 항상 거절) 또는
+  HOMEFIX_PROFILE_SAMPLE_RATE 비율로 선택된 요청만 프로파일링
+- 비전: predict_image 구간을 torch.profiler로 기록 (Chrome trace JSON)
+- NLP: chat_with_ai / return_solution 구간을 모든 스레드의 스택 샘플링으로 기록
+  (fanout/헤지 스레드풀에서 실행되는 단계까지 포함, .folded - speedscope, flamegraph.pl 등으로 확인)
+- 파일은 HOMEFIX_PROFILE_DIR에 저장하고 HOMEFIX_PROFILE_MAX_TRACES개를 넘으면 오래된 것부터 삭제
+"""
+import contextvars
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_DIR = os.environ.get("HOMEFIX_PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.environ.get("HOMEFIX_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MAX_TRACES = int(os.environ.get("HOMEFIX_PROFILE_MAX_TRACES", "50"))
+ADMIN_TOKEN = os.environ.get("HOMEFIX_ADMIN_TOKEN")
+# 스택 샘플링 간격 (초)
+PROFILE_INTERVAL_SECONDS = float(os.environ.get("HOMEFIX_PROFILE_INTERVAL_MS", "5")) / 1000
+
+# 현재 요청의 트레이스 ID (프로파일링 대상이 아니면 None)
+_trace_id = contextvars.ContextVar("profile_trace_id", default=None)
+_prune_lock = threading.Lock()
+_TRACE_NAME = re.compile(r"^[\w.-]+$")
+
+
+def is_admin(token: str | None) -> bool:
+    """관리자 토큰 확인 (HOMEFIX_ADMIN_TOKEN이 없으면 항상 False)"""
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def should_profile(headers) -> bool:
+    if headers.get("x-profile") == "1":
+        # 누구나 프로파일링을 켤 수 있으면 요청마다 프로파일러 + 파일 쓰기를 강제할 수 있으므로 관리자만 허용
+        return is_admin(headers.get("x-admin-token"))
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@contextmanager
+def profile_request(endpoint: str):
+    """이 블록 안(스레드풀로 넘긴 작업 포함)의 프로파일링 구간을 활성화하고 트레이스 ID 반환"""
+    trace_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint.strip('/').replace('/', '_') or 'root'}-{uuid.uuid4().hex[:6]}"
+    token = _trace_id.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _trace_id.reset(token)
+
+
+def _trace_file(label: str, extension: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    return os.path.join(PROFILE_DIR, f"{_trace_id.get()}-{label}{extension}")
+
+
+def _prune():
+    """가장 오래된 트레이스부터 삭제해서 PROFILE_MAX_TRACES개 유지"""
+    with _prune_lock:
+        traces = list_traces()
+        for trace in traces[PROFILE_MAX_TRACES:]:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, trace["name"]))
+            except OSError:
+                pass
+
+
+@contextmanager
+def torch_profile(label: str):
+    """프로파일링 대상 요청이면 torch.profiler로 구간 기록"""
+    if _trace_id.get() is None:
+        yield
+        return
+
+    import torch
+    from torch.profiler import ProfilerActivity, profile
+
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+    with profile(activities=activities, record_shapes=True) as prof:
+        yield
+    prof.export_chrome_trace(_trace_file(label, ".json"))
+    _prune()
+
+
+class _StackSampler(threading.Thread):
+    """모든 스레드의 파이썬 스택을 주기적으로 샘플링해서 접힌 스택(folded) 형식으로 집계"""
+
+    def __init__(self, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.samples = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+@contextmanager
+def python_profile(label: str):
+    """
+    프로파일링 대상 요청이면 구간 동안 모든 스레드를 스택 샘플링해서 기록
+
+    단계가 fanout/헤지 스레드풀에서 실행되거나 singleflight로 다른 요청의 계산을 기다려도
+    실제로 일하는 스레드의 스택이 기록됩니다 (같은 시각의 다른 요청 스레드도 함께 기록됨).
+    """
+    if _trace_id.get() is None:
+        yield
+        return
+
+    sampler = _StackSampler(PROFILE_INTERVAL_SECONDS)
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        with open(_trace_file(label, ".folded"), "w", encoding="utf-8") as f:
+            for stack, count in sampler.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        _prune()
+
+
+def list_traces() -> list:
+    """저장된 트레이스 목록 (최신순)"""
+    try:
+        names = [name for name in os.listdir(PROFILE_DIR) if _TRACE_NAME.match(name)]
+    except FileNotFoundError:
+        return []
+    traces = []
+    for name in names:
+        try:
+            stat = os.stat(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            continue
+        traces.append({"name": name, "bytes": stat.st_size, "created_at": stat.st_mtime})
+    return sorted(traces, key=lambda t: t["created_at"], reverse=True)
+
+
+def trace_path(name: str):
+    """다운로드할 트레이스 파일 경로 (이름이 잘못됐거나 없으면 None)"""
+    if not _TRACE_NAME.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
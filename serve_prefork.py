@@ -0,0 +1,224 @@
+"""
+사전 포크(pre-fork) 서버: 모델을 부모 프로세스에서 한 번만 로딩하고 워커들이 공유
+
+- 부모: 비전 모델 8개(가중치 파일 mmap), 문장 인코더, FAISS 인덱스를 로딩 → gc.freeze() → 소켓 바인딩 → 워커 fork
+  (gc.freeze로 로딩된 객체를 GC 대상에서 빼서 워커의 GC가 공유 페이지를 건드려 복사되지 않도록 함)
+- VISION_OPTIMIZED=1이면 channels_last 변환까지 부모에서 하고, torch.compile 컴파일은 워커별 워밍업에서 실행
+- 워커: 공유된 모델로 워밍업만 실행하고 같은 소켓으로 uvicorn 실행 (죽으면 부모가 다시 fork)
+  재시작은 연속으로 죽을수록 지연을 늘리고(최대 --restart-backoff-max초), --restart-window초 안에
+  --max-restarts번 넘게 죽으면 크래시 루프로 보고 전체를 종료
+- 부모는 OpenMP 스레드 풀을 만들지 않도록 스레드 1개로 로딩 (fork 후 교착 방지), 워커에서 스레드 수 설정
+- --memory-report-after N: N초 후 /proc/<pid>/smaps_rollup으로 워커별 RSS/PSS/USS(고유 메모리) 출력
+
+실행 예 (리눅스 전용):
+    python serve_prefork.py --workers 4 --port 8000 --memory-report-after 90
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+logger = logging.getLogger("homefix.prefork")
+
+
+def read_memory(pid: int) -> dict:
+    """프로세스 메모리 (MB): rss, pss(공유 페이지를 나눠 계산), uss(이 프로세스만 쓰는 페이지), shared"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])  # kB
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    shared = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "uss_mb": round(uss / 1024, 1),
+        "shared_mb": round(shared / 1024, 1),
+    }
+
+
+def memory_report(parent_pid: int, worker_pids: list) -> dict:
+    parent = read_memory(parent_pid)
+    workers = {str(pid): read_memory(pid) for pid in worker_pids}
+    uss = [w["uss_mb"] for w in workers.values()]
+    return {
+        "parent": parent,
+        "workers": workers,
+        # 워커 하나를 추가할 때 늘어나는 메모리 ≈ 워커의 고유 메모리(USS)
+        "avg_incremental_worker_mb": round(sum(uss) / len(uss), 1) if uss else None,
+        "total_pss_mb": round(parent["pss_mb"] + sum(w["pss_mb"] for w in workers.values()), 1),
+        "independent_workers_estimate_mb": round(parent["rss_mb"] * len(workers), 1),
+    }
+
+
+def _preload(mmap: bool):
+    """부모 프로세스에서 모든 모델 로딩 (추론은 하지 않음, 검색 워밍업도 워커 시작 시 실행)"""
+    import torch
+    torch.set_num_threads(1)
+    try:
+        import faiss
+        faiss.omp_set_num_threads(1)
+    except ImportError:
+        pass
+
+    import app as app_module
+    from efficientnet import load_models
+    from nlp.main import init_search_index
+
+    start = time.perf_counter()
+    app_module.model = load_models(mmap=mmap)
+    init_search_index(warm_up=False)
+    logger.info("부모 프로세스 모델 로딩 완료", extra={"fields": {"seconds": round(time.perf_counter() - start, 1), "mmap": mmap}})
+    return app_module
+
+
+def _run_worker(app_module, sock: socket.socket, threads: int, log_level: str):
+    import torch
+    import uvicorn
+
+    torch.set_num_threads(threads)
+    try:
+        import faiss
+        faiss.omp_set_num_threads(threads)
+    except ImportError:
+        pass
+    # 부모에서 받은 시그널 처리기를 기본값으로 (uvicorn이 다시 설정)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    config = uvicorn.Config(app_module.app, log_level=log_level, lifespan="on")
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HomeFix 사전 포크 서버 (모델 가중치 공유)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="워커별 torch 스레드 수 (기본: 물리 코어 수 / 워커 수)")
+    parser.add_argument("--no-mmap", action="store_true", help="가중치 파일을 mmap하지 않고 메모리로 읽음")
+    parser.add_argument("--memory-report-after", type=float, default=None,
+                        help="N초 후 워커별 메모리 사용량을 출력")
+    parser.add_argument("--memory-report-output", default=None, help="메모리 보고서를 저장할 JSON 파일")
+    parser.add_argument("--max-restarts", type=int, default=5,
+                        help="--restart-window초 안에 이 횟수보다 많이 워커가 죽으면 서버 종료")
+    parser.add_argument("--restart-window", type=float, default=60.0, help="크래시 루프 판단 구간 (초)")
+    parser.add_argument("--restart-backoff-max", type=float, default=30.0, help="워커 재시작 최대 지연 (초)")
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("serve_prefork.py는 fork를 지원하는 운영체제(리눅스)에서만 실행할 수 있습니다.")
+
+    app_module = _preload(mmap=not args.no_mmap)
+    from efficientnet import physical_core_count
+    threads = args.threads_per_worker or max(1, physical_core_count() // args.workers)
+
+    # 로딩된 객체를 GC 대상에서 제외 (워커에서 GC가 객체 헤더를 건드려 페이지가 복사되는 것을 방지)
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    workers = {}
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            # 워커는 어떤 경우에도 부모 코드로 돌아오지 않음 (돌아오면 워커가 또 하나의 감독 프로세스가 됨)
+            try:
+                _run_worker(app_module, sock, threads, args.log_level)
+            except BaseException:
+                logger.exception("워커 실행 실패", extra={"fields": {"pid": os.getpid()}})
+            finally:
+                os._exit(1)
+        workers[pid] = time.time()
+        return pid
+
+    for _ in range(args.workers):
+        spawn()
+    logger.info("워커 시작", extra={"fields": {"workers": list(workers), "address": f"{args.host}:{args.port}", "threads_per_worker": threads}})
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    crashes = []  # 최근 워커 종료 시각 (restart_window 안의 것만 유지)
+    respawn_at = []  # 예약된 재시작 시각
+    exit_code = 0
+
+    report_at = time.time() + args.memory_report_after if args.memory_report_after else None
+    while workers or respawn_at:
+        now = time.time()
+        while respawn_at and respawn_at[0] <= now and not stopping:
+            respawn_at.pop(0)
+            spawn()
+        if stopping:
+            respawn_at.clear()
+
+        if report_at and time.time() >= report_at:
+            report_at = None
+            report = memory_report(os.getpid(), list(workers))
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+            if args.memory_report_output:
+                with open(args.memory_report_output, "w", encoding="utf-8") as f:
+                    json.dump(report, f, ensure_ascii=False, indent=2)
+
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            if not respawn_at:
+                break
+            pid = 0
+        if pid == 0:
+            time.sleep(0.5)
+            continue
+        workers.pop(pid, None)
+        if stopping:
+            continue
+
+        crashes = [t for t in crashes if now - t < args.restart_window] + [now]
+        if len(crashes) > args.max_restarts:
+            logger.error("워커가 계속 죽어서 서버를 종료합니다.", extra={"fields": {
+                "pid": pid, "status": status, "crashes": len(crashes), "window_seconds": args.restart_window,
+            }})
+            exit_code = 1
+            stop(signal.SIGTERM, None)
+            continue
+        # 최근에 많이 죽을수록 늦게 재시작 (0.5초, 1초, 2초, ... 최대 restart_backoff_max)
+        delay = min(args.restart_backoff_max, 0.5 * 2 ** (len(crashes) - 1))
+        logger.warning("워커 종료, 다시 시작합니다.", extra={"fields": {"pid": pid, "status": status, "delay_seconds": delay}})
+        respawn_at.append(now + delay)
+        respawn_at.sort()
+
+    sock.close()
+    if exit_code:
+        sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+구조화 로깅 (JSON 한 줄 + 큐 기반 비동기 출력)
+
+- 요청 처리 스레드는 레코드를 큐에 넣기만 하고, 실제 stdout 쓰기는 QueueListener 스레드가 담당
+- 큐가 가득 차면 기다리지 않고 버림 (버린 수는 dropped_records)
+- 미들웨어가 요청마다 correlation ID(X-Request-ID)를 contextvar에 설정 → 모든 로그에 request_id 포함
+- INFO 이하 레코드는 HOMEFIX_LOG_SAMPLE_RATE 비율만 출력 가능 (WARNING 이상은 항상 출력)
+
+환경 변수:
+    HOMEFIX_LOG_LEVEL (기본 INFO, 기존 디버그 출력은 DEBUG)
+    HOMEFIX_LOG_FORMAT (json | text, 기본 json)
+    HOMEFIX_LOG_SAMPLE_RATE (0~1, 기본 1)
+    HOMEFIX_LOG_QUEUE_SIZE (기본 10000)
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+LOG_LEVEL = os.environ.get("HOMEFIX_LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("HOMEFIX_LOG_FORMAT", "json")
+LOG_SAMPLE_RATE = float(os.environ.get("HOMEFIX_LOG_SAMPLE_RATE", "1"))
+LOG_QUEUE_SIZE = int(os.environ.get("HOMEFIX_LOG_QUEUE_SIZE", "10000"))
+
+dropped_records = 0
+_dropped_lock = threading.Lock()
+_listener = None
+
+# 클라이언트가 보낸 X-Request-ID는 이 형식일 때만 사용 (로그/응답 헤더에 그대로 들어가므로)
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9-]{1,64}$")
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def request_id_from(header_value: str | None) -> str:
+    """X-Request-ID가 영문/숫자/하이픈 64자 이하면 그대로, 아니면 새 ID"""
+    if header_value and _REQUEST_ID.match(header_value):
+        return header_value
+    return new_request_id()
+
+
+class RequestContextFilter(logging.Filter):
+    """레코드에 현재 요청 ID 추가 (로그를 남긴 스레드의 contextvar 기준)"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """WARNING 미만 레코드는 sample_rate 비율만 통과"""
+
+    def __init__(self, sample_rate: float):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.sample_rate >= 1 or random.random() < self.sample_rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """큐가 가득 차면 요청 스레드를 막지 않고 레코드를 버림"""
+
+    def prepare(self, record):
+        # 메시지와 예외 문자열만 미리 만들어 두고 포맷은 리스너 스레드에서 처리
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        global dropped_records
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with _dropped_lock:
+                dropped_records += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """한 줄 JSON (extra={"fields": {...}}로 넘긴 값은 최상위 키로 추가)"""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """사람이 읽기 쉬운 한 줄 형식 (로컬 개발용)"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + json.dumps(fields, ensure_ascii=False, default=str)
+        return line
+
+
+def setup_logging():
+    """루트 로거를 큐 기반 핸들러로 설정 (여러 번 호출해도 한 번만 적용)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    handler.addFilter(RequestContextFilter())
+    handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(handler)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def _restart_after_fork():
+    """fork된 자식에는 리스너 스레드가 없으므로 핸들러와 리스너를 새로 만듦 (serve_prefork.py)"""
+    global _listener
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if isinstance(h, NonBlockingQueueHandler)]:
+        root.removeHandler(handler)
+    _listener = None
+    setup_logging()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def logging_stats() -> dict:
+    return {
+        "level": LOG_LEVEL,
+        "sample_rate": LOG_SAMPLE_RATE,
+        "dropped_records": dropped_records,
+    }